@@ -18,6 +18,90 @@ BASE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 NEO4J_URI = "bolt://localhost:7687"
 NEO4J_USER = "neo4j"
 NEO4J_PASSWORD = "password"
+NEO4J_DATABASE = "neo4j"
+# Общий драйвер на процесс (см. db/repositories/ontology_driver/python_driver/driver_registry.py)
+NEO4J_MAX_CONNECTION_POOL_SIZE = int(os.environ.get("NEO4J_MAX_CONNECTION_POOL_SIZE", 50))
+NEO4J_CONNECTION_ACQUISITION_TIMEOUT = 60
+# соединения, простаивавшие дольше этого (сек), проверяются перед выдачей из пула
+NEO4J_LIVENESS_CHECK_TIMEOUT = 30
+NEO4J_MAX_CONNECTION_LIFETIME = 3600
+# создавать уникальные индексы по uri при старте процесса (иначе: python manage.py ensure_ontology_schema)
+NEO4J_ENSURE_SCHEMA_ON_STARTUP = os.environ.get("NEO4J_ENSURE_SCHEMA_ON_STARTUP", "0") == "1"
+# полный обход графа (ontology/export/, копия онтологии в памяти): узлов в одном запросе
+# и записей, которые драйвер забирает с сервера за раз
+NEO4J_EXPORT_PAGE_SIZE = 10000
+NEO4J_EXPORT_FETCH_SIZE = 1000
+# кэш чтений онтологии (db/services/ontology_cache.py)
+# имя кэша из CACHES, общего для процессов; пусто - LRU в памяти каждого процесса
+ONTOLOGY_CACHE_BACKEND = os.environ.get("ONTOLOGY_CACHE_BACKEND", "")
+# по умолчанию включен только с общим кэшем: LRU процесса сбрасывается лишь при записях через
+# этот же процесс, остальные воркеры отдают устаревшее до ONTOLOGY_CACHE_TTL
+ONTOLOGY_CACHE_ENABLED = os.environ.get("ONTOLOGY_CACHE_ENABLED", "1" if ONTOLOGY_CACHE_BACKEND else "0") == "1"
+ONTOLOGY_CACHE_TTL = 300
+ONTOLOGY_CACHE_MAX_ITEMS = 10000
+# копия онтологии в памяти для ontology/snapshot/... (db/services/ontology_snapshot.py)
+ONTOLOGY_SNAPSHOT_ENABLED = os.environ.get("ONTOLOGY_SNAPSHOT_ENABLED", "0") == "1"
+# вести версию графа при записи (по ней копия замечает чужие изменения); если копия включена
+# хоть в одном процессе, версию должны вести все процессы, пишущие в граф
+ONTOLOGY_TRACK_VERSION = os.environ.get("ONTOLOGY_TRACK_VERSION", "1" if ONTOLOGY_SNAPSHOT_ENABLED else "0") == "1"
+# раз в столько секунд версия графа сверяется с Neo4j
+ONTOLOGY_SNAPSHOT_CHECK_INTERVAL = 30
+# копия старше этого (сек) перечитывается целиком
+ONTOLOGY_SNAPSHOT_MAX_AGE = 3600
+
+# загружать модель эмбеддингов при старте процесса, а не на первом запросе
+EMBEDDING_WARMUP_ON_STARTUP = os.environ.get("EMBEDDING_WARMUP_ON_STARTUP", "0") == "1"
+# объединение параллельных запросов embedding/encode/ в один батч модели
+EMBEDDING_BATCH_WINDOW_MS = float(os.environ.get("EMBEDDING_BATCH_WINDOW_MS", 5))
+EMBEDDING_BATCH_MAX_SIZE = int(os.environ.get("EMBEDDING_BATCH_MAX_SIZE", 64))
+# максимальный размер матрицы близостей, отдаваемой embedding/compare/batch/ без top_k
+EMBEDDING_COMPARE_MAX_CELLS = 1000000
+# максимальное произведение числа чанков текста и перевода для text/<id>/alignment/
+# (ДП держит ~5 байт на пару чанков); длинные пары - через manage.py align_corpus
+ALIGNMENT_MAX_CELLS = 20000000
+# кэш эмбеддингов чанков: LRU в памяти + таблица db.ChunkEmbedding
+EMBEDDING_CACHE_ENABLED = True
+EMBEDDING_CACHE_MAX_ITEMS = int(os.environ.get("EMBEDDING_CACHE_MAX_ITEMS", 50000))
+EMBEDDING_CACHE_PERSISTENT = True
+# тип хранения Text.embeddings: "float32" или "float16" (вдвое компактнее)
+EMBEDDING_STORAGE_DTYPE = os.environ.get("EMBEDDING_STORAGE_DTYPE", "float32")
+# эмбеддинги новых/измененных текстов считаются в фоне (db/services/embedding_jobs.py)
+EMBEDDING_ASYNC = os.environ.get("EMBEDDING_ASYNC", "1") == "1"
+# потоки-обработчики очереди внутри веб-процесса; 0 - только отдельный run_embedding_worker
+EMBEDDING_WORKER_THREADS = int(os.environ.get("EMBEDDING_WORKER_THREADS", 1))
+EMBEDDING_WORKER_POLL_INTERVAL = 2.0
+EMBEDDING_JOB_MAX_ATTEMPTS = 3
+# задача в статусе running дольше этого (сек) считается брошенной и возвращается в очередь
+EMBEDDING_JOB_TIMEOUT = 600
+
+# индекс поиска в каждом процессе раз в столько секунд сверяется с БД (два Max по индексированным
+# колонкам) и дочитывает изменения других процессов (db/services/vector_index.py);
+# запас (сек) на расхождение часов
+VECTOR_INDEX_CHECK_INTERVAL = float(os.environ.get("VECTOR_INDEX_CHECK_INTERVAL", 2))
+VECTOR_INDEX_SYNC_MARGIN = 60
+
+# приближенный индекс чанков для search/ с "approximate": true (python manage.py build_ann_index)
+ANN_INDEX_DIR = os.environ.get("ANN_INDEX_DIR", os.path.join(BASE_DIR, 'ann_index'))
+ANN_INDEX_LISTS = 1024
+ANN_INDEX_PROBES = 16
+
+# страница текстов в corpus/<id>/details/ (по умолчанию и максимум)
+CORPUS_TEXTS_PAGE_SIZE = 100
+CORPUS_TEXTS_MAX_PAGE_SIZE = 1000
+
+# массовая загрузка текстов (text/bulk/, python manage.py import_texts): записей на транзакцию
+TEXT_IMPORT_BATCH_SIZE = int(os.environ.get("TEXT_IMPORT_BATCH_SIZE", 500))
+# чанков на батч модели при кодировании загружаемых текстов
+TEXT_IMPORT_ENCODE_BATCH_SIZE = 128
+
+# почти-дубликаты внутри корпуса (python manage.py find_near_duplicates)
+NEAR_DUPLICATE_TEXT_THRESHOLD = 0.95
+NEAR_DUPLICATE_CHUNK_THRESHOLD = 0.97
+# строк матрицы эмбеддингов на блок; память на блок - block_size x число строк
+NEAR_DUPLICATE_BLOCK_SIZE = 2048
+NEAR_DUPLICATE_WORKERS = int(os.environ.get("NEAR_DUPLICATE_WORKERS", os.cpu_count() or 1))
+# сколько самых близких пар каждого уровня сохранять на корпус
+NEAR_DUPLICATE_MAX_PAIRS = 100000
 
 # Quick-start development settings - unsuitable for production
 # See https://docs.djangoproject.com/en/3.0/howto/deployment/checklist/
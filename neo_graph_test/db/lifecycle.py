@@ -0,0 +1,45 @@
+import logging
+from django.conf import settings
+from db.repositories.ontology_driver.python_driver.driver_registry import close_all_drivers
+
+# Хуки запуска/остановки процесса, вызываются из core/wsgi.py и core/asgi.py
+
+logger = logging.getLogger(__name__)
+
+
+def startup():
+    if settings.NEO4J_ENSURE_SCHEMA_ON_STARTUP:
+        from db.services.ontology_service import create_ontology_service
+        try:
+            with create_ontology_service() as service:
+                service.ensure_schema()
+        except Exception:
+            # недоступный Neo4j не должен мешать подняться остальному API
+            logger.exception("Failed to ensure ontology schema on startup")
+
+    if settings.ONTOLOGY_SNAPSHOT_ENABLED:
+        from db.services.ontology_snapshot import get_ontology_snapshot
+        try:
+            get_ontology_snapshot().get()
+        except Exception:
+            logger.exception("Failed to load ontology snapshot on startup")
+
+    if settings.EMBEDDING_WARMUP_ON_STARTUP:
+        from db.services.embedding_service import EmbeddingService
+        try:
+            EmbeddingService.warm_up()
+        except Exception:
+            logger.exception("Failed to load embedding model on startup")
+
+    if settings.EMBEDDING_ASYNC and settings.EMBEDDING_WORKER_THREADS > 0:
+        from db.services.embedding_jobs import start_embedding_worker
+        try:
+            start_embedding_worker(settings.EMBEDDING_WORKER_THREADS)
+        except Exception:
+            logger.exception("Failed to start embedding worker")
+
+
+def shutdown():
+    from db.services.embedding_jobs import stop_embedding_worker
+    stop_embedding_worker()
+    close_all_drivers()
@@ -0,0 +1,46 @@
+import json
+import sys
+from django.core.management.base import BaseCommand, CommandError
+from db.models import Text
+from db.services.alignment_service import AlignmentService, align_text
+
+
+class Command(BaseCommand):
+    help = "Align every text of a corpus with its translation and write the alignments as JSON lines"
+
+    def add_arguments(self, parser):
+        parser.add_argument('corpus_id', type=int)
+        parser.add_argument('--output', help="Output file (stdout by default)")
+        parser.add_argument('--min-similarity', type=float, default=0.3)
+        parser.add_argument('--merge-penalty', type=float, default=0.05)
+        parser.add_argument('--skip-penalty', type=float, default=0.0)
+        parser.add_argument('--include-chunks', action='store_true')
+
+    def handle(self, *args, **options):
+        service = AlignmentService(options['min_similarity'], options['merge_penalty'], options['skip_penalty'])
+        texts = (Text.objects
+                 .filter(corpus_id=options['corpus_id'], has_translation__isnull=False)
+                 .select_related('has_translation')
+                 .order_by('id'))
+        if not options['include_chunks']:
+            texts = texts.defer('content', 'has_translation__content')
+
+        output = open(options['output'], 'w', encoding='utf-8') if options['output'] else sys.stdout
+        aligned = failed = 0
+        try:
+            for text in texts.iterator():
+                try:
+                    result = align_text(text, text.has_translation, service, options['include_chunks'])
+                except ValueError as e:
+                    failed += 1
+                    self.stderr.write(f"text {text.id}: {e}")
+                    continue
+                output.write(json.dumps(result, ensure_ascii=False) + "\n")
+                aligned += 1
+        finally:
+            if output is not sys.stdout:
+                output.close()
+
+        if aligned == 0 and failed == 0:
+            raise CommandError(f"Corpus {options['corpus_id']} has no texts with translations")
+        self.stderr.write(self.style.SUCCESS(f"Aligned {aligned} text pairs, skipped {failed}"))
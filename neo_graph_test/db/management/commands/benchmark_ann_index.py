@@ -0,0 +1,65 @@
+import time
+import numpy as np
+from django.core.management.base import BaseCommand
+from db.models import Text
+from db.services.ann_index import IVFIndex, exact_search
+from db.services.vector_codec import decode_vectors
+
+
+class Command(BaseCommand):
+    help = "Compare recall@k and QPS of the IVF index against exact search"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--source', choices=['db', 'synthetic'], default='synthetic')
+        parser.add_argument('--size', type=int, default=200000, help="Number of synthetic vectors")
+        parser.add_argument('--dim', type=int, default=384)
+        parser.add_argument('--queries', type=int, default=200)
+        parser.add_argument('-k', type=int, default=10)
+        parser.add_argument('--lists', type=int, default=1024)
+        parser.add_argument('--probes', default="1,4,8,16,32,64")
+        parser.add_argument('--seed', type=int, default=0)
+
+    def handle(self, *args, **options):
+        rng = np.random.default_rng(options['seed'])
+        vectors = self._load_vectors(options, rng)
+        vectors /= np.linalg.norm(vectors, axis=1, keepdims=True)
+        k = options['k']
+
+        # запросы - зашумленные векторы из базы, как у реального поиска похожих фрагментов
+        queries = vectors[rng.choice(len(vectors), options['queries'], replace=False)]
+        queries = queries + rng.normal(scale=0.05, size=queries.shape).astype(np.float32)
+
+        started = time.perf_counter()
+        expected = [set(exact_search(vectors, query, k)[0].tolist()) for query in queries]
+        exact_qps = len(queries) / (time.perf_counter() - started)
+        self.stdout.write(f"{len(vectors)} vectors, dim {vectors.shape[1]}, k={k}")
+        self.stdout.write(f"exact: QPS {exact_qps:.1f}")
+
+        started = time.perf_counter()
+        index = IVFIndex(options['lists'])
+        index.build(vectors, seed=options['seed'])
+        self.stdout.write(f"ivf build ({index.n_lists} lists): {time.perf_counter() - started:.1f}s")
+
+        for n_probe in [int(p) for p in options['probes'].split(',')]:
+            started = time.perf_counter()
+            found = [set(index.search(query, k, n_probe)[0].tolist()) for query in queries]
+            qps = len(queries) / (time.perf_counter() - started)
+            recall = np.mean([len(f & e) / len(e) for f, e in zip(found, expected) if e])
+            self.stdout.write(
+                f"ivf n_probe={n_probe}: recall@{k} {recall:.3f}, QPS {qps:.1f} ({qps / exact_qps:.1f}x)")
+
+    def _load_vectors(self, options, rng) -> np.ndarray:
+        if options['source'] == 'db':
+            blocks = [
+                decode_vectors(embeddings)
+                for embeddings in Text.objects.exclude(embeddings=None).values_list('embeddings', flat=True).iterator()
+            ]
+            blocks = [block for block in blocks if len(block)]
+            if not blocks:
+                raise ValueError("There are no text embeddings in the database")
+            return np.concatenate(blocks).astype(np.float32)
+
+        # кластеризованные данные: равномерный шум в высокой размерности для IVF нерепрезентативен
+        centers = rng.normal(size=(max(options['size'] // 500, 1), options['dim'])).astype(np.float32)
+        labels = rng.integers(len(centers), size=options['size'])
+        return centers[labels] + rng.normal(scale=0.3, size=(options['size'], options['dim'])).astype(np.float32)
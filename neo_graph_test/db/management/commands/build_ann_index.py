@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from db.services.vector_index import build_ann_index
+
+
+class Command(BaseCommand):
+    help = "Build the approximate (IVF) chunk index from stored text embeddings"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--path', default=settings.ANN_INDEX_DIR)
+        parser.add_argument('--lists', type=int, default=settings.ANN_INDEX_LISTS)
+        parser.add_argument('--probes', type=int, default=settings.ANN_INDEX_PROBES)
+        parser.add_argument('--iterations', type=int, default=20)
+        parser.add_argument('--sample-size', type=int, default=100000)
+
+    def handle(self, *args, **options):
+        index = build_ann_index(
+            options['path'],
+            options['lists'],
+            options['probes'],
+            n_iter=options['iterations'],
+            sample_size=options['sample_size']
+        )
+        self.stdout.write(self.style.SUCCESS(
+            f"Indexed {len(index)} chunks into {index.n_lists} lists at {options['path']}"))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+from db.services.ontology_service import create_ontology_service
+
+
+class Command(BaseCommand):
+    help = "Create unique constraints on uri for all ontology node labels (idempotent)"
+
+    def handle(self, *args, **options):
+        with create_ontology_service() as service:
+            names = service.ensure_schema()
+
+        for name in names:
+            self.stdout.write(f"constraint {name}: ok")
+        self.stdout.write(self.style.SUCCESS("Ontology schema is up to date"))
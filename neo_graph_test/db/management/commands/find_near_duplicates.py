@@ -0,0 +1,36 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from db.models import Corpus
+from db.services.duplicate_service import detect_corpus_duplicates
+
+
+class Command(BaseCommand):
+    help = "Compute text centroids and find near-duplicate texts and chunks of a corpus"
+
+    def add_arguments(self, parser):
+        parser.add_argument('corpus_ids', type=int, nargs='*', help="Corpora to process (all by default)")
+        parser.add_argument('--text-threshold', type=float, default=settings.NEAR_DUPLICATE_TEXT_THRESHOLD)
+        parser.add_argument('--chunk-threshold', type=float, default=settings.NEAR_DUPLICATE_CHUNK_THRESHOLD)
+        parser.add_argument('--block-size', type=int, default=settings.NEAR_DUPLICATE_BLOCK_SIZE)
+        parser.add_argument('--workers', type=int, default=settings.NEAR_DUPLICATE_WORKERS)
+        parser.add_argument('--max-pairs', type=int, default=settings.NEAR_DUPLICATE_MAX_PAIRS)
+
+    def handle(self, *args, **options):
+        corpus_ids = options['corpus_ids'] or list(Corpus.objects.order_by('id').values_list('id', flat=True))
+        missing = set(corpus_ids) - set(Corpus.objects.filter(id__in=corpus_ids).values_list('id', flat=True))
+        if missing:
+            raise CommandError(f"Corpus not found: {', '.join(map(str, sorted(missing)))}")
+
+        for corpus_id in corpus_ids:
+            result = detect_corpus_duplicates(
+                corpus_id,
+                text_threshold=options['text_threshold'],
+                chunk_threshold=options['chunk_threshold'],
+                block_size=options['block_size'],
+                workers=options['workers'],
+                max_pairs=options['max_pairs'],
+            )
+            self.stdout.write(self.style.SUCCESS(
+                f"Corpus {corpus_id}: {result['texts']} texts, "
+                f"{result['text_pairs']} duplicate texts, {result['chunk_pairs']} duplicate chunks"
+            ))
@@ -0,0 +1,61 @@
+import json
+import os
+import sys
+from django.conf import settings
+from django.core.management.base import BaseCommand, CommandError
+from db.services.text_import import import_texts
+
+
+class Command(BaseCommand):
+    help = "Import texts from JSON Lines files (one text per line, fields as in POST text/)"
+
+    def add_arguments(self, parser):
+        parser.add_argument('paths', nargs='+',
+                            help="Files, directories (every *.jsonl / *.ndjson inside) or - for stdin")
+        parser.add_argument('--batch-size', type=int, default=settings.TEXT_IMPORT_BATCH_SIZE,
+                            help="Records per transaction")
+        parser.add_argument('--no-embed', action='store_true',
+                            help="Leave embeddings to the background embedding worker")
+        parser.add_argument('--errors', help="Write per-record errors as JSON lines to this file")
+
+    def handle(self, *args, **options):
+        files = self._collect_files(options['paths'])
+        errors = open(options['errors'], 'w', encoding='utf-8') if options['errors'] else None
+        created = failed = 0
+
+        try:
+            for path in files:
+                if path == '-':
+                    report = import_texts(sys.stdin, options['batch_size'], embed=not options['no_embed'])
+                else:
+                    with open(path, encoding='utf-8') as f:
+                        report = import_texts(f, options['batch_size'], embed=not options['no_embed'])
+
+                created += report['created']
+                failed += report['failed']
+                self.stdout.write(f"{path}: created {report['created']}, failed {report['failed']}")
+                for error in report['errors']:
+                    if errors:
+                        errors.write(json.dumps(dict(error, file=path), ensure_ascii=False) + "\n")
+                    else:
+                        self.stderr.write(f"{path}:{error['line']}: {error['error']}")
+        finally:
+            if errors:
+                errors.close()
+
+        self.stdout.write(self.style.SUCCESS(f"Imported {created} texts, {failed} records failed"))
+
+    @staticmethod
+    def _collect_files(paths):
+        files = []
+        for path in paths:
+            if path == '-' or os.path.isfile(path):
+                files.append(path)
+            elif os.path.isdir(path):
+                files.extend(sorted(
+                    os.path.join(path, name) for name in os.listdir(path)
+                    if name.endswith(('.jsonl', '.ndjson'))
+                ))
+            else:
+                raise CommandError(f"No such file or directory: {path}")
+        return files
@@ -0,0 +1,18 @@
+from django.core.management.base import BaseCommand
+from db.services.embedding_jobs import enqueue_outdated, run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = "Queue embedding jobs for texts chunked by an outdated chunker version"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--all', action='store_true', help="Re-embed every ready text")
+        parser.add_argument('--batch-size', type=int, default=1000)
+        parser.add_argument('--run', action='store_true', help="Process the queue in this process and exit")
+
+    def handle(self, *args, **options):
+        queued = enqueue_outdated(options['all'], options['batch_size'])
+        self.stdout.write(f"Queued {queued} texts for re-embedding")
+        if options['run']:
+            processed = run_pending_jobs()
+            self.stdout.write(self.style.SUCCESS(f"Processed {processed} jobs"))
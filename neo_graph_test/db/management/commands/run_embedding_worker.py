@@ -0,0 +1,25 @@
+from django.conf import settings
+from django.core.management.base import BaseCommand
+from db.services.embedding_jobs import EmbeddingWorker, run_pending_jobs
+
+
+class Command(BaseCommand):
+    help = "Process background text embedding jobs"
+
+    def add_arguments(self, parser):
+        parser.add_argument('--threads', type=int, default=1)
+        parser.add_argument('--once', action='store_true', help="Process the current queue and exit")
+
+    def handle(self, *args, **options):
+        if options['once']:
+            processed = run_pending_jobs()
+            self.stdout.write(self.style.SUCCESS(f"Processed {processed} jobs"))
+            return
+
+        worker = EmbeddingWorker(options['threads'], settings.EMBEDDING_WORKER_POLL_INTERVAL)
+        worker.start()
+        self.stdout.write(f"Embedding worker started with {options['threads']} threads")
+        try:
+            worker.join()
+        except KeyboardInterrupt:
+            worker.stop()
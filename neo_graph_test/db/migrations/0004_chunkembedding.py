@@ -0,0 +1,20 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('db', '0003_auto_20251014_1134'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='ChunkEmbedding',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('key', models.CharField(max_length=64, unique=True, verbose_name='Хэш чанка')),
+                ('model_name', models.CharField(max_length=200, verbose_name='Модель')),
+                ('vector', models.BinaryField(verbose_name='Ембеддинг чанка (float32)')),
+            ],
+        ),
+    ]
@@ -0,0 +1,85 @@
+import json
+import struct
+import numpy as np
+from django.db import migrations, models
+
+# Копия формата db.services.vector_codec на момент миграции (float32, EMB1):
+# миграция не должна зависеть от того, как кодек изменится позже.
+MAGIC = b"EMB1"
+HEADER = struct.Struct("<4sc3xII")
+DTYPES = {b"f": np.dtype("<f4"), b"e": np.dtype("<f2")}
+
+
+def encode_vectors(vectors) -> bytes:
+    matrix = np.asarray(vectors, dtype="<f4")
+    if matrix.size == 0:
+        matrix = matrix.reshape(0, matrix.shape[-1] if matrix.ndim == 2 else 0)
+    if matrix.ndim != 2:
+        raise ValueError(f"Expected a 2-d matrix of embeddings, got shape {matrix.shape}")
+    rows, dim = matrix.shape
+    return HEADER.pack(MAGIC, b"f", rows, dim) + np.ascontiguousarray(matrix).tobytes()
+
+
+def decode_vectors(blob) -> np.ndarray:
+    if blob is None or len(blob) == 0:
+        return np.empty((0, 0), dtype=np.float32)
+    magic, code, rows, dim = HEADER.unpack_from(blob)
+    if magic != MAGIC or code not in DTYPES:
+        raise ValueError("Unknown embeddings format")
+    return np.frombuffer(blob, dtype=DTYPES[code], count=rows * dim, offset=HEADER.size).reshape(rows, dim)
+
+
+def embeddings_to_binary(apps, schema_editor):
+    Text = apps.get_model('db', 'Text')
+    for text in Text.objects.only('id', 'embeddings').iterator():
+        try:
+            vectors = json.loads(text.embeddings) if text.embeddings else []
+        except ValueError:
+            vectors = []
+        if not isinstance(vectors, list):
+            vectors = []
+        Text.objects.filter(id=text.id).update(embeddings_blob=encode_vectors(vectors))
+
+
+def embeddings_to_json(apps, schema_editor):
+    Text = apps.get_model('db', 'Text')
+    for text in Text.objects.only('id', 'embeddings_blob').iterator():
+        vectors = decode_vectors(text.embeddings_blob).astype('float32').tolist()
+        Text.objects.filter(id=text.id).update(embeddings=json.dumps(vectors))
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('db', '0004_chunkembedding'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='text',
+            name='embeddings_blob',
+            field=models.BinaryField(blank=True, null=True),
+        ),
+        # при откате старое поле возвращается допускающим NULL, заполняется embeddings_to_json
+        # и только затем снова становится NOT NULL
+        migrations.AlterField(
+            model_name='text',
+            name='embeddings',
+            field=models.TextField(null=True, verbose_name='Ембеддинг текста'),
+        ),
+        migrations.RunPython(embeddings_to_binary, embeddings_to_json),
+        migrations.RemoveField(
+            model_name='text',
+            name='embeddings',
+        ),
+        migrations.RenameField(
+            model_name='text',
+            old_name='embeddings_blob',
+            new_name='embeddings',
+        ),
+        migrations.AlterField(
+            model_name='text',
+            name='embeddings',
+            field=models.BinaryField(blank=True, null=True, verbose_name='Ембеддинги чанков текста'),
+        ),
+    ]
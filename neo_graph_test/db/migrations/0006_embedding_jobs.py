@@ -0,0 +1,35 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('db', '0005_text_embeddings_binary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='text',
+            name='embedding_status',
+            field=models.CharField(choices=[('pending', 'В очереди'), ('processing', 'Вычисляется'), ('ready', 'Готово'), ('failed', 'Ошибка')], default='ready', max_length=20, verbose_name='Статус эмбеддингов'),
+        ),
+        migrations.AddField(
+            model_name='text',
+            name='embedding_error',
+            field=models.TextField(blank=True, default='', verbose_name='Ошибка вычисления эмбеддингов'),
+        ),
+        migrations.CreateModel(
+            name='EmbeddingJob',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('status', models.CharField(choices=[('pending', 'В очереди'), ('running', 'Выполняется'), ('done', 'Выполнена'), ('failed', 'Ошибка')], db_index=True, default='pending', max_length=20, verbose_name='Статус')),
+                ('attempts', models.PositiveIntegerField(default=0, verbose_name='Попыток')),
+                ('error', models.TextField(blank=True, default='', verbose_name='Ошибка')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Создана')),
+                ('started_at', models.DateTimeField(blank=True, null=True, verbose_name='Начата')),
+                ('finished_at', models.DateTimeField(blank=True, null=True, verbose_name='Завершена')),
+                ('text', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='embedding_jobs', to='db.Text', verbose_name='Текст')),
+            ],
+        ),
+    ]
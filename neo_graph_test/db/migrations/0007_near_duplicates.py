@@ -0,0 +1,35 @@
+from django.db import migrations, models
+import django.db.models.deletion
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('db', '0006_embedding_jobs'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='text',
+            name='centroid',
+            field=models.BinaryField(blank=True, null=True, verbose_name='Средний эмбеддинг текста'),
+        ),
+        migrations.CreateModel(
+            name='NearDuplicate',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('kind', models.CharField(choices=[('text', 'Текст'), ('chunk', 'Чанк')], max_length=10, verbose_name='Уровень')),
+                ('chunk_a', models.IntegerField(blank=True, null=True, verbose_name='Чанк A')),
+                ('chunk_b', models.IntegerField(blank=True, null=True, verbose_name='Чанк B')),
+                ('score', models.FloatField(verbose_name='Косинусная близость')),
+                ('created_at', models.DateTimeField(auto_now_add=True, verbose_name='Найден')),
+                ('corpus', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='near_duplicates', to='db.Corpus', verbose_name='Корпус')),
+                ('text_a', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='db.Text', verbose_name='Текст A')),
+                ('text_b', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='db.Text', verbose_name='Текст B')),
+            ],
+        ),
+        migrations.AddIndex(
+            model_name='nearduplicate',
+            index=models.Index(fields=['corpus', 'kind', '-score'], name='neardup_corpus_kind_score'),
+        ),
+    ]
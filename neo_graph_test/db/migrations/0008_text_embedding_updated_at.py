@@ -0,0 +1,16 @@
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('db', '0007_near_duplicates'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='text',
+            name='embedding_updated_at',
+            field=models.DateTimeField(auto_now=True, db_index=True, null=True, verbose_name='Эмбеддинги изменены'),
+        ),
+    ]
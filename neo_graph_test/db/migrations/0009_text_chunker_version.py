@@ -0,0 +1,18 @@
+# Generated by Django 3.0.14 on 2026-10-18 15:28
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('db', '0008_text_embedding_updated_at'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='text',
+            name='chunker_version',
+            field=models.PositiveSmallIntegerField(blank=True, null=True, verbose_name='Версия разбиения на чанки'),
+        ),
+    ]
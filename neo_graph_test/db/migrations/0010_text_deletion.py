@@ -0,0 +1,22 @@
+# Generated by Django 3.0.14 on 2026-10-18 15:45
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('db', '0009_text_chunker_version'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TextDeletion',
+            fields=[
+                ('id', models.AutoField(auto_created=True, primary_key=True, serialize=False, verbose_name='ID')),
+                ('text_id', models.IntegerField(blank=True, null=True, verbose_name='Текст')),
+                ('corpus_id', models.IntegerField(blank=True, null=True, verbose_name='Корпус')),
+                ('created_at', models.DateTimeField(auto_now_add=True, db_index=True, verbose_name='Удален')),
+            ],
+        ),
+    ]
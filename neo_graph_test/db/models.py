@@ -1,4 +1,6 @@
+from django.conf import settings
 from django.db import models
+from db.services.vector_codec import encode_vectors, decode_vectors
 
 class Corpus(models.Model):
     GENRE = [
@@ -24,7 +26,38 @@ class Text(models.Model):
     title = models.CharField(max_length=300, verbose_name="Название текста")
     description = models.TextField(verbose_name="Описание текста")
     content = models.TextField(verbose_name="Текст")
-    embeddings = models.TextField(verbose_name="Ембеддинг текста")
+    # матрица эмбеддингов чанков в формате db.services.vector_codec
+    embeddings = models.BinaryField(null=True, blank=True, verbose_name="Ембеддинги чанков текста")
+
+    EMBEDDING_PENDING = 'pending'
+    EMBEDDING_PROCESSING = 'processing'
+    EMBEDDING_READY = 'ready'
+    EMBEDDING_FAILED = 'failed'
+    EMBEDDING_STATUS = [
+        (EMBEDDING_PENDING, 'В очереди'),
+        (EMBEDDING_PROCESSING, 'Вычисляется'),
+        (EMBEDDING_READY, 'Готово'),
+        (EMBEDDING_FAILED, 'Ошибка'),
+    ]
+    embedding_status = models.CharField(
+        max_length=20,
+        choices=EMBEDDING_STATUS,
+        default=EMBEDDING_READY,
+        verbose_name="Статус эмбеддингов"
+    )
+    embedding_error = models.TextField(blank=True, default='', verbose_name="Ошибка вычисления эмбеддингов")
+    # время последнего изменения embeddings/embedding_status: по нему индекс поиска
+    # (db/services/vector_index.py) в каждом процессе дочитывает чужие изменения
+    embedding_updated_at = models.DateTimeField(
+        auto_now=True,
+        null=True,
+        db_index=True,
+        verbose_name="Эмбеддинги изменены"
+    )
+    # версия разбиения на чанки (embedding_service.CHUNKER_VERSION), по которой посчитаны embeddings
+    chunker_version = models.PositiveSmallIntegerField(null=True, blank=True, verbose_name="Версия разбиения на чанки")
+    # нормированный средний вектор чанков (1 x dim, формат как у embeddings)
+    centroid = models.BinaryField(null=True, blank=True, verbose_name="Средний эмбеддинг текста")
 
     # Связь с корпусом
     corpus = models.ForeignKey(
@@ -44,6 +77,97 @@ class Text(models.Model):
         verbose_name="Перевод текста"
     )
     
+    def get_embeddings_array(self):
+        return decode_vectors(self.embeddings)
+
+    def set_embeddings_array(self, vectors):
+        self.embeddings = encode_vectors(vectors, settings.EMBEDDING_STORAGE_DTYPE)
+
+    def get_centroid(self):
+        centroid = decode_vectors(self.centroid)
+        return centroid[0] if len(centroid) else None
+
+    def set_centroid(self, vector):
+        self.centroid = None if vector is None else encode_vectors([vector], 'float32')
+
     def __str__(self):
         return self.title
-    
\ No newline at end of file
+
+class ChunkEmbedding(models.Model):
+    # ключ - sha256 от имени модели и нормализованного текста чанка
+    key = models.CharField(max_length=64, unique=True, verbose_name="Хэш чанка")
+    model_name = models.CharField(max_length=200, verbose_name="Модель")
+    vector = models.BinaryField(verbose_name="Ембеддинг чанка (float32)")
+
+    def __str__(self):
+        return self.key
+
+class EmbeddingJob(models.Model):
+    # очередь фоновых задач на вычисление эмбеддингов (см. db/services/embedding_jobs.py)
+    PENDING = 'pending'
+    RUNNING = 'running'
+    DONE = 'done'
+    FAILED = 'failed'
+    STATUS = [
+        (PENDING, 'В очереди'),
+        (RUNNING, 'Выполняется'),
+        (DONE, 'Выполнена'),
+        (FAILED, 'Ошибка'),
+    ]
+
+    text = models.ForeignKey(
+        Text,
+        on_delete=models.CASCADE,
+        related_name='embedding_jobs',
+        verbose_name="Текст"
+    )
+    status = models.CharField(max_length=20, choices=STATUS, default=PENDING, db_index=True, verbose_name="Статус")
+    attempts = models.PositiveIntegerField(default=0, verbose_name="Попыток")
+    error = models.TextField(blank=True, default='', verbose_name="Ошибка")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Создана")
+    started_at = models.DateTimeField(null=True, blank=True, verbose_name="Начата")
+    finished_at = models.DateTimeField(null=True, blank=True, verbose_name="Завершена")
+
+    def __str__(self):
+        return f"{self.text_id}: {self.status}"
+
+class TextDeletion(models.Model):
+    # удаление текста (text_id) или корпуса со всеми текстами (corpus_id): по этим записям индексы
+    # поиска других процессов (db/services/vector_index.py) узнают, какие тексты убрать
+    text_id = models.IntegerField(null=True, blank=True, verbose_name="Текст")
+    corpus_id = models.IntegerField(null=True, blank=True, verbose_name="Корпус")
+    created_at = models.DateTimeField(auto_now_add=True, db_index=True, verbose_name="Удален")
+
+    def __str__(self):
+        return f"text {self.text_id}" if self.text_id is not None else f"corpus {self.corpus_id}"
+
+class NearDuplicate(models.Model):
+    # результат поиска почти-дубликатов внутри корпуса (см. db/services/duplicate_service.py)
+    TEXT = 'text'
+    CHUNK = 'chunk'
+    KIND = [
+        (TEXT, 'Текст'),
+        (CHUNK, 'Чанк'),
+    ]
+
+    corpus = models.ForeignKey(
+        Corpus,
+        on_delete=models.CASCADE,
+        related_name='near_duplicates',
+        verbose_name="Корпус"
+    )
+    kind = models.CharField(max_length=10, choices=KIND, verbose_name="Уровень")
+    text_a = models.ForeignKey(Text, on_delete=models.CASCADE, related_name='+', verbose_name="Текст A")
+    text_b = models.ForeignKey(Text, on_delete=models.CASCADE, related_name='+', verbose_name="Текст B")
+    chunk_a = models.IntegerField(null=True, blank=True, verbose_name="Чанк A")
+    chunk_b = models.IntegerField(null=True, blank=True, verbose_name="Чанк B")
+    score = models.FloatField(verbose_name="Косинусная близость")
+    created_at = models.DateTimeField(auto_now_add=True, verbose_name="Найден")
+
+    class Meta:
+        indexes = [
+            models.Index(fields=['corpus', 'kind', '-score'], name='neardup_corpus_kind_score'),
+        ]
+
+    def __str__(self):
+        return f"{self.text_a_id} ~ {self.text_b_id} ({self.score:.3f})"
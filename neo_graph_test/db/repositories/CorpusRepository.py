@@ -1,5 +1,6 @@
 from typing import List, Optional
-from db.models import Corpus
+from db.models import Corpus, NearDuplicate
+from db.services import vector_index
 
 class CorpusRepository:
     
@@ -28,7 +29,9 @@ class CorpusRepository:
     @staticmethod
     def delete(corpus: Corpus) -> bool:
         try:
+            corpus_id = corpus.id
             corpus.delete()
+            vector_index.unindex_corpus(corpus_id)
             return True
         except Exception:
             return False
@@ -38,4 +41,10 @@ class CorpusRepository:
         try:
             return Corpus.objects.prefetch_related('texts').get(id=corpus_id)
         except Corpus.DoesNotExist:
-            return None
\ No newline at end of file
+            return None
+
+    @staticmethod
+    def get_near_duplicates(corpus_id: int, kind: str, min_score: float = 0.0) -> List[NearDuplicate]:
+        return (NearDuplicate.objects
+                .filter(corpus_id=corpus_id, kind=kind, score__gte=min_score)
+                .order_by('-score', 'id'))
@@ -1,46 +1,121 @@
-from typing import List, Optional
+from typing import Dict, List, Optional
+import numpy as np
+from django.db.models import Q
+from django.utils import timezone
 from db.models import Text
-from db.services.embedding_service import EmbeddingService
-import json
+from db.services.vector_codec import decode_vectors
+from db.services.embedding_service import EmbeddingService, CHUNKER_VERSION
+from db.services import vector_index
 
 class TextRepository:
-    
+    # колонки без содержимого и эмбеддингов - для списков и проверок
+    METADATA_FIELDS = ['id', 'title', 'description', 'corpus', 'has_translation', 'embedding_status', 'embedding_error']
+    # тяжелые колонки: без явного запроса не читаются, Django дочитает поле при первом обращении к нему
+    HEAVY_FIELDS = ['content', 'embeddings', 'centroid']
+    # колонки, которые пишет save_embeddings
+    EMBEDDING_FIELDS = ['embeddings', 'centroid', 'chunker_version', 'embedding_status', 'embedding_error']
+
     @staticmethod
-    def get_all() -> List[Text]:
-        return Text.objects.select_related('corpus', 'has_translation').all()
+    def get_all(fields: Optional[List[str]] = None) -> List[Text]:
+        return TextRepository._select(fields)
     
     @staticmethod
-    def get_by_id(text_id: int) -> Optional[Text]:
+    def get_by_id(text_id: int, fields: Optional[List[str]] = None) -> Optional[Text]:
+        """fields - колонки, читаемые сразу (по умолчанию все, кроме HEAVY_FIELDS)"""
         try:
-            return Text.objects.select_related('corpus', 'has_translation').get(id=text_id)
+            return TextRepository._select(fields).get(id=text_id)
         except Text.DoesNotExist:
             return None
+
+    @staticmethod
+    def exists(text_id: int) -> bool:
+        return Text.objects.filter(id=text_id).exists()
     
     @staticmethod
-    def create(text_data: dict) -> Text:
-        service = EmbeddingService()
-        chunks = service.get_chunks(text_data.get('content'))
-        text_data["embeddings"] = json.dumps(service.get_embeddings(chunks).tolist())
-        return Text.objects.create(**text_data)
+    def create(text_data: dict, embed: bool = True) -> Text:
+        """embed=False - сохранить текст сразу, эмбеддинги посчитает фоновая задача"""
+        text = Text(**text_data)
+        if embed:
+            TextRepository._embed(text)
+        else:
+            text.embedding_status = Text.EMBEDDING_PENDING
+        text.save()
+        vector_index.index_text(text)
+        return text
     
     @staticmethod
-    def update(text: Text, text_data: dict) -> Text:
+    def update(text: Text, text_data: dict, embed: bool = True) -> Text:
         for field, value in text_data.items():
             setattr(text, field, value)
-        service = EmbeddingService()
-        chunks = service.get_chunks(text_data.get('content'))
-        text_data["embeddings"] = json.dumps(service.get_embeddings(chunks).tolist())
+        if 'content' in text_data:
+            if embed:
+                TextRepository._embed(text)
+            else:
+                text.embedding_status = Text.EMBEDDING_PENDING
         text.save()
+        vector_index.index_text(text)
         return text
+
+    @staticmethod
+    def save_embeddings(text: Text, only_if: Optional[Q] = None) -> bool:
+        """
+        Считает эмбеддинги по text.content и пишет их одним UPDATE ... WHERE: если содержимое текста
+        в базе уже другое или не выполняется условие only_if, ничего не пишется и возвращается False
+        """
+        TextRepository._embed(text)
+        rows = Text.objects.filter(id=text.id, content=text.content)
+        if only_if is not None:
+            rows = rows.filter(only_if)
+        values = {field: getattr(text, field) for field in TextRepository.EMBEDDING_FIELDS}
+        if not rows.update(embedding_updated_at=timezone.now(), **values):
+            return False
+        vector_index.index_text(text)
+        return True
     
     @staticmethod
     def delete(text: Text) -> bool:
         try:
+            text_id = text.id
             text.delete()
+            vector_index.unindex_text(text_id)
             return True
         except Exception:
             return False
     
     @staticmethod
-    def get_by_corpus(corpus_id: int) -> List[Text]:
-        return Text.objects.filter(corpus_id=corpus_id).select_related('has_translation')
\ No newline at end of file
+    def get_by_corpus(corpus_id: int, fields: Optional[List[str]] = None) -> List[Text]:
+        return TextRepository._select(fields).filter(corpus_id=corpus_id)
+
+    @staticmethod
+    def get_page_by_corpus(corpus_id: int, fields: List[str], after_id: Optional[int] = None,
+                           limit: Optional[int] = None) -> List[Text]:
+        """Тексты корпуса по возрастанию id, начиная после after_id; из БД читаются только fields"""
+        texts = TextRepository._select(fields).filter(corpus_id=corpus_id).order_by('id')
+        if after_id is not None:
+            texts = texts.filter(id__gt=after_id)
+        if limit is not None:
+            texts = texts[:limit]
+        return texts
+
+    @staticmethod
+    def get_embeddings_by_ids(text_ids: List[int]) -> Dict[int, np.ndarray]:
+        rows = Text.objects.filter(id__in=text_ids).values_list('id', 'embeddings')
+        return {text_id: decode_vectors(embeddings) for text_id, embeddings in rows}
+
+    @staticmethod
+    def _select(fields: Optional[List[str]]):
+        if fields is None:
+            return Text.objects.defer(*TextRepository.HEAVY_FIELDS).select_related('corpus')
+        texts = Text.objects.only(*fields)
+        return texts.select_related('corpus') if 'corpus' in fields else texts
+
+    @staticmethod
+    def _embed(text: Text):
+        service = EmbeddingService()
+        chunks = service.get_chunks(text.content or '')
+        embeddings = service.get_embeddings(chunks)
+        text.set_embeddings_array(embeddings)
+        text.set_centroid(service.centroid(embeddings) if len(embeddings) else None)
+        text.chunker_version = CHUNKER_VERSION
+        text.embedding_status = Text.EMBEDDING_READY
+        text.embedding_error = ''
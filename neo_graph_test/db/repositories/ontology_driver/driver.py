@@ -1,12 +1,15 @@
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Iterator
+from neo4j import Driver
 from .python_driver.driver import GraphRepository
 from .entities import Class, ClassSignature, Object, ObjectProperty, DatatypeProperty, Ontology
 from .python_driver.entities import TNode, TArc
 from .onthology_namespace import *
 
 class OntologyRepository:
-    def __init__(self, uri: str, user: str, password: str):
-        self.graph_repository = GraphRepository(uri, user, password)
+    def __init__(self, uri: str, user: str, password: str, database: str = "neo4j",
+                 driver: Optional[Driver] = None, track_version: bool = False):
+        self.graph_repository = GraphRepository(uri, user, password, database, driver, ONTOLOGY_LABELS,
+                                                track_version)
         
     def close(self):
         self.graph_repository.close()
@@ -19,32 +22,57 @@ class OntologyRepository:
     def __exit__(self, exc_type, exc_val, exc_tb):
         self.close()
 
+    def ensure_schema(self) -> List[str]:
+        return self.graph_repository.ensure_uri_constraints(ONTOLOGY_LABELS)
+
     ######################################
     #      Ontology  methods             #
     ######################################
     def get_ontology(self) -> Ontology: 
-        classes = self.graph_repository.get_all_nodes()
-        signatures = [self.collect_signature(cls.uri) for cls in classes if cls.labels.count(CLASS)]
+        # два запроса на всю онтологию: узлы и дуги иерархии/доменов,
+        # сигнатуры наследуются уже в памяти
+        nodes = self.graph_repository.get_nodes_with_any_label(ONTOLOGY_LABELS)
+        arcs = self.graph_repository.get_arcs_by_labels([SUB_CLASS, PROPERTY_DOMAIN])
+
+        entities = {}
+        for node in nodes:
+            entity = self._collect_from_node(node)
+            if entity is not None:
+                entities[entity.uri] = entity
+
+        class_uris = [uri for uri, entity in entities.items() if type(entity) is Class]
+        parents = {uri: [] for uri in class_uris}
+        own_properties = {uri: [] for uri in class_uris}
+
+        for arc in arcs:
+            if arc.node_uri_to not in parents:
+                continue
+            if arc.label == SUB_CLASS and arc.node_uri_from in parents:
+                parents[arc.node_uri_from].append(arc.node_uri_to)
+            elif arc.label == PROPERTY_DOMAIN:
+                prop = entities.get(arc.node_uri_from)
+                if type(prop) in (DatatypeProperty, ObjectProperty):
+                    own_properties[arc.node_uri_to].append(prop)
 
-        objects_query = self.graph_repository.get_all_nodes()
-        objects = [self._collect_from_node(obj) for obj in objects_query if obj.labels.count(OBJECT)]
+        inherited = self._inherit_properties(class_uris, parents, own_properties)
+        signatures = [
+            ClassSignature(
+                uri,
+                [prop for prop in inherited[uri] if type(prop) is DatatypeProperty],
+                [prop for prop in inherited[uri] if type(prop) is ObjectProperty]
+            )
+            for uri in class_uris
+        ]
+
+        objects = [entity for entity in entities.values() if type(entity) is Object]
 
         return Ontology(signatures, objects)
 
-    def get_ontology_parent_classes(self) -> List[Class]:
-        all_nodes = self.graph_repository.get_all_nodes()
-        root_classes = []
-        
-        for node in all_nodes:
-            if CLASS in node.labels:
-                # Проверяем, есть ли у класса родители
-                parents = self.get_class_parents(node.props.get(self.URI))
-                if not parents:  # Если родителей нет - это корневой класс
-                    class_obj = self._collect_from_node(node)
-                    if isinstance(class_obj, Class):
-                        root_classes.append(class_obj)
-        
-        return root_classes
+    def get_ontology_parent_classes(self, offset: int = 0, limit: Optional[int] = None) -> List[Class]:
+        # корневые классы - классы без исходящей дуги subClassOf
+        nodes = self.graph_repository.get_root_nodes([CLASS], SUB_CLASS, offset, limit)
+        root_classes = [self._collect_from_node(node) for node in nodes]
+        return [cls for cls in root_classes if isinstance(cls, Class)]
 
     ######################################
     #   Class management methods         #
@@ -66,6 +94,15 @@ class OntologyRepository:
         nodes = [self._collect_from_node(node) for node in result]    
         return nodes
 
+    def iter_graph(self, page_size: int = 10000, fetch_size: Optional[int] = None) -> Iterator[TNode]:
+        """Все узлы с исходящими дугами потоком, без сборки графа в памяти"""
+        return self.graph_repository.iter_all_nodes_and_arcs(page_size, fetch_size)
+
+    def get_subclass_uris(self, uri: str) -> List[str]:
+        """uri класса и всех его потомков по subClassOf"""
+        nodes = self.graph_repository.get_incoming_closure(uri, [SUB_CLASS])
+        return [node.uri for node in nodes]
+
     def get_class_objects(self, uri: str) -> List[Object]:
         children = self.get_class_children(uri)
         return [child for child in children if type(child) is Object]   
@@ -82,19 +119,20 @@ class OntologyRepository:
     def add_class_parent(self, parent_uri: str, target_uri: str): 
         self.graph_repository.create_arc(target_uri, parent_uri, SUB_CLASS)
 
-    def delete_class(self, uri: str):
-        node = self.graph_repository.get_node_by_uri(uri)
-        nodes = self.graph_repository.get_arcs_to_node(uri)
-        self.graph_repository.delete_node_by_uri(uri)
-
-        while len(nodes):
-            new_nodes = []
-            for node in nodes:
-                children = self.graph_repository.get_arcs_to_node(node.props.get(self.URI))
-                for child in children:
-                    new_nodes.append(child)
-                self.graph_repository.delete_node_by_uri(node.props.get(self.URI))
-            nodes = new_nodes
+    def delete_class(self, uri: str, batch_size: Optional[int] = None) -> int:
+        """
+        Удаляет класс каскадом: подклассы, объекты, свойства с доменом или областью значений в удаляемых
+        классах и т.д. - все узлы, из которых класс достижим по входящим дугам.
+        Returns:
+            int: количество удаленных узлов (0 - класс не найден)
+        """
+        return self.graph_repository.delete_incoming_closure(uri, batch_size)
+
+    def get_class_delete_closure(self, uri: str) -> List[Class|Object|DatatypeProperty|ObjectProperty]:
+        """Что удалит delete_class(uri), без удаления"""
+        nodes = self.graph_repository.get_incoming_closure(uri)
+        entities = [self._collect_from_node(node) for node in nodes]
+        return [entity for entity in entities if entity is not None]
           
     #######################################
     # Class attributes management methods #
@@ -109,8 +147,10 @@ class OntologyRepository:
 
     def add_class_object_attribute(self, class_uri: str, attr_name: str, range_class_uri: str): 
         node = self.graph_repository.create_node([PROPERTY_LABEL_OBJECT], {self.TITLE: attr_name})
-        self.graph_repository.create_arc(node.props.get(self.URI), class_uri, PROPERTY_DOMAIN)
-        self.graph_repository.create_arc(node.props.get(self.URI), range_class_uri, PROPERTY_RANGE)
+        self.graph_repository.create_arcs_bulk([
+            (node.uri, class_uri, PROPERTY_DOMAIN, {}),
+            (node.uri, range_class_uri, PROPERTY_RANGE, {}),
+        ])
         return node.uri
     
     def delete_class_object_attribute(self, object_property_uri: str): 
@@ -130,19 +170,20 @@ class OntologyRepository:
         return self.graph_repository.delete_node_by_uri(uri)
 
     def create_object(self, class_uri: str, title: str, description: str = "", 
-                     properties: Dict[str, Any] = {}, 
+                     properties: Dict[str, Any] = None, 
                      object_properties: Dict[str, str] = None) -> str:
+        properties = dict(properties or {})
         properties.update({
             self.TITLE: title,
             self.DESCRIPTION: description
         })
          
         node = self.graph_repository.create_node([OBJECT], properties)
-        self.graph_repository.create_arc(node.uri, class_uri, HAS_TYPE)
-        
-        if object_properties:
-            for prop_label, target_uri in object_properties.items():
-                self.graph_repository.create_arc(node.uri, target_uri, prop_label)
+        # тип и все связи объекта - одной транзакцией
+        arcs = [(node.uri, class_uri, HAS_TYPE, {})]
+        for prop_label, target_uri in (object_properties or {}).items():
+            arcs.append((node.uri, target_uri, prop_label, {}))
+        self.graph_repository.create_arcs_bulk(arcs)
         
         return node.uri
 
@@ -162,31 +203,182 @@ class OntologyRepository:
             self.graph_repository.update_node(uri, set_props=set_props)
         
         if new_connections:
-            for prop_label, target_uri in new_connections.items():
-                self.graph_repository.create_arc(uri, target_uri, prop_label, {})
+            self.graph_repository.create_arcs_bulk([
+                (uri, target_uri, prop_label, {}) for prop_label, target_uri in new_connections.items()
+            ])
         
         return True
     
+    #######################################
+    #          Bulk import                #
+    #######################################
+    def import_ontology(self, classes: List[Dict[str, Any]] = (), attributes: List[Dict[str, Any]] = (),
+                        object_attributes: List[Dict[str, Any]] = (),
+                        objects: List[Dict[str, Any]] = ()) -> Dict[str, Any]:
+        """
+        Массовое создание классов, свойств и объектов: все узлы - create_nodes_bulk, все дуги - create_arcs_bulk.
+        Записи ссылаются друг на друга по полю ref; ссылка, не совпавшая ни с одним ref,
+        должна быть uri уже существующего узла. Все записи и ссылки проверяются до записи в базу,
+        при ошибке ничего не создается (ValueError).
+            classes:           {ref, title, description, parents: [ref]}
+            attributes:        {ref, title, class: ref}
+            object_attributes: {ref, title, class: ref, range: ref}
+            objects:           {ref, title, description, class: ref, properties: {}, object_properties: {label: ref}}
+        Returns:
+            Dict: {'uris': {ref: uri}, 'nodes': int, 'arcs': int, 'skipped_arcs': int}
+        """
+        sections = [
+            (classes, [CLASS]),
+            (attributes, [PROPERTY_LABEL]),
+            (object_attributes, [PROPERTY_LABEL_OBJECT]),
+            (objects, [OBJECT]),
+        ]
+
+        # проверяем все записи до первой записи в базу
+        refs = set()
+        nodes = []
+        for items, labels in sections:
+            for item in items:
+                if not item.get(self.TITLE):
+                    raise ValueError(f"title is required: {item}")
+                ref = item.get('ref')
+                if ref is not None:
+                    self._check_ref(ref, 'ref')
+                    if ref in refs:
+                        raise ValueError(f"Duplicate ref: {ref}")
+                    refs.add(ref)
+
+                props = dict(item.get('properties') or {}) if labels == [OBJECT] else {}
+                props[self.TITLE] = item[self.TITLE]
+                if labels in ([CLASS], [OBJECT]):
+                    props[self.DESCRIPTION] = item.get(self.DESCRIPTION, "")
+                nodes.append((labels, props))
+
+        references = []
+        for item in classes:
+            parents = item.get('parents') or []
+            if not isinstance(parents, list):
+                raise ValueError(f"parents must be a list: {item}")
+            references.extend(self._check_ref(parent, 'parents') for parent in parents)
+        for item in list(attributes) + list(object_attributes) + list(objects):
+            if item.get('class') is None:
+                raise ValueError(f"class is required: {item}")
+            references.append(self._check_ref(item['class'], 'class'))
+        for item in object_attributes:
+            if item.get('range') is None:
+                raise ValueError(f"range is required: {item}")
+            references.append(self._check_ref(item['range'], 'range'))
+        for item in objects:
+            object_properties = item.get('object_properties') or {}
+            if not isinstance(object_properties, dict):
+                raise ValueError(f"object_properties must be an object: {item}")
+            references.extend(self._check_ref(target, 'object_properties') for target in object_properties.values())
+
+        # ссылка не на ref из запроса должна быть uri существующего узла - один запрос на все
+        external = {reference for reference in references if reference not in refs}
+        if external:
+            missing = external - self.graph_repository.get_existing_uris(
+                [reference for reference in external if isinstance(reference, str)])
+            if missing:
+                raise ValueError(f"Unknown refs: {', '.join(sorted(map(str, missing)))}")
+
+        uris = self.graph_repository.create_nodes_bulk(nodes)
+
+        created = iter(uris)
+        section_uris = [[next(created) for _ in items] for items, _ in sections]
+        resolved = {}
+        for (items, _), item_uris in zip(sections, section_uris):
+            for item, uri in zip(items, item_uris):
+                if item.get('ref') is not None:
+                    resolved[item['ref']] = uri
+        resolve = lambda ref: resolved.get(ref, ref)
+        class_uris, attribute_uris, object_attribute_uris, object_uris = section_uris
+
+        arcs = []
+        for item, uri in zip(classes, class_uris):
+            for parent in item.get('parents') or []:
+                arcs.append((uri, resolve(parent), SUB_CLASS, {}))
+        for item, uri in zip(attributes, attribute_uris):
+            arcs.append((uri, resolve(item.get('class')), PROPERTY_DOMAIN, {}))
+        for item, uri in zip(object_attributes, object_attribute_uris):
+            arcs.append((uri, resolve(item.get('class')), PROPERTY_DOMAIN, {}))
+            arcs.append((uri, resolve(item.get('range')), PROPERTY_RANGE, {}))
+        for item, uri in zip(objects, object_uris):
+            arcs.append((uri, resolve(item.get('class')), HAS_TYPE, {}))
+            for prop_label, target in (item.get('object_properties') or {}).items():
+                arcs.append((uri, resolve(target), prop_label, {}))
+
+        created_arcs = self.graph_repository.create_arcs_bulk(arcs)
+
+        return {
+            'uris': resolved,
+            'nodes': len(uris),
+            'arcs': len(created_arcs),
+            'skipped_arcs': len(arcs) - len(created_arcs),
+        }
+
+    @staticmethod
+    def _check_ref(value: Any, field: str) -> Any:
+        if isinstance(value, bool) or not isinstance(value, (str, int)):
+            raise ValueError(f"{field} must contain refs or uris, got: {value!r}")
+        return value
+
     def collect_signature(self, class_uri: str) -> ClassSignature:
-        datatype_properties = []
-        object_properties = []
-
-        frontier = [class_uri]
-        while len(frontier):
-            new_frontier = []
-            for front in frontier:
-                toclass_edges = self.get_class_children(front)
-                [datatype_properties.append(datap) for datap in toclass_edges if type(datap) is DatatypeProperty]
-                [object_properties.append(objectp) for objectp in toclass_edges if type(objectp) is ObjectProperty]
-            
-                fromclass_edges = self.get_class_parents(front)
-                [new_frontier.append(child.uri) for child in fromclass_edges if type(child) is Class]    
-
-            frontier = new_frontier
+        # свойства самого класса и всех его предков по subClassOf, одним запросом
+        nodes = self.graph_repository.get_inherited_nodes(
+            class_uri, SUB_CLASS, PROPERTY_DOMAIN, [PROPERTY_LABEL, PROPERTY_LABEL_OBJECT])
+        properties = [self._collect_from_node(node) for node in nodes]
+
+        datatype_properties = [prop for prop in properties if type(prop) is DatatypeProperty]
+        object_properties = [prop for prop in properties if type(prop) is ObjectProperty]
     
         return ClassSignature(class_uri, datatype_properties, object_properties)
 
 
+    @staticmethod
+    def _inherit_properties(class_uris: List[str], parents: Dict[str, List[str]],
+                            own_properties: Dict[str, List[Any]]) -> Dict[str, List[Any]]:
+        """
+        Свойства каждого класса вместе с унаследованными.
+        Результат для каждого предка считается один раз и переиспользуется потомками,
+        обход итеративный (глубокие иерархии не упираются в лимит рекурсии),
+        дуга, замыкающая цикл, игнорируется.
+        """
+        resolved = {}
+
+        for start in class_uris:
+            if start in resolved:
+                continue
+
+            in_progress = set()
+            stack = [(start, False)]
+            while stack:
+                uri, expanded = stack.pop()
+                if uri in resolved:
+                    continue
+
+                if expanded:
+                    props = list(own_properties.get(uri, []))
+                    seen = {prop.uri for prop in props}
+                    for parent in parents.get(uri, []):
+                        for prop in resolved.get(parent, []):
+                            if prop.uri not in seen:
+                                seen.add(prop.uri)
+                                props.append(prop)
+                    resolved[uri] = props
+                    in_progress.discard(uri)
+                    continue
+
+                if uri in in_progress:
+                    continue
+                in_progress.add(uri)
+                stack.append((uri, True))
+                for parent in parents.get(uri, []):
+                    if parent not in resolved and parent not in in_progress:
+                        stack.append((parent, False))
+
+        return resolved
+
     def _collect_from_node(self, node: TNode) -> Optional[Class|Object|DatatypeProperty|ObjectProperty]:
         if node == None or node.props.get(self.URI) == None or node.props.get(self.TITLE) == None:
             return None
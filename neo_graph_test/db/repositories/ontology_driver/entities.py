@@ -1,24 +1,37 @@
 from typing import List, Dict, Any
 from dataclasses import dataclass
 
-@dataclass
+# Сущности онтологии неизменяемы и без __dict__ (slots).
+# to_dict() - замена dataclasses.asdict для ответов сервиса: поля - строки и списки сущностей,
+# так что рекурсивное глубокое копирование asdict не нужно.
+
+@dataclass(slots=True, frozen=True)
 class Class:
     uri: str
     title: str
     description: str
 
-@dataclass
+    def to_dict(self) -> Dict[str, Any]:
+        return {'uri': self.uri, 'title': self.title, 'description': self.description}
+
+@dataclass(slots=True, frozen=True)
 class DatatypeProperty:
     uri: str
     title: str
 
-@dataclass
+    def to_dict(self) -> Dict[str, Any]:
+        return {'uri': self.uri, 'title': self.title}
+
+@dataclass(slots=True, frozen=True)
 class ObjectProperty:
     uri: str
     title: str
 #    allowed_classes: List[Class]
 
-@dataclass
+    def to_dict(self) -> Dict[str, Any]:
+        return {'uri': self.uri, 'title': self.title}
+
+@dataclass(slots=True, frozen=True)
 class Object:
     uri: str
     title: str
@@ -26,13 +39,29 @@ class Object:
     # properties: Dict[str, Any]  # (DatatypeProperty.title, property_value)
     # object_properties: Dict[str, str] # (ObjectProperty.title, object_uri)
 
-@dataclass
+    def to_dict(self) -> Dict[str, Any]:
+        return {'uri': self.uri, 'title': self.title, 'description': self.description}
+
+@dataclass(slots=True, frozen=True)
 class ClassSignature:
     uri: str
     params: List[DatatypeProperty]  
     obj_params: List[ObjectProperty]    
 
-@dataclass
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'uri': self.uri,
+            'params': [param.to_dict() for param in self.params],
+            'obj_params': [param.to_dict() for param in self.obj_params],
+        }
+
+@dataclass(slots=True, frozen=True)
 class Ontology:
     signatures: List[ClassSignature]
-    objects: List[Object]
\ No newline at end of file
+    objects: List[Object]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'signatures': [signature.to_dict() for signature in self.signatures],
+            'objects': [obj.to_dict() for obj in self.objects],
+        }
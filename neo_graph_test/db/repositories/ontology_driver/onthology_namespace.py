@@ -36,6 +36,9 @@ PROPERTY_RANGE = "range"
 PROPERTY_LABEL = "DatatypeProperty"
 PROPERTY_LABEL_OBJECT = "ObjectProperty"
 
+# метки узлов онтологии, по uri которых строятся уникальные индексы
+ONTOLOGY_LABELS = [CLASS, OBJECT, PROPERTY_LABEL, PROPERTY_LABEL_OBJECT]
+
 NOTE = "http://erlangen-crm.org/current/P3_has_note"
 TITLE = "http://www.w3.org/2000/01/rdf-schema#label"
 
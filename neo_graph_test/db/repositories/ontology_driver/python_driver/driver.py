@@ -1,16 +1,51 @@
-from typing import List, Dict, Any, Optional, Tuple
+from typing import List, Dict, Any, Optional, Tuple, Callable, Iterator, Set
+import logging
 import uuid
-from neo4j import GraphDatabase, Result, Record
+from neo4j import GraphDatabase, Driver, Result, Record
 import json
-from .entities import TNode, TArc
+from .entities import TNode, TArc, PropertyView
+
+logger = logging.getLogger(__name__)
+
+# Узел-счетчик версии графа: при track_version каждая транзакция записи через GraphRepository
+# увеличивает его value, по нему другие процессы замечают изменения (см. get_version).
+# Узел один (VERSION_LABEL {id: VERSION_ID}, уникальность - ensure_uri_constraints).
+# В выборках узлов графа он пропускается.
+VERSION_LABEL = "GraphVersion"
+VERSION_ID = "graph"
 
 class GraphRepository:
-    def __init__(self, uri: str, user: str, password: str, database: str = "neo4j"):
-        self.driver = GraphDatabase.driver(uri, auth=(user, password))
+    # подписчики на изменения, сделанные через любой экземпляр репозитория в этом процессе:
+    # listener(database, event, payload, version), события - см. _notify в методах записи;
+    # version - версия графа после записи (None, если неизвестна)
+    _change_listeners: List[Callable[[str, str, Any, Optional[int]], None]] = []
+
+    def __init__(self, uri: str, user: str, password: str, database: str = "neo4j",
+                 driver: Optional[Driver] = None, uri_labels: Optional[List[str]] = None,
+                 track_version: bool = False):
+        # если драйвер передан снаружи (общий пул), то закрывает его владелец, а не репозиторий
+        self._owns_driver = driver is None
+        self.driver = driver if driver is not None else GraphDatabase.driver(uri, auth=(user, password))
         self.database = database
+        # метки, на которых есть уникальный индекс по uri (см. ensure_uri_constraints);
+        # поиск по uri идет через эти индексы, а не полным сканированием узлов
+        self.uri_labels = uri_labels or []
+        # увеличивать ли версию графа при записи: узел версии общий для всех записей,
+        # поэтому без тех, кто ее читает (копия онтологии в памяти), счетчик не ведется
+        self.track_version = track_version
         
     def close(self):
-        self.driver.close()
+        if self._owns_driver:
+            self.driver.close()
+
+    @classmethod
+    def add_change_listener(cls, listener: Callable[[str, str, Any, Optional[int]], None]):
+        cls._change_listeners.append(listener)
+
+    @classmethod
+    def remove_change_listener(cls, listener: Callable[[str, str, Any, Optional[int]], None]):
+        if listener in cls._change_listeners:
+            cls._change_listeners.remove(listener)
 
     # method to use with with ... as construction
     def __enter__(self):
@@ -25,11 +60,24 @@ class GraphRepository:
     #   Node getter methods   #
     ######################################
     def get_all_nodes(self) -> List[TNode]:        
-        with self.driver.session(database=self.database) as session:
-            result = session.run("MATCH (n) RETURN n")
+        return list(self.iter_all_nodes())
 
-            nodes = [self._collect_node(record["n"]) for record in result]    
-            return nodes
+    def iter_all_nodes(self, page_size: int = 10000, fetch_size: Optional[int] = None) -> Iterator[TNode]:
+        """
+        Все узлы потоком: страницы по page_size узлов упорядочены по внутреннему id
+        (каждая - отдельный короткий запрос, следующая начинается после последнего id),
+        записи внутри страницы драйвер забирает порциями по fetch_size.
+        """
+        query = f"""
+        MATCH (n)
+        WHERE id(n) > $after AND NOT n:`{VERSION_LABEL}`
+        RETURN n, id(n) AS internal_id
+        ORDER BY internal_id
+        LIMIT $page_size
+        """
+
+        for record in self._iter_pages(query, page_size, fetch_size):
+            yield self._collect_node(record["n"])
         
     def get_nodes_by_labels(self, labels: List[str]) -> List[TNode]:
         if not labels:
@@ -43,9 +91,48 @@ class GraphRepository:
             nodes = [self._collect_node(record["n"]) for record in result]    
             return nodes
 
+    def get_nodes_with_any_label(self, labels: List[str]) -> List[TNode]:
+        # в отличие от get_nodes_by_labels метки объединяются через ИЛИ
+        query = """
+        MATCH (n)
+        WHERE any(label IN labels(n) WHERE label IN $labels)
+        RETURN n
+        """
+
+        with self.driver.session(database=self.database) as session:
+            result = session.run(query, labels=labels)
+
+            nodes = [self._collect_node(record["n"]) for record in result]
+            return nodes
+
+
+    def get_root_nodes(self, labels: List[str], arc_label: str,
+                       skip: int = 0, limit: Optional[int] = None) -> List[TNode]:
+        """
+        Узлы с метками labels без исходящих дуг arc_label (корни иерархии).
+        Порядок стабилен (по uri), поэтому skip/limit можно использовать для постраничной выдачи.
+        """
+        query = f"""
+        MATCH (n:{self._transform_labels(labels)})
+        WHERE NOT (n)-[:`{arc_label}`]->()
+        RETURN n
+        ORDER BY n.uri
+        SKIP $skip
+        """
+        if limit is not None:
+            query += "LIMIT $limit"
+
+        with self.driver.session(database=self.database) as session:
+            result = session.run(query, skip=skip, limit=limit)
+
+            nodes = [self._collect_node(record["n"]) for record in result]
+            return nodes
 
     def get_node_by_uri(self, uri: str) -> Optional[TNode]:
-        query = """MATCH (n {uri: $uri}) RETURN n"""
+        query = f"""
+        {self._match_by_uri("n")}
+        RETURN n
+        """
         
         with self.driver.session(database=self.database) as session:
             result = session.run(query, uri=uri)
@@ -57,8 +144,9 @@ class GraphRepository:
             return None
         
     def get_arcs_from_node(self, uri: str) -> List[TNode]:
-        query = """
-        MATCH (parent {uri: $uri})-[arc]->(child)
+        query = f"""
+        {self._match_by_uri("parent")}
+        MATCH (parent)-[arc]->(child)
         RETURN arc, child, type(arc) as arc_type
         """
         
@@ -74,8 +162,9 @@ class GraphRepository:
             return children
 
     def get_arcs_to_node(self, uri: str) -> List[TNode]:
-        query = """
-        MATCH (parent)-[arc]->(child {uri: $uri})
+        query = f"""
+        {self._match_by_uri("child")}
+        MATCH (parent)-[arc]->(child)
         RETURN arc, parent, type(arc) as arc_type
         """
         
@@ -92,37 +181,109 @@ class GraphRepository:
 
             return parents
 
-    def get_all_nodes_and_arcs(self) -> List[TNode]:
+    def get_arcs_by_labels(self, arc_labels: List[str]) -> List[TArc]:
         query = """
-        MATCH (n)-[r]->(m)
-        RETURN n, r, m.uri as to_uri, type(r) as rel_type
+        MATCH (a)-[r]->(b)
+        WHERE type(r) IN $arc_labels
+        RETURN r, a.uri as from_uri, b.uri as to_uri
         """
-        
+
         with self.driver.session(database=self.database) as session:
-            result = session.run(query)
-            nodes_dict = {}
-            
+            result = session.run(query, arc_labels=arc_labels)
+            arcs = []
+
             for record in result:
-                node_data = record["n"]
-                arc_data = record["r"]
-                to_uri = record["to_uri"]
-                rel_type = record["rel_type"]
-                
-                node_uri = node_data.get("uri")
-                
-                # Создаем или получаем узел
-                if node_uri not in nodes_dict:
-                    nodes_dict[node_uri] = self._collect_node(node_data)
-                    nodes_dict[node_uri].arcs = []
-                
-                # Создаем дугу и добавляем к узлу
-                arc = self._collect_arc(arc_data)
-                arc.node_uri_from = node_uri
-                arc.node_uri_to = to_uri
-                arc.label = rel_type
-                nodes_dict[node_uri].arcs.append(arc)
-            
-            return list(nodes_dict.values())
+                arcs.append(self._collect_arc(record["r"], record["from_uri"], record["to_uri"]))
+
+            return arcs
+
+    def get_inherited_nodes(self, uri: str, hierarchy_label: str, arc_label: str,
+                            labels: List[str]) -> List[TNode]:
+        """
+        Узлы с метками labels, связанные дугой arc_label с узлом uri или любым его предком
+        по дугам hierarchy_label. Предки собираются одним запросом на стороне Neo4j через
+        WITH DISTINCT: планировщик обходит иерархию в ширину, не перебирая пути, поэтому
+        ромбы и циклы не размножают строки. Вместе с предками возвращаются их родители,
+        удаленность предков считается обходом в ширину по этому (уже различному) множеству.
+        Узлы упорядочены по удаленности предка, к которому они привязаны.
+        """
+        query = f"""
+        {self._match_by_uri("start")}
+        MATCH (start)-[:`{hierarchy_label}`*0..]->(ancestor)
+        WITH DISTINCT ancestor
+        OPTIONAL MATCH (ancestor)-[:`{hierarchy_label}`]->(parent)
+        WITH ancestor, collect(parent.uri) AS parents
+        OPTIONAL MATCH (n)-[:`{arc_label}`]->(ancestor)
+        WHERE any(label IN labels(n) WHERE label IN $labels)
+        RETURN ancestor.uri AS ancestor_uri, parents, collect(n) AS nodes
+        """
+
+        with self.driver.session(database=self.database) as session:
+            result = session.run(query, uri=uri, labels=labels)
+
+            parents = {}
+            attached = {}
+            for record in result:
+                parents[record["ancestor_uri"]] = record["parents"]
+                attached[record["ancestor_uri"]] = record["nodes"]
+
+        depths = {uri: 0} if uri in parents else {}
+        frontier = list(depths)
+        while frontier:
+            next_frontier = []
+            for ancestor_uri in frontier:
+                for parent_uri in parents.get(ancestor_uri, []):
+                    if parent_uri not in depths:
+                        depths[parent_uri] = depths[ancestor_uri] + 1
+                        next_frontier.append(parent_uri)
+            frontier = next_frontier
+
+        found = {}
+        for ancestor_uri, depth in depths.items():
+            for node_data in attached[ancestor_uri]:
+                if node_data.element_id not in found or depth < found[node_data.element_id][0]:
+                    found[node_data.element_id] = (depth, node_data)
+
+        ordered = sorted(found.items(), key=lambda item: (item[1][0], item[0]))
+        return [self._collect_node(node_data) for _, (_, node_data) in ordered]
+
+    def get_existing_uris(self, uris: List[str]) -> Set[str]:
+        """Те из uris, которым соответствует узел (поиск по индексам uri, один запрос)"""
+        if not uris:
+            return set()
+
+        query = f"""
+        UNWIND $rows AS row
+        {self._match_by_uri("n", "uri", row="row")}
+        RETURN DISTINCT n.uri AS uri
+        """
+
+        with self.driver.session(database=self.database) as session:
+            result = session.run(query, rows=[{"uri": uri} for uri in uris])
+            return {record["uri"] for record in result}
+
+    def get_all_nodes_and_arcs(self) -> List[TNode]:
+        return list(self.iter_all_nodes_and_arcs())
+
+    def iter_all_nodes_and_arcs(self, page_size: int = 10000, fetch_size: Optional[int] = None) -> Iterator[TNode]:
+        """
+        Все узлы (включая узлы без дуг) с исходящими дугами в arcs, потоком - см. iter_all_nodes
+        """
+        query = f"""
+        MATCH (n)
+        WHERE id(n) > $after AND NOT n:`{VERSION_LABEL}`
+        WITH n ORDER BY id(n) LIMIT $page_size
+        OPTIONAL MATCH (n)-[r]->(m)
+        WITH n, collect(CASE WHEN r IS NOT NULL THEN {{arc: r, to_uri: m.uri}} END) AS arcs
+        RETURN n, arcs, id(n) AS internal_id
+        ORDER BY internal_id
+        """
+
+        for record in self._iter_pages(query, page_size, fetch_size):
+            node_data = record["n"]
+            uri = node_data.get("uri", "")
+            arcs = [self._collect_arc(item["arc"], uri, item["to_uri"]) for item in record["arcs"]]
+            yield self._collect_node(node_data, arcs)
 
     ######################################
     #   Node creation/deletion methods   #
@@ -137,11 +298,12 @@ class GraphRepository:
         query = f"""CREATE (n:{str_labels} {str_props}) RETURN n"""
         
         with self.driver.session(database=self.database) as session:
-            result = session.run(query)
-            record = result.single()
+            record, version = self._write(session, query)
             
             if record:
-                return self._collect_node(record["n"])
+                node = self._collect_node(record["n"])
+                self._notify("node_created", node, version)
+                return node
                 
             raise Exception("Failed to create node")
     
@@ -151,21 +313,84 @@ class GraphRepository:
         Returns:
             bool: True если узел удален, False если не найден
         """
-        query = """
-            MATCH (n {uri: $uri})
+        query = f"""
+            {self._match_by_uri("n")}
             DETACH DELETE n
             RETURN count(n) as deleted_count
         """
         
         with self.driver.session(database=self.database) as session:
-            result = session.run(query, uri=uri)
-            record = result.single()
+            record, version = self._write(session, query, uri=uri)
             
             if record and record["deleted_count"] > 0:
+                self._notify("node_deleted", uri, version)
                 return True
             
             return False
 
+    def get_incoming_closure(self, uri: str, arc_labels: Optional[List[str]] = None) -> List[TNode]:
+        """
+        Узел uri и все узлы, из которых он достижим по входящим дугам arc_labels
+        (по умолчанию - любого типа, т.е. то, что удалит delete_incoming_closure). Каждый узел - один раз.
+        """
+        types = ":" + "|".join(f"`{label}`" for label in arc_labels) if arc_labels else ""
+        query = f"""
+        {self._match_by_uri("root")}
+        MATCH (root)<-[{types}*0..]-(n)
+        WITH DISTINCT n
+        RETURN n
+        """
+
+        with self.driver.session(database=self.database) as session:
+            result = session.run(query, uri=uri)
+
+            nodes = [self._collect_node(record["n"]) for record in result]
+            return nodes
+
+    def delete_incoming_closure(self, uri: str, batch_size: Optional[int] = None) -> int:
+        """
+        Удаляет (DETACH DELETE) узел uri вместе со всеми узлами, из которых он достижим по входящим дугам.
+        Замыкание собирается на стороне Neo4j одним запросом; DISTINCT позволяет планировщику
+        обходить граф в ширину без перебора путей, узлы, достижимые несколькими путями, удаляются один раз.
+        batch_size=None - все в одной транзакции (атомарно);
+        иначе - CALL {} IN TRANSACTIONS по batch_size узлов (для очень больших поддеревьев, не атомарно).
+        Returns:
+            int: количество удаленных узлов
+        """
+        closure = f"""
+        {self._match_by_uri("root")}
+        MATCH (root)<-[*0..]-(n)
+        WITH DISTINCT n
+        """
+
+        with self.driver.session(database=self.database) as session:
+            if batch_size is None:
+                query = closure + """
+                DETACH DELETE n
+                RETURN count(n) AS deleted_count
+                """
+                record, version = self._write(session, query, uri=uri)
+            else:
+                # IN TRANSACTIONS работает только в неявной (auto-commit) транзакции - session.run
+                query = closure + """
+                CALL {
+                    WITH n
+                    DETACH DELETE n
+                    RETURN 1 AS deleted
+                } IN TRANSACTIONS OF $batch_size ROWS
+                RETURN count(deleted) AS deleted_count
+                """
+                record = session.run(query, uri=uri, batch_size=batch_size).single()
+                version = None
+                if self.track_version and record and record["deleted_count"]:
+                    version = session.execute_write(self._bump_version)
+
+            deleted = record["deleted_count"] if record else 0
+            if deleted:
+                # какие именно узлы удалены, клиент не знает
+                self._notify("reset", None, version)
+            return deleted
+
     def update_node(self, uri: str, 
                     add_labels: Optional[List[str]] = None,
                     remove_labels: Optional[List[str]] = None,
@@ -209,17 +434,18 @@ class GraphRepository:
                 clauses.append(f"SET {', '.join(set_clauses)}")
         
         query = f"""
-        MATCH (n {{uri: $uri}})
+        {self._match_by_uri("n")}
         {' '.join(clauses)}
         RETURN n
         """
         
         with self.driver.session(database=self.database) as session:
-            result = session.run(query, **params)
-            record = result.single()
+            record, version = self._write(session, query, **params)
             
             if record:
-                return self._collect_node(record["n"])
+                node = self._collect_node(record["n"])
+                self._notify("node_updated", node, version)
+                return node
             
             return None
 
@@ -228,21 +454,19 @@ class GraphRepository:
     ######################################
     def create_arc(self, from_uri: str, to_uri: str, arc_label: str, props: Dict[str, Any] = {}) -> TArc:
         query = f"""
-        MATCH (a {{uri: $from_uri}}), (b {{uri: $to_uri}})
+        {self._match_by_uri("a", "from_uri")}
+        {self._match_by_uri("b", "to_uri")}
         CREATE (a)-[r:{arc_label}]->(b)
         SET r = $props
         RETURN r, a.uri as from_uri, b.uri as to_uri
         """
         
         with self.driver.session(database=self.database) as session:
-            result = session.run(query, from_uri=from_uri, to_uri=to_uri, props=props)
-            record = result.single()
+            record, version = self._write(session, query, from_uri=from_uri, to_uri=to_uri, props=props)
             
             if record:
-                arc_data = record["r"]
-                arc = self._collect_arc(arc_data)
-                arc.node_uri_from = from_uri
-                arc.node_uri_to = to_uri
+                arc = self._collect_arc(record["r"], from_uri, to_uri)
+                self._notify("arcs_created", [arc], version)
                 return arc
             
             raise Exception("Failed to create arc")
@@ -260,23 +484,225 @@ class GraphRepository:
             RETURN count(r) as deleted_count
         """
         with self.driver.session(database=self.database) as session:
-            result = session.run(query, arc_id=arc_id)
-            record = result.single()
+            record, version = self._write(session, query, arc_id=arc_id)
             
             if record and record["deleted_count"] > 0:
+                self._notify("arc_deleted", arc_id, version)
                 return True
             
             return False
 
 
 
+    ######################################
+    #        Bulk creation methods       #
+    ######################################
+    def create_nodes_bulk(self, nodes: List[Tuple[List[str], Dict[str, Any]]],
+                          batch_size: int = 1000) -> List[str]:
+        """
+        Создает узлы (labels, props) пачками по batch_size, каждая пачка - одна транзакция.
+        Метки нельзя передать параметром, поэтому в транзакции по одному UNWIND-запросу на набор меток.
+        Returns:
+            List[str]: uri созданных узлов (сгенерированные, если не заданы в props) в порядке nodes
+        """
+        rows = []
+        for labels, props in nodes:
+            props = dict(props)
+            if "uri" not in props:
+                props["uri"] = self._generate_random_uri()
+            rows.append((tuple(labels), props))
+
+        with self.driver.session(database=self.database) as session:
+            for start in range(0, len(rows), batch_size):
+                batch = rows[start:start + batch_size]
+                groups = {}
+                for labels, props in batch:
+                    groups.setdefault(labels, []).append(props)
+                version = session.execute_write(self._create_nodes_tx, groups)
+                # событие на каждую пачку: у каждой своя версия графа
+                self._notify("nodes_created", [
+                    TNode(id="", uri=props["uri"], labels=list(labels), props=props) for labels, props in batch
+                ], version)
+
+        return [props["uri"] for _, props in rows]
+
+    def create_arcs_bulk(self, arcs: List[Tuple[str, str, str, Dict[str, Any]]],
+                         batch_size: int = 1000) -> List[TArc]:
+        """
+        Создает дуги (from_uri, to_uri, arc_label, props) пачками по batch_size, пачка - одна транзакция.
+        Дуги, у которых не найден один из концов, не создаются.
+        Returns:
+            List[TArc]: созданные дуги в порядке arcs
+        """
+        rows = [
+            {"i": i, "from_uri": from_uri, "to_uri": to_uri, "props": dict(props or {})}
+            for i, (from_uri, to_uri, _, props) in enumerate(arcs)
+        ]
+
+        result = []
+        with self.driver.session(database=self.database) as session:
+            for start in range(0, len(rows), batch_size):
+                groups = {}
+                for row in rows[start:start + batch_size]:
+                    groups.setdefault(arcs[row["i"]][2], []).append(row)
+                created, version = session.execute_write(self._create_arcs_tx, groups)
+
+                batch = []
+                for i, arc_id in sorted(created):
+                    from_uri, to_uri, arc_label, _ = arcs[i]
+                    batch.append(TArc(id=arc_id, label=arc_label, props=rows[i]["props"],
+                                      node_uri_from=from_uri, node_uri_to=to_uri))
+                if batch:
+                    self._notify("arcs_created", batch, version)
+                result.extend(batch)
+
+        return result
+
+    def _create_nodes_tx(self, tx, groups: Dict[Tuple[str, ...], List[Dict[str, Any]]]) -> int:
+        for labels, rows in groups.items():
+            query = f"""
+            UNWIND $rows AS props
+            CREATE (n:{self._transform_labels(list(labels))})
+            SET n = props
+            """
+            tx.run(query, rows=rows).consume()
+        return self._bump_version(tx)
+
+    def _create_arcs_tx(self, tx, groups: Dict[str, List[Dict[str, Any]]]) -> Tuple[List[Tuple[int, str]], Optional[int]]:
+        created = []
+        for arc_label, rows in groups.items():
+            query = f"""
+            UNWIND $rows AS row
+            {self._match_by_uri("a", "from_uri", row="row")}
+            {self._match_by_uri("b", "to_uri", row="row")}
+            CREATE (a)-[r:`{arc_label}`]->(b)
+            SET r = row.props
+            RETURN row.i AS i, elementId(r) AS id
+            """
+            created.extend((record["i"], record["id"]) for record in tx.run(query, rows=rows))
+        return created, self._bump_version(tx) if created else None
+
+    ######################################
+    #         Schema methods             #
+    ######################################
+    def ensure_uri_constraints(self, labels: List[str]) -> List[str]:
+        """
+        Создает уникальные ограничения (и индексы под ними) на свойство uri для каждой метки
+        и на id узла версии графа. Идемпотентно: существующие ограничения не пересоздаются.
+        Returns:
+            List[str]: имена ограничений
+        """
+        names = []
+
+        with self.driver.session(database=self.database) as session:
+            for label in labels:
+                name = f"{label.lower()}_uri_unique"
+                query = f"""
+                CREATE CONSTRAINT `{name}` IF NOT EXISTS
+                FOR (n:`{label}`) REQUIRE n.uri IS UNIQUE
+                """
+                session.run(query).consume()
+                names.append(name)
+
+            name = f"{VERSION_LABEL.lower()}_id_unique"
+            query = f"""
+            CREATE CONSTRAINT `{name}` IF NOT EXISTS
+            FOR (v:`{VERSION_LABEL}`) REQUIRE v.id IS UNIQUE
+            """
+            session.run(query).consume()
+            names.append(name)
+
+        return names
+
+    def get_counts(self) -> Tuple[int, int]:
+        """Число узлов (без узла версии) и дуг, из счетчиков хранилища, без обхода графа"""
+        with self.driver.session(database=self.database) as session:
+            nodes = session.run("MATCH (n) RETURN count(n) AS count").single()["count"]
+            versions = session.run(f"MATCH (v:`{VERSION_LABEL}`) RETURN count(v) AS count").single()["count"]
+            arcs = session.run("MATCH ()-[r]->() RETURN count(r) AS count").single()["count"]
+            return nodes - versions, arcs
+
+    def get_version(self) -> int:
+        """Версия графа: растет с каждой транзакцией записи через GraphRepository с track_version (в любом процессе)"""
+        with self.driver.session(database=self.database) as session:
+            record = session.run(f"MATCH (v:`{VERSION_LABEL}` {{id: $id}}) RETURN v.value AS version",
+                                 id=VERSION_ID).single()
+            return record["version"] if record else 0
+
     ######################################
     #   Additional and private methods   #
     ######################################
+    def _iter_pages(self, query: str, page_size: int, fetch_size: Optional[int]) -> Iterator[Record]:
+        # query получает $after и $page_size и возвращает internal_id по возрастанию
+        session_config = {"database": self.database}
+        if fetch_size is not None:
+            session_config["fetch_size"] = fetch_size
+
+        after = -1
+        while True:
+            count = 0
+            with self.driver.session(**session_config) as session:
+                for record in session.run(query, after=after, page_size=page_size):
+                    count += 1
+                    after = record["internal_id"]
+                    yield record
+            if count < page_size:
+                return
+
+    def _write(self, session, query: str, **params) -> Tuple[Optional[Record], Optional[int]]:
+        """
+        Запрос записи, возвращающий не больше одной строки, и увеличение версии графа - в одной транзакции.
+        Версия увеличивается, только если запрос что-то вернул (и не вернул нулевой счетчик удаленных).
+        """
+        def work(tx):
+            record = tx.run(query, **params).single()
+            if record is None or ("deleted_count" in record.keys() and not record["deleted_count"]):
+                return record, None
+            return record, self._bump_version(tx)
+
+        return session.execute_write(work)
+
+    def _bump_version(self, tx) -> Optional[int]:
+        if not self.track_version:
+            return None
+        # MERGE по ключу: с ограничением на id параллельные первые записи не создадут второй узел
+        query = f"""
+        MERGE (v:`{VERSION_LABEL}` {{id: $id}})
+        SET v.value = coalesce(v.value, 0) + 1
+        RETURN v.value AS version
+        """
+        return tx.run(query, id=VERSION_ID).single()["version"]
+
+    def _notify(self, event: str, payload: Any, version: Optional[int] = None):
+        for listener in list(self._change_listeners):
+            try:
+                listener(self.database, event, payload, version)
+            except Exception:
+                logger.exception("Graph change listener failed on %s", event)
+
     def run_custom_query(self, query: str, **params) -> Result:
         with self.driver.session(database=self.database) as session:
             return session.run(query, **params)
 
+    def _match_by_uri(self, var: str, param: str = "uri", row: Optional[str] = None) -> str:
+        """
+        Фрагмент запроса, находящий узел var по параметру $param
+        (или по полю row.param, если задана переменная row, например из UNWIND).
+        Для каждой индексированной метки - отдельная ветка UNION, чтобы планировщик
+        использовал индекс по uri; без меток остается полный перебор узлов.
+        """
+        value = f"{row}.{param}" if row else f"${param}"
+        if not self.uri_labels:
+            return f"MATCH ({var} {{uri: {value}}})"
+
+        imported = f"WITH {row} " if row else ""
+        branches = "\n            UNION\n            ".join(
+            f"{imported}MATCH ({var}:`{label}` {{uri: {value}}}) RETURN {var}" for label in self.uri_labels
+        )
+        return f"""CALL {{
+            {branches}
+        }}"""
+
     def _generate_random_uri(self, length: int = 16) -> str:
         return str(uuid.uuid4()).replace("-", "")[:length]
 
@@ -291,26 +717,23 @@ class GraphRepository:
             arcs=None
         )
     
-    def _collect_node(self, node_data) -> TNode:
-        props = dict(node_data.items())
-        
+    def _collect_node(self, node_data, arcs: Optional[List[TArc]] = None) -> TNode:
+        # свойства не копируются: PropertyView читает их из объекта драйвера
         return TNode(
             id=node_data.element_id,
-            uri=props.get("uri", ""),
+            uri=node_data.get("uri", ""),
             labels=list(node_data.labels),
-            props=props,
-            arcs=None
+            props=PropertyView(node_data),
+            arcs=arcs
         )
 
-    def _collect_arc(self, arc_data) -> TArc:
-        props = dict(arc_data.items())
-        
+    def _collect_arc(self, arc_data, from_uri: str = "", to_uri: str = "") -> TArc:
         return TArc(
             id=arc_data.element_id,
             label=arc_data.type,
-            props=props,
-            node_uri_from="",  
-            node_uri_to=""    
+            props=PropertyView(arc_data),
+            node_uri_from=from_uri,
+            node_uri_to=to_uri
         )
     
     def _transform_labels(self, labels, separator = ':'):
@@ -0,0 +1,55 @@
+from typing import Dict, Tuple, Any
+import threading
+from neo4j import GraphDatabase, Driver
+
+# Общий (на процесс) реестр драйверов Neo4j.
+# Драйвер потокобезопасен и сам держит пул соединений, поэтому
+# создавать его на каждый запрос не нужно: это повторный handshake,
+# авторизация и загрузка routing table.
+
+_drivers: Dict[Tuple[str, str, str], Driver] = {}
+_lock = threading.Lock()
+
+
+def get_driver(uri: str, user: str, password: str, database: str = "neo4j", **config: Any) -> Driver:
+    """
+    Возвращает общий драйвер для (uri, user, database), создавая его при первом обращении.
+
+    config передается в GraphDatabase.driver как есть
+    (max_connection_pool_size, liveness_check_timeout, connection_acquisition_timeout, ...)
+    """
+    key = (uri, user, database)
+
+    driver = _drivers.get(key)
+    if driver is not None:
+        return driver
+
+    with _lock:
+        driver = _drivers.get(key)
+        if driver is None:
+            driver = GraphDatabase.driver(uri, auth=(user, password), **config)
+            _drivers[key] = driver
+        return driver
+
+
+def close_driver(uri: str, user: str, database: str = "neo4j") -> bool:
+    with _lock:
+        driver = _drivers.pop((uri, user, database), None)
+
+    if driver is None:
+        return False
+
+    driver.close()
+    return True
+
+
+def close_all_drivers():
+    with _lock:
+        drivers = list(_drivers.values())
+        _drivers.clear()
+
+    for driver in drivers:
+        try:
+            driver.close()
+        except Exception:
+            pass
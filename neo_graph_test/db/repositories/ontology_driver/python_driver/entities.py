@@ -1,18 +1,54 @@
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Mapping, Iterator
 from dataclasses import dataclass
 
-@dataclass
+# Записи графа создаются на каждый узел/дугу результата (при полном обходе - миллионы),
+# поэтому они без __dict__ (slots) и неизменяемы (frozen): концы дуги и список дуг узла
+# передаются в конструктор.
+
+class PropertyView(Mapping[str, Any]):
+    """
+    Свойства узла/дуги драйвера Neo4j без копирования в dict, только для чтения.
+    Держит ссылку на объект драйвера: для долгого хранения - dict(view).
+    """
+    __slots__ = ("_entity",)
+
+    def __init__(self, entity):
+        self._entity = entity
+
+    def __getitem__(self, key: str) -> Any:
+        # Entity.__getitem__ драйвера возвращает None для отсутствующих ключей
+        if key not in self._entity:
+            raise KeyError(key)
+        return self._entity[key]
+
+    def __contains__(self, key: object) -> bool:
+        return key in self._entity
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(self._entity.keys())
+
+    def __len__(self) -> int:
+        return len(self._entity)
+
+    def get(self, key: str, default: Any = None) -> Any:
+        return self._entity.get(key, default)
+
+    def __repr__(self) -> str:
+        return f"PropertyView({dict(self._entity.items())!r})"
+
+
+@dataclass(slots=True, frozen=True)
 class TArc:
     id: str
     label: str  
-    props: Dict[str, Any]
+    props: Mapping[str, Any]
     node_uri_from: str
     node_uri_to: str
 
-@dataclass
+@dataclass(slots=True, frozen=True)
 class TNode:
     id: str
     uri: str
     labels: List[str]
-    props: Dict[str, Any]
+    props: Mapping[str, Any]
     arcs: Optional[List[TArc]] = None
@@ -0,0 +1,161 @@
+from typing import List, Dict, Any
+import numpy as np
+
+# Выравнивание чанков текста и его перевода (в духе Гейла-Черча, но вместо длин - эмбеддинги).
+# Выравнивание монотонное, допустимые шаги: 1-1, 2-1, 1-2 и пропуск чанка с любой стороны.
+# Выигрыш шага 1-1 - косинусная близость минус min_similarity; для 2-1 и 1-2 соседние
+# чанки склеиваются (нормированная сумма векторов) и дополнительно штрафуются merge_penalty;
+# пропуск стоит skip_penalty. Ищется путь с максимальной суммой.
+# Ячейка (i, j) зависит только от ячеек диагоналей i+j-1, i+j-2 и i+j-3,
+# поэтому ДП считается векторно по антидиагоналям и хранит только три предыдущие.
+# Память на ячейку - 5 байт: матрица близостей чанков (float32) и номер лучшего шага (int8).
+# Близость склейки с чанком выводится из нее же: для нормированных a, b, t
+# cos(a + b, t) = (a.t + b.t) / |a + b|.
+
+# шаги (сколько чанков оригинала, сколько перевода)
+MOVES = [(1, 1), (1, 0), (0, 1), (2, 1), (1, 2)]
+
+
+class AlignmentService:
+    def __init__(self, min_similarity: float = 0.3, merge_penalty: float = 0.05, skip_penalty: float = 0.0):
+        self.min_similarity = min_similarity
+        self.merge_penalty = merge_penalty
+        self.skip_penalty = skip_penalty
+
+    def align(self, source: np.ndarray, target: np.ndarray) -> List[Dict[str, Any]]:
+        """
+        source, target - эмбеддинги чанков оригинала и перевода (по строке на чанк).
+        Returns:
+            List[Dict]: звенья выравнивания по порядку: {'source': [...], 'target': [...], 'score': float}
+        """
+        source = _normalize(np.asarray(source, dtype=np.float32))
+        target = _normalize(np.asarray(target, dtype=np.float32))
+        n, m = len(source), len(target)
+        if n == 0 and m == 0:
+            return []
+
+        gains = _Gains(source, target, self)
+
+        # диагонали счета D(i, j) по i со сдвигом 2: D(i, d - i) хранится в diagonal[i + 2], -inf - недостижимо
+        previous = [np.full(n + 3, -np.inf) for _ in range(3)]  # диагонали d-1, d-2, d-3
+        previous[0][2] = 0.0  # диагональ 0: пустое выравнивание
+        back = np.full((n + 1, m + 1), -1, dtype=np.int8)
+
+        for diagonal in range(1, n + m + 1):
+            i = np.arange(max(0, diagonal - m), min(n, diagonal) + 1)
+            j = diagonal - i
+            last, before, oldest = previous
+
+            candidates = np.stack([
+                before[i + 1] + gains.one_to_one(i, j),
+                last[i + 1] - self.skip_penalty,
+                last[i + 2] - self.skip_penalty,
+                oldest[i] + gains.two_to_one(i, j),
+                oldest[i + 1] + gains.one_to_two(i, j),
+            ])
+            best = np.argmax(candidates, axis=0)
+            back[i, j] = best
+
+            current = oldest
+            current.fill(-np.inf)
+            current[i + 2] = candidates[best, np.arange(len(i))]
+            previous = [current, last, before]
+
+        return self._backtrack(back, gains, n, m)
+
+    @staticmethod
+    def _backtrack(back: np.ndarray, gains: "_Gains", n: int, m: int) -> List[Dict[str, Any]]:
+        beads = []
+        i, j = n, m
+        while i > 0 or j > 0:
+            move = int(back[i, j])
+            di, dj = MOVES[move]
+            beads.append({
+                'source': list(range(i - di, i)),
+                'target': list(range(j - dj, j)),
+                'score': float(gains.move(move, np.array([i]), np.array([j]))[0]),
+            })
+            i, j = i - di, j - dj
+        beads.reverse()
+        return beads
+
+
+class _Gains:
+    """Выигрыши шагов, заканчивающихся в ячейках (i, j); -inf - шаг невозможен"""
+
+    def __init__(self, source: np.ndarray, target: np.ndarray, service: AlignmentService):
+        n, m = len(source), len(target)
+        self.service = service
+        # близости со сдвигом 2 и рамкой -inf: similarity[i + 1, j + 1] = cos(source[i - 1], target[j - 1])
+        self.similarity = np.full((n + 2, m + 2), -np.inf, dtype=np.float32)
+        if n and m:
+            self.similarity[2:, 2:] = source @ target.T
+        # |a + b| соседних чанков; source_norms[i] - для склейки source[i - 2] и source[i - 1]
+        self.source_norms = _pair_norms(source, 2)
+        self.target_norms = _pair_norms(target, 2)
+
+    def one_to_one(self, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+        return self.similarity[i + 1, j + 1] - self.service.min_similarity
+
+    def two_to_one(self, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+        merged = (self.similarity[i, j + 1] + self.similarity[i + 1, j + 1]) / self.source_norms[i]
+        return merged - self.service.min_similarity - self.service.merge_penalty
+
+    def one_to_two(self, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+        merged = (self.similarity[i + 1, j] + self.similarity[i + 1, j + 1]) / self.target_norms[j]
+        return merged - self.service.min_similarity - self.service.merge_penalty
+
+    def move(self, move: int, i: np.ndarray, j: np.ndarray) -> np.ndarray:
+        if move == 1 or move == 2:
+            return np.full(len(i), -self.service.skip_penalty)
+        return (self.one_to_one, None, None, self.two_to_one, self.one_to_two)[move](i, j)
+
+
+def align_text(text, translation, service: AlignmentService = None, include_chunks: bool = False) -> Dict[str, Any]:
+    """Выравнивание сохраненных эмбеддингов чанков текста (db.models.Text) и его перевода"""
+    service = service or AlignmentService()
+
+    for item in (text, translation):
+        if item.embedding_status != item.EMBEDDING_READY:
+            raise ValueError(f"Embeddings of text {item.id} are not ready ({item.embedding_status})")
+
+    beads = service.align(text.get_embeddings_array(), translation.get_embeddings_array())
+    result = {
+        'source_id': text.id,
+        'target_id': translation.id,
+        'score': sum(bead['score'] for bead in beads),
+        'alignment': beads,
+    }
+
+    if include_chunks:
+        from db.services.embedding_service import EmbeddingService, CHUNKER_VERSION
+        # номера чанков совпадают с текстом, только если эмбеддинги посчитаны текущим разбиением
+        if any(item.chunker_version != CHUNKER_VERSION for item in (text, translation)):
+            result['chunks_outdated'] = True
+            return result
+
+        chunker = EmbeddingService()
+        source_chunks = chunker.get_chunks(text.content or '')
+        target_chunks = chunker.get_chunks(translation.content or '')
+        for bead in beads:
+            bead['source_text'] = " ".join(source_chunks[i] for i in bead['source'] if i < len(source_chunks))
+            bead['target_text'] = " ".join(target_chunks[j] for j in bead['target'] if j < len(target_chunks))
+
+    return result
+
+
+def _pair_norms(vectors: np.ndarray, shift: int) -> np.ndarray:
+    norms = np.ones(len(vectors) + shift, dtype=np.float32)
+    if len(vectors) > 1:
+        pair_norms = np.linalg.norm(vectors[:-1] + vectors[1:], axis=1)
+        pair_norms[pair_norms == 0] = 1
+        norms[shift:shift + len(pair_norms)] = pair_norms
+    return norms
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    if vectors.ndim != 2 or len(vectors) == 0:
+        return vectors.reshape(0, vectors.shape[-1] if vectors.ndim == 2 else 0)
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
@@ -0,0 +1,214 @@
+from typing import Optional, Tuple
+import json
+import os
+import shutil
+import tempfile
+import numpy as np
+
+# Приближенный поиск ближайших соседей (IVF, inverted file index).
+# Векторы разбиваются сферическим k-means на n_lists кластеров и хранятся
+# отсортированными по кластеру (CSR: offsets[c]..offsets[c+1] - строки кластера c).
+# Запрос сравнивается с центроидами, затем точно - только с векторами
+# n_probe ближайших кластеров. n_probe регулирует баланс полноты и скорости.
+# Все массивы сохраняются в .npy и открываются через memory map; пересборка публикует
+# новую версию каталога атомарной заменой симлинка (см. IVFIndex.save).
+
+FORMAT_VERSION = 1
+# опубликованные версии лежат рядом с path в каталогах "<имя path>.v-*", path - симлинк на текущую
+VERSION_SUFFIX = ".v-"
+
+
+class IVFIndex:
+    def __init__(self, n_lists: int = 256, n_probe: int = 8):
+        self.n_lists = n_lists
+        self.n_probe = n_probe
+        self.centroids: Optional[np.ndarray] = None
+        self.vectors: Optional[np.ndarray] = None
+        self.ids: Optional[np.ndarray] = None
+        self.offsets: Optional[np.ndarray] = None
+
+    def __len__(self):
+        return 0 if self.ids is None else len(self.ids)
+
+    ######################################
+    #          Build methods             #
+    ######################################
+    def train(self, vectors: np.ndarray, n_iter: int = 20, sample_size: int = 100000, seed: int = 0):
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+        rng = np.random.default_rng(seed)
+
+        if len(vectors) > sample_size:
+            vectors = vectors[rng.choice(len(vectors), sample_size, replace=False)]
+
+        n_lists = min(self.n_lists, len(vectors))
+        centroids = vectors[rng.choice(len(vectors), n_lists, replace=False)].copy()
+
+        for _ in range(n_iter):
+            labels = _assign(vectors, centroids)
+            sums = np.zeros_like(centroids)
+            np.add.at(sums, labels, vectors)
+            counts = np.bincount(labels, minlength=n_lists)
+
+            # пустой кластер получает случайную точку выборки
+            empty = np.flatnonzero(counts == 0)
+            if len(empty):
+                sums[empty] = vectors[rng.choice(len(vectors), len(empty), replace=False)]
+
+            centroids = _normalize(sums)
+
+        self.n_lists = n_lists
+        self.centroids = centroids
+
+    def add(self, vectors: np.ndarray, ids: np.ndarray):
+        if self.centroids is None:
+            raise ValueError("Index must be trained before adding vectors")
+
+        vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+        ids = np.asarray(ids, dtype=np.int64)
+        if len(vectors) != len(ids):
+            raise ValueError("vectors and ids must have the same length")
+
+        labels = _assign(vectors, self.centroids)
+        if self.ids is not None and len(self.ids):
+            old_labels = np.repeat(np.arange(self.n_lists), np.diff(self.offsets))
+            vectors = np.concatenate([np.asarray(self.vectors), vectors])
+            ids = np.concatenate([np.asarray(self.ids), ids])
+            labels = np.concatenate([old_labels, labels])
+
+        order = np.argsort(labels, kind="stable")
+        self.vectors = np.ascontiguousarray(vectors[order])
+        self.ids = ids[order]
+        self.offsets = np.zeros(self.n_lists + 1, dtype=np.int64)
+        np.cumsum(np.bincount(labels, minlength=self.n_lists), out=self.offsets[1:])
+
+    def build(self, vectors: np.ndarray, ids: Optional[np.ndarray] = None, **train_options):
+        if ids is None:
+            ids = np.arange(len(vectors))
+        self.train(vectors, **train_options)
+        self.add(vectors, ids)
+
+    ######################################
+    #          Search methods            #
+    ######################################
+    def search(self, query: np.ndarray, k: int = 10, n_probe: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: id найденных векторов и их косинусная близость, по убыванию
+        """
+        if not len(self):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        query = _normalize(np.asarray(query, dtype=np.float32).reshape(1, -1))[0]
+        n_probe = min(n_probe or self.n_probe, self.n_lists)
+
+        lists = _top_k(self.centroids @ query, n_probe)
+        rows = np.concatenate([np.arange(self.offsets[c], self.offsets[c + 1]) for c in lists])
+        if not len(rows):
+            return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.float32)
+
+        scores = self.vectors[rows] @ query
+        top = _top_k(scores, k)
+        return np.asarray(self.ids[rows[top]]), scores[top]
+
+    ######################################
+    #       Persistence methods          #
+    ######################################
+    def save(self, path: str, **arrays: np.ndarray):
+        """
+        Пишет индекс (и дополнительные массивы arrays: имя -> массив) в новый каталог рядом с path
+        и атомарно переключает на него симлинк path. Файлы опубликованной версии не перезаписываются:
+        процессы, открывшие их через memory map, дочитывают старую версию.
+        """
+        parent = os.path.dirname(os.path.abspath(path))
+        os.makedirs(parent, exist_ok=True)
+        version_dir = tempfile.mkdtemp(prefix=os.path.basename(path) + VERSION_SUFFIX, dir=parent)
+        os.chmod(version_dir, 0o755)
+
+        np.save(os.path.join(version_dir, "centroids.npy"), self.centroids)
+        np.save(os.path.join(version_dir, "vectors.npy"), self.vectors)
+        np.save(os.path.join(version_dir, "ids.npy"), self.ids)
+        np.save(os.path.join(version_dir, "offsets.npy"), self.offsets)
+        for name, array in arrays.items():
+            np.save(os.path.join(version_dir, f"{name}.npy"), array)
+        # meta.json последним: каталог без него считается недописанным
+        with open(os.path.join(version_dir, "meta.json"), "w") as f:
+            json.dump({"version": FORMAT_VERSION, "n_lists": self.n_lists, "n_probe": self.n_probe}, f)
+
+        _publish(path, version_dir)
+
+    @classmethod
+    def load(cls, path: str, mmap: bool = True) -> "IVFIndex":
+        path = resolve_version(path)
+        with open(os.path.join(path, "meta.json")) as f:
+            meta = json.load(f)
+        if meta.get("version") != FORMAT_VERSION:
+            raise ValueError(f"Unsupported ANN index format: {meta.get('version')}")
+
+        mmap_mode = "r" if mmap else None
+        index = cls(meta["n_lists"], meta["n_probe"])
+        index.centroids = np.load(os.path.join(path, "centroids.npy"))
+        index.vectors = np.load(os.path.join(path, "vectors.npy"), mmap_mode=mmap_mode)
+        index.ids = np.load(os.path.join(path, "ids.npy"), mmap_mode=mmap_mode)
+        index.offsets = np.load(os.path.join(path, "offsets.npy"))
+        return index
+
+
+def resolve_version(path: str) -> str:
+    """Каталог текущей версии индекса path; смена результата означает, что опубликована новая версия"""
+    return os.path.realpath(path)
+
+
+def _publish(path: str, version_dir: str):
+    parent = os.path.dirname(version_dir)
+    current = resolve_version(path) if os.path.islink(path) else None
+
+    if os.path.isdir(path) and not os.path.islink(path):
+        # индекс старого формата (файлы прямо в path): один раз убираем его в сторону,
+        # до появления симлинка поиск будет недоступен
+        os.rename(path, tempfile.mkdtemp(prefix=os.path.basename(path) + VERSION_SUFFIX, dir=parent))
+
+    link = version_dir + ".link"
+    os.symlink(os.path.basename(version_dir), link)
+    os.replace(link, path)
+
+    # предыдущую версию оставляем: процесс мог только что определить ее каталог и еще не открыть файлы
+    keep = {version_dir, current}
+    prefix = os.path.basename(path) + VERSION_SUFFIX
+    for name in os.listdir(parent):
+        version = os.path.join(parent, name)
+        if name.startswith(prefix) and os.path.isdir(version) and not os.path.islink(version) and version not in keep:
+            shutil.rmtree(version, ignore_errors=True)
+
+
+def exact_search(vectors: np.ndarray, query: np.ndarray, k: int = 10) -> Tuple[np.ndarray, np.ndarray]:
+    """Точный поиск полным перебором (эталон для IVFIndex.search): номера строк vectors и близость"""
+    query = _normalize(np.asarray(query, dtype=np.float32).reshape(1, -1))[0]
+    scores = vectors @ query
+    top = _top_k(scores, k)
+    return top, scores[top]
+
+
+def _assign(vectors: np.ndarray, centroids: np.ndarray, block_size: int = 8192) -> np.ndarray:
+    # по блокам, чтобы матрица близостей не занимала N x n_lists памяти целиком
+    labels = np.empty(len(vectors), dtype=np.int64)
+    for start in range(0, len(vectors), block_size):
+        block = vectors[start:start + block_size]
+        labels[start:start + len(block)] = np.argmax(block @ centroids.T, axis=1)
+    return labels
+
+
+def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+    k = min(k, len(scores))
+    if k <= 0:
+        return np.empty(0, dtype=np.int64)
+    if k < len(scores):
+        top = np.argpartition(-scores, k - 1)[:k]
+    else:
+        top = np.arange(len(scores))
+    return top[np.argsort(-scores[top], kind="stable")]
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
@@ -0,0 +1,217 @@
+from typing import Dict, Optional, Tuple
+from concurrent.futures import ProcessPoolExecutor
+import logging
+import numpy as np
+from django.db import transaction
+from db.models import Text, NearDuplicate
+from db.services.vector_codec import decode_vectors
+from db.services.embedding_service import EmbeddingService
+
+# Поиск почти-дубликатов внутри корпуса.
+# 1. Для каждого текста - центроид (нормированное среднее) эмбеддингов его чанков.
+# 2. Пары текстов, чьи центроиды ближе text_threshold, и пары чанков разных текстов,
+#    ближе chunk_threshold. Матрица близостей целиком не строится: она считается
+#    плитками block_size x block_size верхнего треугольника, а найденные пары
+#    сразу обрезаются до max_pairs самых близких, так что память не зависит от N
+#    (кроме самой матрицы векторов).
+# 3. Блоки считаются в пуле процессов; матрица передается в каждый процесс один раз
+#    через initializer, а не с каждой задачей.
+# Результаты пишутся в NearDuplicate и читаются оттуда без пересчета.
+
+logger = logging.getLogger(__name__)
+
+# матрица и владельцы строк в процессе пула
+_shared: Dict[str, Optional[np.ndarray]] = {}
+
+
+def find_similar_pairs(vectors: np.ndarray, threshold: float, owners: Optional[np.ndarray] = None,
+                       block_size: int = 2048, workers: int = 1,
+                       max_pairs: Optional[int] = None) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    """
+    Пары строк (i < j) с косинусной близостью >= threshold, по убыванию близости.
+    owners - необязательная метка строки; пары строк с одинаковой меткой пропускаются.
+    max_pairs - вернуть только столько самых близких пар (None - все, память не ограничена).
+    Returns:
+        Tuple[np.ndarray, np.ndarray, np.ndarray]: номера строк i, j и близость
+    """
+    vectors = _normalize(np.asarray(vectors, dtype=np.float32))
+    starts = list(range(0, len(vectors), block_size))
+    strongest = _StrongestPairs(max_pairs)
+
+    if workers <= 1 or len(starts) <= 1:
+        _init_worker(vectors, owners, threshold, block_size, max_pairs)
+        try:
+            for start in starts:
+                strongest.add(*_pairs_in_block(start))
+        finally:
+            _shared.clear()
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(vectors, owners, threshold, block_size, max_pairs)) as pool:
+            # результаты блоков сливаются по мере готовности, а не копятся целиком
+            for part in pool.map(_pairs_in_block, starts):
+                strongest.add(*part)
+
+    return strongest.result()
+
+
+def _init_worker(vectors: np.ndarray, owners: Optional[np.ndarray], threshold: float, block_size: int,
+                 max_pairs: Optional[int]):
+    _shared['vectors'] = vectors
+    _shared['owners'] = owners
+    _shared['threshold'] = threshold
+    _shared['block_size'] = block_size
+    _shared['max_pairs'] = max_pairs
+
+
+def _pairs_in_block(start: int) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    vectors = _shared['vectors']
+    owners = _shared['owners']
+    block_size = _shared['block_size']
+    end = min(start + block_size, len(vectors))
+    strongest = _StrongestPairs(_shared['max_pairs'])
+
+    # строки блока умножаются на столбцы тоже блоками: в памяти block_size x block_size
+    for column_start in range(start, len(vectors), block_size):
+        column_end = min(column_start + block_size, len(vectors))
+        scores = vectors[start:end] @ vectors[column_start:column_end].T
+        if column_start == start:
+            # только j > i: на диагональном блоке отрезаем диагональ и все, что ниже
+            scores[np.tril_indices(end - start, m=column_end - column_start)] = -np.inf
+
+        rows, cols = np.nonzero(scores >= max(_shared['threshold'], strongest.floor))
+        values = scores[rows, cols]
+        rows += start
+        cols += column_start
+
+        if owners is not None:
+            different = owners[rows] != owners[cols]
+            rows, cols, values = rows[different], cols[different], values[different]
+
+        strongest.add(rows.astype(np.int64), cols.astype(np.int64), values.astype(np.float32))
+
+    return strongest.result()
+
+
+class _StrongestPairs:
+    """
+    Не больше limit самых близких пар (None - все). Буфер обрезается до limit, когда вдвое
+    его превышает; после первой обрезки пары слабее floor заведомо не попадут в результат.
+    """
+
+    def __init__(self, limit: Optional[int]):
+        self.limit = limit
+        self.floor = -np.inf
+        self._parts = []
+        self._size = 0
+
+    def add(self, rows: np.ndarray, cols: np.ndarray, scores: np.ndarray):
+        if not len(scores):
+            return
+        self._parts.append((rows, cols, scores))
+        self._size += len(scores)
+        if self.limit is not None and self._size > 2 * self.limit:
+            self._trim()
+
+    def result(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        self._trim()
+        if not self._parts:
+            empty = np.empty(0, dtype=np.int64)
+            return empty, empty, np.empty(0, dtype=np.float32)
+        rows, cols, scores = self._parts[0]
+        order = np.lexsort((cols, rows, -scores))
+        return rows[order], cols[order], scores[order]
+
+    def _trim(self):
+        if not self._parts:
+            return
+        rows, cols, scores = (np.concatenate(arrays) for arrays in zip(*self._parts))
+        if self.limit is not None and len(scores) > self.limit:
+            keep = np.argpartition(-scores, self.limit - 1)[:self.limit] if self.limit else np.empty(0, dtype=np.int64)
+            rows, cols, scores = rows[keep], cols[keep], scores[keep]
+            self.floor = scores.min() if len(scores) else np.inf
+        self._parts = [(rows, cols, scores)]
+        self._size = len(scores)
+
+
+def detect_corpus_duplicates(corpus_id: int, text_threshold: float = 0.95, chunk_threshold: float = 0.97,
+                             block_size: int = 2048, workers: int = 1,
+                             max_pairs: Optional[int] = None) -> Dict[str, int]:
+    """
+    Пересчитывает центроиды и почти-дубликаты текстов корпуса, заменяя сохраненные результаты.
+    max_pairs - сколько самых близких пар каждого уровня сохранять (None - все).
+    """
+    rows = (Text.objects
+            .filter(corpus_id=corpus_id, embedding_status=Text.EMBEDDING_READY)
+            .exclude(embeddings=None)
+            .order_by('id')
+            .values_list('id', 'embeddings', 'centroid'))
+
+    text_ids = []
+    centroids = []
+    chunk_blocks = []
+    stale = []
+    for text_id, embeddings, stored_centroid in rows.iterator():
+        vectors = decode_vectors(embeddings)
+        if not len(vectors):
+            continue
+
+        centroid = decode_vectors(stored_centroid)
+        if len(centroid):
+            centroid = centroid[0]
+        else:
+            centroid = EmbeddingService.centroid(vectors)
+            text = Text(id=text_id)
+            text.set_centroid(centroid)
+            stale.append(text)
+
+        text_ids.append(text_id)
+        centroids.append(centroid)
+        chunk_blocks.append(vectors)
+
+    if stale:
+        Text.objects.bulk_update(stale, ['centroid'], batch_size=500)
+
+    found = []
+    if len(text_ids) > 1:
+        text_ids = np.asarray(text_ids, dtype=np.int64)
+
+        i, j, scores = find_similar_pairs(np.stack(centroids), text_threshold,
+                                          block_size=block_size, workers=workers, max_pairs=max_pairs)
+        found.extend(
+            NearDuplicate(corpus_id=corpus_id, kind=NearDuplicate.TEXT,
+                          text_a_id=int(text_ids[a]), text_b_id=int(text_ids[b]), score=float(score))
+            for a, b, score in zip(i, j, scores)
+        )
+
+        lengths = [len(block) for block in chunk_blocks]
+        owners = np.repeat(text_ids, lengths)
+        chunk_numbers = np.concatenate([np.arange(length) for length in lengths])
+
+        i, j, scores = find_similar_pairs(np.concatenate(chunk_blocks), chunk_threshold, owners=owners,
+                                          block_size=block_size, workers=workers, max_pairs=max_pairs)
+        found.extend(
+            NearDuplicate(corpus_id=corpus_id, kind=NearDuplicate.CHUNK,
+                          text_a_id=int(owners[a]), text_b_id=int(owners[b]),
+                          chunk_a=int(chunk_numbers[a]), chunk_b=int(chunk_numbers[b]), score=float(score))
+            for a, b, score in zip(i, j, scores)
+        )
+
+    with transaction.atomic():
+        NearDuplicate.objects.filter(corpus_id=corpus_id).delete()
+        NearDuplicate.objects.bulk_create(found, batch_size=1000)
+
+    result = {
+        'texts': len(text_ids),
+        'centroids_updated': len(stale),
+        'text_pairs': sum(1 for item in found if item.kind == NearDuplicate.TEXT),
+        'chunk_pairs': sum(1 for item in found if item.kind == NearDuplicate.CHUNK),
+    }
+    logger.info("Near-duplicates of corpus %s: %s", corpus_id, result)
+    return result
+
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+    norms[norms == 0] = 1
+    return vectors / norms
@@ -0,0 +1,143 @@
+from typing import List, Dict, Any, Optional
+from concurrent.futures import Future
+import queue
+import threading
+import time
+import numpy as np
+from django.conf import settings
+from db.services.embedding_service import EmbeddingService
+
+# Объединяет тексты из параллельных запросов в один вызов model.encode:
+# первый пришедший запрос открывает окно window_ms, все запросы за это окно
+# (но не больше max_batch_size текстов) кодируются одним батчем.
+
+
+class _PendingRequest:
+    __slots__ = ("texts", "future")
+
+    def __init__(self, texts: List[str]):
+        self.texts = texts
+        self.future = Future()
+
+
+class EmbeddingBatcher:
+    def __init__(self, window_ms: float = 5, max_batch_size: int = 64,
+                 service: Optional[EmbeddingService] = None):
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self.service = service or EmbeddingService()
+
+        self._queue = queue.Queue()
+        self._worker = None
+        self._worker_lock = threading.Lock()
+
+        self._metrics_lock = threading.Lock()
+        self._queued_texts = 0
+        self._requests = 0
+        self._texts = 0
+        self._batches = 0
+        self._last_batch_size = 0
+        self._max_batch_size_seen = 0
+        self._last_batch_seconds = 0.0
+
+    def encode(self, texts: List[str], timeout: Optional[float] = None) -> np.ndarray:
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        request = _PendingRequest(list(texts))
+        with self._metrics_lock:
+            self._queued_texts += len(request.texts)
+            self._requests += 1
+
+        self._ensure_worker()
+        self._queue.put(request)
+        return request.future.result(timeout)
+
+    def metrics(self) -> Dict[str, Any]:
+        with self._metrics_lock:
+            return {
+                "queue_depth": self._queue.qsize(),
+                "queued_texts": self._queued_texts,
+                "requests": self._requests,
+                "texts": self._texts,
+                "batches": self._batches,
+                "avg_batch_size": self._texts / self._batches if self._batches else 0.0,
+                "last_batch_size": self._last_batch_size,
+                "max_batch_size_seen": self._max_batch_size_seen,
+                "last_batch_ms": self._last_batch_seconds * 1000,
+                "window_ms": self.window * 1000,
+                "max_batch_size": self.max_batch_size,
+            }
+
+    def _ensure_worker(self):
+        if self._worker is not None and self._worker.is_alive():
+            return
+
+        with self._worker_lock:
+            if self._worker is None or not self._worker.is_alive():
+                self._worker = threading.Thread(target=self._run, name="embedding-batcher", daemon=True)
+                self._worker.start()
+
+    def _run(self):
+        while True:
+            batch = [self._queue.get()]
+            size = len(batch[0].texts)
+            deadline = time.monotonic() + self.window
+
+            while size < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                try:
+                    request = self._queue.get(timeout=remaining)
+                except queue.Empty:
+                    break
+                batch.append(request)
+                size += len(request.texts)
+
+            self._process(batch)
+
+    def _process(self, batch: List[_PendingRequest]):
+        texts = [text for request in batch for text in request.texts]
+        started = time.monotonic()
+
+        try:
+            # близкие по длине тексты рядом - меньше паддинга внутри батча модели
+            order = np.argsort([len(text) for text in texts], kind="stable")
+            encoded = np.asarray(self.service.get_embeddings([texts[i] for i in order]))
+            embeddings = np.empty_like(encoded)
+            embeddings[order] = encoded
+
+            offset = 0
+            for request in batch:
+                request.future.set_result(embeddings[offset:offset + len(request.texts)])
+                offset += len(request.texts)
+        except Exception as e:
+            for request in batch:
+                if not request.future.done():
+                    request.future.set_exception(e)
+        finally:
+            with self._metrics_lock:
+                self._queued_texts -= len(texts)
+                self._texts += len(texts)
+                self._batches += 1
+                self._last_batch_size = len(texts)
+                self._max_batch_size_seen = max(self._max_batch_size_seen, len(texts))
+                self._last_batch_seconds = time.monotonic() - started
+
+
+_batcher = None
+_batcher_lock = threading.Lock()
+
+
+def get_embedding_batcher() -> EmbeddingBatcher:
+    global _batcher
+
+    if _batcher is None:
+        with _batcher_lock:
+            if _batcher is None:
+                _batcher = EmbeddingBatcher(
+                    window_ms=settings.EMBEDDING_BATCH_WINDOW_MS,
+                    max_batch_size=settings.EMBEDDING_BATCH_MAX_SIZE
+                )
+    return _batcher
@@ -0,0 +1,116 @@
+from typing import Dict, Iterable, List, Optional
+from collections import OrderedDict
+import hashlib
+import logging
+import threading
+import numpy as np
+from django.conf import settings
+from django.db import DatabaseError
+from db.models import ChunkEmbedding
+
+# Кэш эмбеддингов чанков, адресуемый содержимым:
+# ключ = sha256(имя модели + нормализованный текст чанка).
+# Первый уровень - LRU в памяти процесса, второй - таблица ChunkEmbedding.
+
+logger = logging.getLogger(__name__)
+
+
+class EmbeddingCache:
+    def __init__(self, model_name: str, max_items: int = 10000, persistent: bool = True):
+        self.model_name = model_name
+        self.max_items = max_items
+        self.persistent = persistent
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def normalize(text: str) -> str:
+        return " ".join(text.split())
+
+    def key(self, text: str) -> str:
+        data = f"{self.model_name}\n{self.normalize(text)}".encode("utf-8")
+        return hashlib.sha256(data).hexdigest()
+
+    def get_many(self, keys: Iterable[str]) -> Dict[str, np.ndarray]:
+        found = {}
+        missing = []
+
+        with self._lock:
+            for key in keys:
+                vector = self._items.get(key)
+                if vector is None:
+                    missing.append(key)
+                else:
+                    self._items.move_to_end(key)
+                    found[key] = vector
+
+        if missing and self.persistent:
+            stored = self._load(missing)
+            self._remember(stored)
+            found.update(stored)
+
+        return found
+
+    def set_many(self, vectors: Dict[str, np.ndarray]):
+        if not vectors:
+            return
+
+        self._remember(vectors)
+        if self.persistent:
+            self._store(vectors)
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+    def _remember(self, vectors: Dict[str, np.ndarray]):
+        with self._lock:
+            for key, vector in vectors.items():
+                self._items[key] = vector
+                self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def _load(self, keys: List[str]) -> Dict[str, np.ndarray]:
+        try:
+            rows = ChunkEmbedding.objects.filter(key__in=keys).values_list('key', 'vector')
+            return {key: np.frombuffer(vector, dtype=np.float32) for key, vector in rows}
+        except DatabaseError:
+            logger.exception("Failed to read chunk embeddings from the database")
+            return {}
+
+    def _store(self, vectors: Dict[str, np.ndarray]):
+        rows = [
+            ChunkEmbedding(
+                key=key,
+                model_name=self.model_name,
+                vector=np.asarray(vector, dtype=np.float32).tobytes()
+            )
+            for key, vector in vectors.items()
+        ]
+        try:
+            ChunkEmbedding.objects.bulk_create(rows, batch_size=500, ignore_conflicts=True)
+        except DatabaseError:
+            logger.exception("Failed to store chunk embeddings in the database")
+
+
+_caches: Dict[str, EmbeddingCache] = {}
+_caches_lock = threading.Lock()
+
+
+def get_embedding_cache(model_name: str) -> Optional[EmbeddingCache]:
+    if not settings.EMBEDDING_CACHE_ENABLED:
+        return None
+
+    cache = _caches.get(model_name)
+    if cache is None:
+        with _caches_lock:
+            cache = _caches.get(model_name)
+            if cache is None:
+                cache = EmbeddingCache(
+                    model_name,
+                    max_items=settings.EMBEDDING_CACHE_MAX_ITEMS,
+                    persistent=settings.EMBEDDING_CACHE_PERSISTENT
+                )
+                _caches[model_name] = cache
+    return cache
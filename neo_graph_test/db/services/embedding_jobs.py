@@ -0,0 +1,216 @@
+from typing import List, Optional
+from datetime import timedelta
+import logging
+import threading
+from django.conf import settings
+from django.db import close_old_connections
+from django.db.models import F, Q
+from django.utils import timezone
+from db.models import Text, EmbeddingJob
+from db.repositories.TextRepository import TextRepository
+from db.services.embedding_service import CHUNKER_VERSION
+
+# Фоновое вычисление эмбеддингов текстов.
+# Очередь хранится в таблице EmbeddingJob, брокер не нужен: задачу забирает тот
+# обработчик, чей UPDATE ... WHERE status='pending' изменил строку.
+# Обработчики - потоки внутри веб-процесса (EMBEDDING_WORKER_THREADS)
+# или отдельный процесс: python manage.py run_embedding_worker
+# После смены разбиения на чанки: python manage.py reembed_texts
+
+logger = logging.getLogger(__name__)
+
+
+def enqueue(text: Text) -> EmbeddingJob:
+    # более старые задачи по этому тексту уже не нужны - посчитаем по актуальному содержимому
+    EmbeddingJob.objects.filter(text_id=text.id, status=EmbeddingJob.PENDING).update(
+        status=EmbeddingJob.DONE, finished_at=timezone.now(), error='superseded')
+    Text.objects.filter(id=text.id).update(embedding_status=Text.EMBEDDING_PENDING, embedding_error='',
+                                           embedding_updated_at=timezone.now())
+    text.embedding_status = Text.EMBEDDING_PENDING
+
+    job = EmbeddingJob.objects.create(text_id=text.id)
+    _notify_workers()
+    return job
+
+
+def enqueue_many(text_ids: List[int]) -> int:
+    """
+    Задачи для текстов без ожидающих задач (только что созданных или готовых).
+    Статус текста не меняется: до пересчета поиск работает по прежним эмбеддингам.
+    """
+    EmbeddingJob.objects.bulk_create([EmbeddingJob(text_id=text_id) for text_id in text_ids], batch_size=1000)
+    _notify_workers()
+    return len(text_ids)
+
+
+def enqueue_outdated(include_all: bool = False, batch_size: int = 1000) -> int:
+    """
+    Ставит в очередь готовые тексты, эмбеддинги которых посчитаны по другой
+    версии разбиения на чанки (include_all - все готовые тексты).
+    Тексты, у которых уже есть ожидающая или выполняемая задача, пропускаются:
+    повторный запуск во время разбора очереди не плодит дубликаты.
+    """
+    queued_texts = EmbeddingJob.objects.filter(status__in=[EmbeddingJob.PENDING, EmbeddingJob.RUNNING])
+    texts = Text.objects.filter(embedding_status=Text.EMBEDDING_READY).exclude(
+        id__in=queued_texts.values('text_id'))
+    if not include_all:
+        texts = texts.filter(Q(chunker_version__isnull=True) | ~Q(chunker_version=CHUNKER_VERSION))
+
+    queued = 0
+    batch = []
+    for text_id in texts.order_by('id').values_list('id', flat=True).iterator(chunk_size=batch_size):
+        batch.append(text_id)
+        if len(batch) >= batch_size:
+            queued += enqueue_many(batch)
+            batch = []
+    if batch:
+        queued += enqueue_many(batch)
+    return queued
+
+
+def claim_next_job() -> Optional[EmbeddingJob]:
+    candidates = EmbeddingJob.objects.filter(status=EmbeddingJob.PENDING).order_by('id').values_list('id', flat=True)[:10]
+
+    for job_id in candidates:
+        claimed = EmbeddingJob.objects.filter(id=job_id, status=EmbeddingJob.PENDING).update(
+            status=EmbeddingJob.RUNNING,
+            started_at=timezone.now(),
+            attempts=F('attempts') + 1
+        )
+        if claimed:
+            return EmbeddingJob.objects.get(id=job_id)
+
+    return None
+
+
+def run_job(job: EmbeddingJob):
+    text = TextRepository.get_by_id(job.text_id, fields=TextRepository.METADATA_FIELDS + ['content'])
+    if text is None:
+        _finish(job, EmbeddingJob.DONE)
+        return
+
+    # статус PENDING мог выставить более новый enqueue - его задача и отметит обработку;
+    # у готового текста (пересчет после смены чанкера) статус не трогаем, поиск работает по старым векторам
+    _latest_rows(job).filter(embedding_status=Text.EMBEDDING_PENDING).update(
+        embedding_status=Text.EMBEDDING_PROCESSING)
+    try:
+        saved = TextRepository.save_embeddings(text, only_if=_is_latest(job))
+    except Exception as e:
+        logger.exception("Embedding job %s for text %s failed", job.id, job.text_id)
+        processing = _latest_rows(job).filter(embedding_status=Text.EMBEDDING_PROCESSING)
+        if job.attempts < settings.EMBEDDING_JOB_MAX_ATTEMPTS:
+            _finish(job, EmbeddingJob.PENDING, str(e))
+            processing.update(embedding_status=Text.EMBEDDING_PENDING)
+        else:
+            _finish(job, EmbeddingJob.FAILED, str(e))
+            processing.update(embedding_status=Text.EMBEDDING_FAILED, embedding_error=str(e))
+        return
+
+    # пока считали, текст изменили или поставили в очередь заново: результат устарел
+    _finish(job, EmbeddingJob.DONE, '' if saved else 'superseded')
+
+
+def requeue_stale_jobs() -> int:
+    # задачи, чей обработчик умер посреди работы
+    deadline = timezone.now() - timedelta(seconds=settings.EMBEDDING_JOB_TIMEOUT)
+    return EmbeddingJob.objects.filter(status=EmbeddingJob.RUNNING, started_at__lt=deadline).update(
+        status=EmbeddingJob.PENDING)
+
+
+def run_pending_jobs(limit: Optional[int] = None) -> int:
+    processed = 0
+    while limit is None or processed < limit:
+        job = claim_next_job()
+        if job is None:
+            break
+        run_job(job)
+        processed += 1
+    return processed
+
+
+def _is_latest(job: EmbeddingJob) -> Q:
+    """Условие на строку текста: по нему нет задачи новее job"""
+    return ~Q(embedding_jobs__id__gt=job.id)
+
+
+def _latest_rows(job: EmbeddingJob):
+    return Text.objects.filter(_is_latest(job), id=job.text_id)
+
+
+def _finish(job: EmbeddingJob, status: str, error: str = ''):
+    finished_at = None if status == EmbeddingJob.PENDING else timezone.now()
+    EmbeddingJob.objects.filter(id=job.id).update(status=status, error=error, finished_at=finished_at)
+
+
+class EmbeddingWorker:
+    def __init__(self, threads: int = 1, poll_interval: float = 2.0):
+        self.threads = threads
+        self.poll_interval = poll_interval
+        self._wakeup = threading.Event()
+        self._stopped = threading.Event()
+        self._threads: List[threading.Thread] = []
+
+    def start(self):
+        requeue_stale_jobs()
+        for i in range(self.threads):
+            thread = threading.Thread(target=self._run, name=f"embedding-worker-{i}", daemon=True)
+            thread.start()
+            self._threads.append(thread)
+
+    def stop(self, timeout: Optional[float] = None):
+        self._stopped.set()
+        self._wakeup.set()
+        for thread in self._threads:
+            thread.join(timeout)
+        self._threads = []
+
+    def notify(self):
+        self._wakeup.set()
+
+    def join(self):
+        for thread in self._threads:
+            thread.join()
+
+    def _run(self):
+        while not self._stopped.is_set():
+            close_old_connections()
+            try:
+                job = claim_next_job()
+                if job is not None:
+                    run_job(job)
+                    continue
+            except Exception:
+                logger.exception("Embedding worker failed to process the queue")
+
+            self._wakeup.wait(self.poll_interval)
+            self._wakeup.clear()
+
+        close_old_connections()
+
+
+_worker: Optional[EmbeddingWorker] = None
+_worker_lock = threading.Lock()
+
+
+def start_embedding_worker(threads: int) -> EmbeddingWorker:
+    global _worker
+
+    with _worker_lock:
+        if _worker is None:
+            _worker = EmbeddingWorker(threads, settings.EMBEDDING_WORKER_POLL_INTERVAL)
+            _worker.start()
+        return _worker
+
+
+def stop_embedding_worker():
+    global _worker
+
+    with _worker_lock:
+        if _worker is not None:
+            _worker.stop(timeout=5)
+            _worker = None
+
+
+def _notify_workers():
+    if _worker is not None:
+        _worker.notify()
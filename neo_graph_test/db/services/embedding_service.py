@@ -1,46 +1,243 @@
 
-from typing import List, Dict, Any, Optional
+from typing import List, Dict, Any, Optional, Tuple, Union, Iterable, Iterator, Callable
+from collections import deque
+import threading
 import numpy as np
-from sentence_transformers import SentenceTransformer
 from sklearn.metrics.pairwise import cosine_similarity
 import re
+from db.services.embedding_cache import get_embedding_cache
 
 # if model can't be downloaded run the next command in cmd before:
 # python -c "from sentence_transformers import SentenceTransformer; SentenceTransformer('sentence-transformers/all-MiniLM-L6-v2')"
 
+MODEL_NAME = "sentence-transformers/all-MiniLM-L6-v2"
+# версия правил разбиения на чанки: увеличивается при любом изменении границ чанков,
+# тексты со старой версией пересчитывает python manage.py reembed_texts
+CHUNKER_VERSION = 2
+
 class EmbeddingService:
-    def __init__(self):
-       self.model = SentenceTransformer("sentence-transformers/all-MiniLM-L6-v2")
+    # модель загружается один раз на процесс при первом обращении к self.model;
+    # сам сервис дешевый и его можно создавать на каждый запрос
+    _model = None
+    _tokenizer = None
+    _model_lock = threading.Lock()
 
     def __enter__(self):
         return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        pass
+
+    @property
+    def model(self):
+        return self.get_model()
+
+    @classmethod
+    def get_model(cls):
+        if cls._model is None:
+            with cls._model_lock:
+                if cls._model is None:
+                    from sentence_transformers import SentenceTransformer
+                    cls._model = SentenceTransformer(MODEL_NAME)
+        return cls._model
+
+    @classmethod
+    def warm_up(cls):
+        cls.get_model()
     
-    def get_chunks(self, text: str, max_tokens: int = 128) -> List[str]:
-        sentences = re.findall(r'[^.!?]*[.!?]', text)
-        sentences = [s.strip() for s in sentences if s.strip()]
-        
-        chunks = []
-        current_chunk = ""
-        
-        for sentence in sentences:
-            if len(current_chunk.split()) + len(sentence.split()) <= max_tokens:
-                current_chunk += " " + sentence if current_chunk else sentence
-            else:
-                if current_chunk:
-                    chunks.append(current_chunk)
-                current_chunk = sentence
-        
-        if current_chunk:
-            chunks.append(current_chunk)
-        
-        return chunks
-
-    def get_embeddings(self, texts: List[str]) -> List[np.array]:
-        embeddings = self.model.encode(texts, convert_to_numpy=True, normalize_embeddings=True)
-        return embeddings
+    def get_chunks(self, text: str, max_tokens: int = 128, overlap: int = 0) -> List[str]:
+        return list(self.iter_chunks(text, max_tokens, overlap))
+
+    def iter_chunks(self, source: Union[str, Iterable[str]], max_tokens: int = 128, overlap: int = 0,
+                    count_tokens: Optional[Callable[[str], int]] = None) -> Iterator[str]:
+        """
+        Разбивает текст на чанки из целых предложений не длиннее max_tokens токенов модели.
+        source - строка или итератор фрагментов текста (например, открытый файл), читается потоково.
+        overlap - сколько токенов из конца предыдущего чанка (целыми предложениями) повторить в начале следующего.
+        Предложения длиннее max_tokens режутся по словам, текст без финальной пунктуации не теряется.
+        """
+        if overlap >= max_tokens:
+            raise ValueError("overlap must be less than max_tokens")
+        count_tokens = count_tokens or self.count_tokens
+
+        window = deque()  # (предложение, число токенов)
+        total = 0
+        fresh = 0  # предложения в окне, еще не попавшие ни в один чанк
+
+        for sentence in self._iter_sentences(source):
+            tokens = count_tokens(sentence)
+            pieces = [(sentence, tokens)] if tokens <= max_tokens else self._split_long(sentence, max_tokens, count_tokens)
+
+            for piece, tokens in pieces:
+                if fresh and total + tokens > max_tokens:
+                    yield " ".join(item for item, _ in window)
+                    fresh = 0
+                    while window and (total > overlap or total + tokens > max_tokens):
+                        total -= window.popleft()[1]
+
+                window.append((piece, tokens))
+                total += tokens
+                fresh += 1
+
+        if fresh:
+            yield " ".join(item for item, _ in window)
+
+    def count_tokens(self, text: str) -> int:
+        return len(self.get_tokenizer().tokenize(text))
+
+    @classmethod
+    def get_tokenizer(cls):
+        # токенизатору не нужна модель: чанкинг не должен ждать загрузки весов
+        if cls._tokenizer is None:
+            with cls._model_lock:
+                if cls._tokenizer is None:
+                    if cls._model is not None:
+                        cls._tokenizer = cls._model.tokenizer
+                    else:
+                        from transformers import AutoTokenizer
+                        cls._tokenizer = AutoTokenizer.from_pretrained(MODEL_NAME)
+        return cls._tokenizer
+
+    # граница предложения: пунктуация, за которой идет пробельный символ
+    SENTENCE_END = re.compile(r'[.!?]+(?=\s)')
+    # предложение без пунктуации длиннее этого режется по пробелу, чтобы буфер не рос бесконечно
+    MAX_SENTENCE_CHARS = 20000
+
+    def _iter_sentences(self, source: Union[str, Iterable[str]]) -> Iterator[str]:
+        if isinstance(source, str):
+            source = [source]
+
+        buffer = ""
+        for piece in source:
+            # новый фрагмент может продолжить пунктуацию в конце буфера, поэтому поиск с последнего символа
+            scan_from = max(len(buffer) - 1, 0)
+            buffer += piece
+
+            start = 0
+            for match in self.SENTENCE_END.finditer(buffer, scan_from):
+                sentence = buffer[start:match.end()].strip()
+                if sentence:
+                    yield sentence
+                start = match.end()
+
+            if len(buffer) - start > self.MAX_SENTENCE_CHARS:
+                cut = buffer.rfind(" ", start, len(buffer) - 1)
+                if cut > start:
+                    sentence = buffer[start:cut].strip()
+                    if sentence:
+                        yield sentence
+                    start = cut
+            buffer = buffer[start:]
+
+        sentence = buffer.strip()
+        if sentence:
+            yield sentence
+
+    @staticmethod
+    def _split_long(sentence: str, max_tokens: int, count_tokens: Callable[[str], int]) -> List[Tuple[str, int]]:
+        pieces = []
+        words = []
+        total = 0
+        for word in sentence.split():
+            tokens = count_tokens(word)
+            if words and total + tokens > max_tokens:
+                pieces.append((" ".join(words), total))
+                words, total = [], 0
+            words.append(word)
+            total += tokens
+        if words:
+            pieces.append((" ".join(words), total))
+        return pieces
+
+    def get_embeddings(self, texts: List[str], batch_size: int = 32) -> List[np.array]:
+        if not texts:
+            return np.empty((0, 0), dtype=np.float32)
+
+        cache = get_embedding_cache(MODEL_NAME)
+        if cache is None:
+            return self._encode(texts, batch_size)
+
+        keys = [cache.key(text) for text in texts]
+        vectors = cache.get_many(set(keys))
+
+        # каждый уникальный отсутствующий в кэше текст кодируется один раз
+        missing = {}
+        for key, text in zip(keys, texts):
+            if key not in vectors and key not in missing:
+                missing[key] = text
+
+        if missing:
+            encoded = self._encode(list(missing.values()), batch_size)
+            computed = dict(zip(missing.keys(), encoded))
+            cache.set_many(computed)
+            vectors.update(computed)
+
+        return np.stack([vectors[key] for key in keys])
+
+    def _encode(self, texts: List[str], batch_size: int = 32) -> np.ndarray:
+        return self.model.encode(texts, batch_size=batch_size, convert_to_numpy=True, normalize_embeddings=True)
     
     def cos_compare(self, emb1: List[float], emb2: List[float]) -> float:
         emb1 = np.array(emb1).reshape(1, -1)
         emb2 = np.array(emb2).reshape(1, -1)
         return float(cosine_similarity(emb1, emb2)[0][0])
 
+    def similarity_matrix(self, left, right, normalized: bool = False) -> np.ndarray:
+        """
+        Матрица косинусных близостей M x N для наборов векторов M x D и N x D.
+        normalized=True - векторы уже нормированы (как у get_embeddings), остается одно умножение матриц
+        """
+        left, right = self._as_matrix(left, normalized), self._as_matrix(right, normalized)
+        return left @ right.T
+
+    def top_k_similar(self, left, right, k: int, normalized: bool = False,
+                      block_size: int = 1024) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Для каждой строки left - k самых близких строк right (индексы и близости, по убыванию).
+        Считается блоками по block_size строк, так что в памяти не больше block_size x N близостей
+        """
+        left, right = self._as_matrix(left, normalized), self._as_matrix(right, normalized)
+        k = min(k, len(right))
+
+        indices = np.empty((len(left), k), dtype=np.int64)
+        scores = np.empty((len(left), k), dtype=np.float32)
+        if k == 0:
+            return indices, scores
+
+        for start in range(0, len(left), block_size):
+            block = left[start:start + block_size] @ right.T
+            if k < block.shape[1]:
+                top = np.argpartition(-block, k - 1, axis=1)[:, :k]
+            else:
+                top = np.broadcast_to(np.arange(block.shape[1]), block.shape).copy()
+            top_scores = np.take_along_axis(block, top, axis=1)
+            order = np.argsort(-top_scores, axis=1, kind="stable")
+
+            indices[start:start + len(block)] = np.take_along_axis(top, order, axis=1)
+            scores[start:start + len(block)] = np.take_along_axis(top_scores, order, axis=1)
+
+        return indices, scores
+
+    @staticmethod
+    def centroid(vectors) -> np.ndarray:
+        """Нормированный средний вектор (эмбеддинг текста целиком по эмбеддингам его чанков)"""
+        vectors = np.asarray(vectors, dtype=np.float32)
+        if vectors.ndim != 2 or len(vectors) == 0:
+            raise ValueError("Cannot compute a centroid of an empty set of vectors")
+        mean = vectors.mean(axis=0)
+        norm = np.linalg.norm(mean)
+        return mean / norm if norm else mean
+
+    @staticmethod
+    def _as_matrix(vectors, normalized: bool) -> np.ndarray:
+        matrix = np.asarray(vectors, dtype=np.float32)
+        if matrix.ndim == 1:
+            matrix = matrix.reshape(1, -1)
+        if matrix.ndim != 2:
+            raise ValueError(f"Expected a list of vectors, got shape {matrix.shape}")
+        if normalized:
+            return matrix
+        norms = np.linalg.norm(matrix, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return matrix / norms
+
@@ -0,0 +1,284 @@
+from typing import Any, Dict, Iterable, List, Optional, Set
+from collections import OrderedDict
+import logging
+import threading
+import time
+from django.conf import settings
+from ..repositories.ontology_driver.driver import OntologyRepository
+from .ontology_service import OntologyService
+
+# Кэш чтений онтологии (read-through) поверх OntologyService.
+# Онтология читается на порядки чаще, чем меняется, поэтому ответы методов чтения
+# кэшируются по ключам вида "<вид>:<uri>", а каждый изменяющий метод сбрасывает ровно те ключи,
+# в ответах которых могли оказаться затронутые узлы (для сигнатур - еще и всех классов-потомков).
+# Хранилище - LRU с TTL в памяти процесса или (ONTOLOGY_CACHE_BACKEND) кэш Django,
+# общий для процессов. TTL ограничивает устаревание, если онтологию меняют в обход сервиса.
+# LRU процесса годится только для одного процесса: записи через другие процессы его не сбрасывают.
+
+# ключи, не зависящие от uri; parent_classes кэшируется постранично и сбрасывается целиком
+ONTOLOGY_KEY = "ontology"
+PARENT_CLASSES_KEY = "parent_classes"
+
+logger = logging.getLogger(__name__)
+
+
+class LocalCacheStore:
+    """LRU с TTL в памяти процесса"""
+
+    def __init__(self, max_items: int = 10000, ttl: float = 300):
+        self.max_items = max_items
+        self.ttl = ttl
+        self._items = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key: str) -> Any:
+        with self._lock:
+            item = self._items.get(key)
+            if item is None:
+                return None
+            expires, value = item
+            if expires < time.monotonic():
+                del self._items[key]
+                return None
+            self._items.move_to_end(key)
+            return value
+
+    def set(self, key: str, value: Any):
+        with self._lock:
+            self._items[key] = (time.monotonic() + self.ttl, value)
+            self._items.move_to_end(key)
+            while len(self._items) > self.max_items:
+                self._items.popitem(last=False)
+
+    def delete_many(self, keys: Iterable[str]):
+        with self._lock:
+            for key in keys:
+                self._items.pop(key, None)
+
+    def delete_prefix(self, prefix: str):
+        with self._lock:
+            for key in [key for key in self._items if key.startswith(prefix)]:
+                del self._items[key]
+
+    def clear(self):
+        with self._lock:
+            self._items.clear()
+
+
+class DjangoCacheStore:
+    """
+    Кэш Django (settings.CACHES[alias]). Ключи содержат номер поколения:
+    clear() увеличивает поколение вместо очистки всего кэша, в котором могут быть чужие данные.
+    """
+
+    def __init__(self, alias: str, ttl: float = 300, prefix: str = "ontology"):
+        from django.core.cache import caches
+        self.cache = caches[alias]
+        self.ttl = ttl
+        self.prefix = prefix
+
+    def get(self, key: str) -> Any:
+        return self.cache.get(self._key(key, self._generation()))
+
+    def set(self, key: str, value: Any):
+        self.cache.set(self._key(key, self._generation()), value, self.ttl)
+
+    def delete_many(self, keys: Iterable[str]):
+        generation = self._generation()
+        self.cache.delete_many([self._key(key, generation) for key in keys])
+
+    def delete_prefix(self, prefix: str):
+        # перебирать ключи кэш Django не умеет - сбрасываем поколение целиком
+        self.clear()
+
+    def clear(self):
+        generation_key = f"{self.prefix}:generation"
+        if not self.cache.add(generation_key, 1, None):
+            self.cache.incr(generation_key)
+
+    def _generation(self) -> int:
+        return self.cache.get_or_set(f"{self.prefix}:generation", 0, None)
+
+    def _key(self, key: str, generation: int) -> str:
+        return f"{self.prefix}:{generation}:{key}"
+
+
+class CachedOntologyService(OntologyService):
+    def __init__(self, repository: OntologyRepository, store):
+        super().__init__(repository)
+        self.store = store
+
+    ######################################
+    #          Cached reads              #
+    ######################################
+    def get_ontology(self) -> Dict[str, Any]:
+        return self._cached(ONTOLOGY_KEY, super().get_ontology)
+
+    def get_ontology_parent_classes(self, offset: int = 0, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        return self._cached(f"{PARENT_CLASSES_KEY}:{offset}:{limit}", super().get_ontology_parent_classes, offset, limit)
+
+    def get_class(self, uri: str) -> Optional[Dict[str, Any]]:
+        return self._cached(f"class:{uri}", super().get_class, uri)
+
+    def get_class_parents(self, uri: str) -> List[Dict[str, Any]]:
+        return self._cached(f"parents:{uri}", super().get_class_parents, uri)
+
+    def get_class_children(self, uri: str) -> List[Dict[str, Any]]:
+        return self._cached(f"children:{uri}", super().get_class_children, uri)
+
+    def get_class_objects(self, uri: str) -> List[Dict[str, Any]]:
+        return self._cached(f"objects:{uri}", super().get_class_objects, uri)
+
+    def get_object(self, uri: str) -> Optional[Dict[str, Any]]:
+        return self._cached(f"object:{uri}", super().get_object, uri)
+
+    def collect_signature(self, uri: str) -> Dict[str, Any]:
+        return self._cached(f"signature:{uri}", super().collect_signature, uri)
+
+    ######################################
+    #     Writes with invalidation       #
+    ######################################
+    def create_class(self, title: str, description: str = "", parent_uri: str = None) -> str:
+        # новый класс - новый корень или новый ребенок parent_uri
+        with self._invalidating({f"children:{parent_uri}"} if parent_uri else set(), roots=True):
+            return super().create_class(title, description, parent_uri)
+
+    def update_class(self, uri: str, title: str = None, description: str = None) -> bool:
+        # класс входит в списки родителей/детей соседей
+        with self._invalidating(self._around(uri), roots=True):
+            return super().update_class(uri, title, description)
+
+    def add_class_parent(self, parent_uri: str, target_uri: str) -> bool:
+        keys = {f"parents:{target_uri}", f"children:{parent_uri}"}
+        # target_uri и его потомки наследуют свойства нового родителя
+        keys |= self._signatures_below(target_uri)
+        with self._invalidating(keys, roots=True):
+            return super().add_class_parent(parent_uri, target_uri)
+
+    def delete_class(self, uri: str, batch_size: Optional[int] = None) -> int:
+        # каскад может задеть что угодно
+        try:
+            return super().delete_class(uri, batch_size)
+        finally:
+            self.store.clear()
+
+    def add_class_attribute(self, uri: str, datatype_title: str) -> str:
+        with self._invalidating({f"children:{uri}"} | self._signatures_below(uri)):
+            return super().add_class_attribute(uri, datatype_title)
+
+    def delete_class_attribute(self, attribute_uri: str) -> bool:
+        with self._invalidating(self._property_keys(attribute_uri)):
+            return super().delete_class_attribute(attribute_uri)
+
+    def add_class_object_attribute(self, uri: str, attr_name: str, range_uri: str) -> str:
+        keys = {f"children:{uri}", f"children:{range_uri}"} | self._signatures_below(uri)
+        with self._invalidating(keys):
+            return super().add_class_object_attribute(uri, attr_name, range_uri)
+
+    def delete_class_object_attribute(self, object_property_uri: str) -> bool:
+        with self._invalidating(self._property_keys(object_property_uri)):
+            return super().delete_class_object_attribute(object_property_uri)
+
+    def create_object(self, uri: str, title: str, description: str = "",
+                      properties: Dict[str, Any] = None,
+                      object_properties: Dict[str, str] = None) -> str:
+        keys = {f"children:{uri}", f"objects:{uri}"}
+        for target_uri in (object_properties or {}).values():
+            keys.add(f"children:{target_uri}")
+        with self._invalidating(keys):
+            return super().create_object(uri, title, description, properties, object_properties)
+
+    def update_object(self, uri: str, title: str = None, description: str = None,
+                      properties: Dict[str, Any] = None,
+                      new_connections: Dict[str, str] = None) -> bool:
+        keys = self._around(uri)
+        for target_uri in (new_connections or {}).values():
+            keys.add(f"children:{target_uri}")
+        with self._invalidating(keys):
+            return super().update_object(uri, title, description, properties, new_connections)
+
+    def delete_object(self, uri: str) -> bool:
+        with self._invalidating(self._around(uri)):
+            return super().delete_object(uri)
+
+    def import_ontology(self, classes: List[Dict[str, Any]] = (), attributes: List[Dict[str, Any]] = (),
+                        object_attributes: List[Dict[str, Any]] = (),
+                        objects: List[Dict[str, Any]] = ()) -> Dict[str, Any]:
+        try:
+            return super().import_ontology(classes, attributes, object_attributes, objects)
+        finally:
+            self.store.clear()
+
+    ######################################
+    #          Private methods           #
+    ######################################
+    def _cached(self, key: str, load, *args):
+        value = self.store.get(key)
+        if value is None:
+            value = load(*args)
+            if value is not None:
+                self.store.set(key, value)
+        return value
+
+    def _invalidating(self, keys: Set[str], roots: bool = False):
+        return _Invalidation(self.store, keys, roots)
+
+    def _around(self, uri: str) -> Set[str]:
+        """Ключи самого узла и списков его соседей, в которые узел входит"""
+        keys = {f"class:{uri}", f"object:{uri}", f"parents:{uri}", f"children:{uri}", f"objects:{uri}",
+                f"signature:{uri}"}
+        for parent in self.repository.get_class_parents(uri):
+            if parent is not None:
+                keys |= {f"children:{parent.uri}", f"objects:{parent.uri}"}
+        for child in self.repository.get_class_children(uri):
+            if child is not None:
+                keys.add(f"parents:{child.uri}")
+        return keys
+
+    def _signatures_below(self, uri: str) -> Set[str]:
+        return {f"signature:{descendant}" for descendant in self.repository.get_subclass_uris(uri)}
+
+    def _property_keys(self, property_uri: str) -> Set[str]:
+        # домен свойства (и его потомки) теряют свойство, домен и область значений - ребенка
+        keys = self._around(property_uri)
+        for cls in self.repository.get_class_parents(property_uri):
+            if cls is not None:
+                keys |= self._signatures_below(cls.uri)
+        return keys
+
+
+class _Invalidation:
+    """Сбрасывает ключи после записи, даже если запись упала на полпути"""
+
+    def __init__(self, store, keys: Set[str], roots: bool):
+        self.store = store
+        self.keys = set(keys) | {ONTOLOGY_KEY}
+        self.roots = roots
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc_val, exc_tb):
+        self.store.delete_many(self.keys)
+        if self.roots:
+            self.store.delete_prefix(PARENT_CLASSES_KEY)
+
+
+_store = None
+_store_lock = threading.Lock()
+
+
+def get_ontology_cache_store():
+    global _store
+
+    if _store is None:
+        with _store_lock:
+            if _store is None:
+                if settings.ONTOLOGY_CACHE_BACKEND:
+                    _store = DjangoCacheStore(settings.ONTOLOGY_CACHE_BACKEND, settings.ONTOLOGY_CACHE_TTL)
+                else:
+                    logger.warning("Ontology cache uses a per-process store: with several worker processes "
+                                   "reads may be stale for up to %s s, set ONTOLOGY_CACHE_BACKEND to a shared cache",
+                                   settings.ONTOLOGY_CACHE_TTL)
+                    _store = LocalCacheStore(settings.ONTOLOGY_CACHE_MAX_ITEMS, settings.ONTOLOGY_CACHE_TTL)
+    return _store
@@ -1,6 +1,40 @@
-from typing import List, Dict, Any, Optional
-from dataclasses import asdict
+from typing import List, Dict, Any, Optional, Iterator
+from django.conf import settings
 from ..repositories.ontology_driver.driver import OntologyRepository
+from ..repositories.ontology_driver.python_driver.driver_registry import get_driver
+
+
+def get_shared_driver():
+    return get_driver(
+        settings.NEO4J_URI,
+        settings.NEO4J_USER,
+        settings.NEO4J_PASSWORD,
+        database=settings.NEO4J_DATABASE,
+        max_connection_pool_size=settings.NEO4J_MAX_CONNECTION_POOL_SIZE,
+        connection_acquisition_timeout=settings.NEO4J_CONNECTION_ACQUISITION_TIMEOUT,
+        liveness_check_timeout=settings.NEO4J_LIVENESS_CHECK_TIMEOUT,
+        max_connection_lifetime=settings.NEO4J_MAX_CONNECTION_LIFETIME,
+    )
+
+
+def create_ontology_service() -> "OntologyService":
+    """
+    Сервис поверх общего драйвера: close() не закрывает пул соединений.
+    При ONTOLOGY_CACHE_ENABLED чтения идут через кэш (CachedOntologyService).
+    """
+    repository = OntologyRepository(
+        uri=settings.NEO4J_URI,
+        user=settings.NEO4J_USER,
+        password=settings.NEO4J_PASSWORD,
+        database=settings.NEO4J_DATABASE,
+        driver=get_shared_driver(),
+        track_version=settings.ONTOLOGY_TRACK_VERSION
+    )
+    if settings.ONTOLOGY_CACHE_ENABLED:
+        from .ontology_cache import CachedOntologyService, get_ontology_cache_store
+        return CachedOntologyService(repository, get_ontology_cache_store())
+    return OntologyService(repository)
+
 
 class OntologyService:
     def __init__(self, repository: OntologyRepository):
@@ -16,32 +50,35 @@ class OntologyService:
         if hasattr(self.repository, 'close'):
             self.repository.close()
 
+    def ensure_schema(self) -> List[str]:
+        return self.repository.ensure_schema()
+
     # Ontology methods
     def get_ontology(self) -> Dict[str, Any]:
         ontology = self.repository.get_ontology()
-        return asdict(ontology)
+        return ontology.to_dict()
 
-    def get_ontology_parent_classes(self) -> List[Dict[str, Any]]:
-        classes = self.repository.get_ontology_parent_classes()
-        return [asdict(cls) for cls in classes]
+    def get_ontology_parent_classes(self, offset: int = 0, limit: Optional[int] = None) -> List[Dict[str, Any]]:
+        classes = self.repository.get_ontology_parent_classes(offset, limit)
+        return [cls.to_dict() for cls in classes]
 
     # Class methods
     def get_class(self, uri: str) -> Optional[Dict[str, Any]]:
         class_obj = self.repository.get_class(uri)
-        return asdict(class_obj) if class_obj else None
+        return class_obj.to_dict() if class_obj else None
 
     def get_class_parents(self, uri: str) -> List[Dict[str, Any]]:
         print(uri)
         parents = self.repository.get_class_parents(uri)
-        return [asdict(parent) for parent in parents if parent]
+        return [parent.to_dict() for parent in parents if parent]
 
     def get_class_children(self, uri: str) -> List[Dict[str, Any]]:
         children = self.repository.get_class_children(uri)
-        return [asdict(child) for child in children if child]
+        return [child.to_dict() for child in children if child]
 
     def get_class_objects(self, uri: str) -> List[Dict[str, Any]]:
         objects = self.repository.get_class_objects(uri)
-        return [asdict(obj) for obj in objects]
+        return [obj.to_dict() for obj in objects]
 
     def create_class(self, title: str, description: str = "", parent_uri: str = None) -> str:
         return self.repository.create_class(title, description, parent_uri)
@@ -50,9 +87,12 @@ class OntologyService:
         self.repository.update_class(uri, title, description)
         return True
 
-    def delete_class(self, uri: str) -> bool:
-        self.repository.delete_class(uri)
-        return True
+    def delete_class(self, uri: str, batch_size: Optional[int] = None) -> int:
+        return self.repository.delete_class(uri, batch_size)
+
+    def get_class_delete_closure(self, uri: str) -> List[Dict[str, Any]]:
+        entities = self.repository.get_class_delete_closure(uri)
+        return [entity.to_dict() for entity in entities]
 
     def add_class_parent(self, parent_uri: str, target_uri: str) -> bool:
         self.repository.add_class_parent(parent_uri, target_uri)
@@ -76,7 +116,7 @@ class OntologyService:
     # Object methods
     def get_object(self, uri: str) -> Optional[Dict[str, Any]]:
         obj = self.repository.get_object(uri)
-        return asdict(obj) if obj else None
+        return obj.to_dict() if obj else None
 
     def create_object(self, uri: str, title: str, description: str = "", 
                      properties: Dict[str, Any] = None, 
@@ -92,7 +132,25 @@ class OntologyService:
         self.repository.delete_object(uri)
         return True
 
+    # Bulk import
+    def import_ontology(self, classes: List[Dict[str, Any]] = (), attributes: List[Dict[str, Any]] = (),
+                        object_attributes: List[Dict[str, Any]] = (),
+                        objects: List[Dict[str, Any]] = ()) -> Dict[str, Any]:
+        return self.repository.import_ontology(classes, attributes, object_attributes, objects)
+
+    # Export
+    def export_graph(self) -> Iterator[Dict[str, Any]]:
+        """Узлы графа онтологии по одному: {"uri", "labels", "props", "arcs": [{"label", "to", "props"}]}"""
+        nodes = self.repository.iter_graph(settings.NEO4J_EXPORT_PAGE_SIZE, settings.NEO4J_EXPORT_FETCH_SIZE)
+        for node in nodes:
+            yield {
+                'uri': node.uri,
+                'labels': node.labels,
+                'props': dict(node.props),
+                'arcs': [{'label': arc.label, 'to': arc.node_uri_to, 'props': dict(arc.props)} for arc in node.arcs],
+            }
+
     # Signature method
     def collect_signature(self, uri: str) -> Dict[str, Any]:
         signature = self.repository.collect_signature(uri)
-        return asdict(signature)
\ No newline at end of file
+        return signature.to_dict()
\ No newline at end of file
@@ -0,0 +1,355 @@
+from typing import Any, Dict, List, Optional, Tuple
+from dataclasses import replace
+import logging
+import threading
+import time
+import numpy as np
+from django.conf import settings
+from ..repositories.ontology_driver.driver import OntologyRepository
+from ..repositories.ontology_driver.entities import ClassSignature, DatatypeProperty, ObjectProperty
+from ..repositories.ontology_driver.python_driver.driver import GraphRepository
+from ..repositories.ontology_driver.python_driver.entities import TNode, TArc
+from ..repositories.ontology_driver.onthology_namespace import *
+from .ontology_service import get_shared_driver
+
+# Копия графа онтологии в памяти процесса для аналитических обходов.
+# Узлы нумеруются подряд (uri -> int), дуги каждого типа хранятся массивами (src, dst)
+# и для обходов сворачиваются в CSR: исходящие offsets/targets и входящие offsets/sources.
+# Копия загружается целиком один раз вместе с версией графа (GraphRepository.get_version, ее ведут
+# процессы с ONTOLOGY_TRACK_VERSION), затем применяет изменения, сделанные через GraphRepository
+# в этом же процессе (подписка на события),
+# если версия события - следующая за версией копии. Пропуск версии означает чужую запись:
+# копия помечается устаревшей. Раз в check_interval версия сверяется с Neo4j, чтобы заметить
+# чужие изменения без своих записей; копия старше max_age перечитывается в любом случае.
+
+logger = logging.getLogger(__name__)
+
+
+class _Adjacency:
+    """Дуги одного типа: списки для дописывания и CSR, пересобираемые лениво"""
+
+    def __init__(self):
+        self.src: List[int] = []
+        self.dst: List[int] = []
+        self.ids: List[str] = []
+        self.csr = None
+
+    def add(self, src: int, dst: int, arc_id: str):
+        self.src.append(src)
+        self.dst.append(dst)
+        self.ids.append(arc_id)
+        self.csr = None
+
+    def build(self, alive: np.ndarray, removed_ids: set):
+        src = np.asarray(self.src, dtype=np.int32)
+        dst = np.asarray(self.dst, dtype=np.int32)
+        keep = alive[src] & alive[dst] if len(src) else np.zeros(0, dtype=bool)
+        if removed_ids:
+            keep &= np.fromiter((arc_id not in removed_ids for arc_id in self.ids), dtype=bool, count=len(self.ids))
+
+        # уплотняем списки, чтобы удаленные дуги не копились
+        self.src = src[keep].tolist()
+        self.dst = dst[keep].tolist()
+        self.ids = [arc_id for arc_id, kept in zip(self.ids, keep.tolist()) if kept]
+        src, dst = src[keep], dst[keep]
+
+        count = len(alive)
+        self.csr = (_csr(src, dst, count), _csr(dst, src, count))
+        return self.csr
+
+
+def _csr(rows: np.ndarray, cols: np.ndarray, count: int) -> Tuple[np.ndarray, np.ndarray]:
+    order = np.argsort(rows, kind="stable")
+    offsets = np.zeros(count + 1, dtype=np.int64)
+    np.cumsum(np.bincount(rows, minlength=count), out=offsets[1:])
+    return offsets, cols[order]
+
+
+class OntologySnapshot:
+    def __init__(self, nodes: List[TNode], arcs: List[TArc], version: Optional[int] = None):
+        self._lock = threading.RLock()
+        self.version = version
+        self.nodes: List[TNode] = []
+        self._ids: Dict[str, int] = {}
+        self._alive: List[bool] = []
+        self._arcs: Dict[str, _Adjacency] = {}
+        self._removed_arcs = set()
+        self.stale = False
+
+        for node in nodes:
+            self._add_node(node)
+        for arc in arcs:
+            self._add_arc(arc)
+
+    ######################################
+    #          Traversal methods         #
+    ######################################
+    def get_node(self, uri: str) -> Optional[TNode]:
+        with self._lock:
+            index = self._ids.get(uri)
+            return None if index is None else self.nodes[index]
+
+    def parents(self, uri: str, arc_label: str = SUB_CLASS) -> List[TNode]:
+        """Узлы, в которые ведут дуги arc_label из uri"""
+        return self._neighbours(uri, arc_label, outgoing=True)
+
+    def children(self, uri: str, arc_label: str = SUB_CLASS) -> List[TNode]:
+        """Узлы, из которых ведут дуги arc_label в uri"""
+        return self._neighbours(uri, arc_label, outgoing=False)
+
+    def ancestors(self, uri: str, arc_label: str = SUB_CLASS) -> List[TNode]:
+        """Все предки по arc_label (без самого uri), ближайшие первыми"""
+        return [node for node, _ in self._reachable(uri, arc_label, outgoing=True)[1:]]
+
+    def descendants(self, uri: str, arc_label: str = SUB_CLASS) -> List[TNode]:
+        """Все потомки по arc_label (без самого uri), ближайшие первыми"""
+        return [node for node, _ in self._reachable(uri, arc_label, outgoing=False)[1:]]
+
+    def inherited(self, uri: str, hierarchy_label: str, arc_label: str, labels: List[str]) -> List[TNode]:
+        """То же, что GraphRepository.get_inherited_nodes, без запроса к Neo4j"""
+        with self._lock:
+            levels = self._reachable(uri, hierarchy_label, outgoing=True)
+            (offsets, sources) = self._csr(arc_label)[1]
+
+            result = []
+            seen = set()
+            for ancestor, _ in levels:
+                index = self._ids[ancestor.uri]
+                for source in sources[offsets[index]:offsets[index + 1]].tolist():
+                    node = self.nodes[source]
+                    if source not in seen and any(label in labels for label in node.labels):
+                        seen.add(source)
+                        result.append(node)
+            return result
+
+    def roots(self, labels: List[str], arc_label: str = SUB_CLASS) -> List[TNode]:
+        """То же, что GraphRepository.get_root_nodes: узлы со всеми labels без исходящих arc_label"""
+        with self._lock:
+            (offsets, _), _ = self._csr(arc_label)
+            has_parent = np.diff(offsets) > 0
+            roots = [
+                node for index, node in enumerate(self.nodes)
+                if self._alive[index] and not has_parent[index] and all(label in node.labels for label in labels)
+            ]
+            return sorted(roots, key=lambda node: node.uri)
+
+    def counts(self) -> Tuple[int, int]:
+        """Число узлов и дуг - для сверки с GraphRepository.get_counts"""
+        with self._lock:
+            arcs = sum(len(self._csr(label)[0][1]) for label in list(self._arcs))
+            return sum(self._alive), arcs
+
+    ######################################
+    #         Applying changes           #
+    ######################################
+    def apply(self, event: str, payload: Any, version: Optional[int] = None):
+        """version - версия графа после изменения; если она не следующая за версией копии, копия устарела"""
+        with self._lock:
+            if version is not None:
+                if self.version is None or version != self.version + 1:
+                    self.stale = True
+                    return
+                self.version = version
+
+            if event == "node_created":
+                self._add_node(payload)
+            elif event == "nodes_created":
+                for node in payload:
+                    self._add_node(node)
+            elif event == "node_updated":
+                index = self._ids.get(payload.uri)
+                if index is None:
+                    self._add_node(payload)
+                else:
+                    self.nodes[index] = _detached(payload)
+            elif event == "node_deleted":
+                index = self._ids.pop(payload, None)
+                if index is not None:
+                    self._alive[index] = False
+                    self._invalidate_csr()
+            elif event == "arcs_created":
+                for arc in payload:
+                    self._add_arc(arc)
+            elif event == "arc_deleted":
+                self._removed_arcs.add(payload)
+                self._invalidate_csr()
+            else:
+                self.stale = True
+
+    ######################################
+    #          Private methods           #
+    ######################################
+    def _add_node(self, node: TNode):
+        node = _detached(node)
+        if node.uri in self._ids:
+            self.nodes[self._ids[node.uri]] = node
+            return
+        self._ids[node.uri] = len(self.nodes)
+        self.nodes.append(node)
+        self._alive.append(True)
+        self._invalidate_csr()
+
+    def _add_arc(self, arc: TArc):
+        src = self._ids.get(arc.node_uri_from)
+        dst = self._ids.get(arc.node_uri_to)
+        if src is None or dst is None:
+            # конец дуги неизвестен - копия разошлась с базой
+            self.stale = True
+            return
+        self._arcs.setdefault(arc.label, _Adjacency()).add(src, dst, arc.id)
+
+    def _invalidate_csr(self):
+        for adjacency in self._arcs.values():
+            adjacency.csr = None
+
+    def _csr(self, arc_label: str):
+        adjacency = self._arcs.get(arc_label)
+        if adjacency is None:
+            empty = (np.zeros(len(self.nodes) + 1, dtype=np.int64), np.zeros(0, dtype=np.int32))
+            return empty, empty
+        if adjacency.csr is None:
+            adjacency.build(np.asarray(self._alive, dtype=bool), self._removed_arcs)
+        return adjacency.csr
+
+    def _neighbours(self, uri: str, arc_label: str, outgoing: bool) -> List[TNode]:
+        with self._lock:
+            index = self._ids.get(uri)
+            if index is None:
+                return []
+            offsets, targets = self._csr(arc_label)[0 if outgoing else 1]
+            return [self.nodes[i] for i in targets[offsets[index]:offsets[index + 1]].tolist()]
+
+    def _reachable(self, uri: str, arc_label: str, outgoing: bool) -> List[Tuple[TNode, int]]:
+        """Обход в ширину от uri (включая его): (узел, глубина); циклы безопасны"""
+        with self._lock:
+            start = self._ids.get(uri)
+            if start is None:
+                return []
+            offsets, targets = self._csr(arc_label)[0 if outgoing else 1]
+
+            seen = {start}
+            result = [(self.nodes[start], 0)]
+            frontier = [start]
+            depth = 0
+            while frontier:
+                depth += 1
+                next_frontier = []
+                for index in frontier:
+                    for neighbour in targets[offsets[index]:offsets[index + 1]].tolist():
+                        if neighbour not in seen:
+                            seen.add(neighbour)
+                            next_frontier.append(neighbour)
+                            result.append((self.nodes[neighbour], depth))
+                frontier = next_frontier
+            return result
+
+
+def _detached(node: TNode) -> TNode:
+    # копия живет долго: свойства копируются из объекта драйвера (PropertyView держит его
+    # вместе со всем результатом запроса), дуги хранятся в _Adjacency
+    return replace(node, props=dict(node.props), arcs=None)
+
+
+def load_snapshot(graph_repository: GraphRepository) -> OntologySnapshot:
+    # версия до чтения: записи во время чтения сдвинут ее, и копия перечитается при следующей сверке
+    version = graph_repository.get_version()
+    # один проход по графу; дуги добавляются после всех узлов, т.к. их концы могут прийти позже
+    nodes = []
+    arcs = []
+    for node in graph_repository.iter_all_nodes_and_arcs(settings.NEO4J_EXPORT_PAGE_SIZE,
+                                                          settings.NEO4J_EXPORT_FETCH_SIZE):
+        arcs.extend(node.arcs)
+        nodes.append(node)
+    return OntologySnapshot(nodes, arcs, version)
+
+
+######################################
+#   Process-wide snapshot            #
+######################################
+class OntologySnapshotManager:
+    def __init__(self, check_interval: float = 30, max_age: float = 3600):
+        self.check_interval = check_interval
+        self.max_age = max_age
+        self.repository = OntologyRepository(
+            uri=settings.NEO4J_URI,
+            user=settings.NEO4J_USER,
+            password=settings.NEO4J_PASSWORD,
+            database=settings.NEO4J_DATABASE,
+            driver=get_shared_driver(),
+            track_version=settings.ONTOLOGY_TRACK_VERSION
+        )
+        self._snapshot: Optional[OntologySnapshot] = None
+        self._loaded_at = 0.0
+        self._checked_at = 0.0
+        self._lock = threading.Lock()
+        GraphRepository.add_change_listener(self.on_change)
+
+    def get(self) -> OntologySnapshot:
+        with self._lock:
+            now = time.monotonic()
+            snapshot = self._snapshot
+            if snapshot is None or snapshot.stale or now - self._loaded_at > self.max_age:
+                self._reload(now)
+            elif now - self._checked_at > self.check_interval:
+                self._checked_at = now
+                if snapshot.version != self.repository.graph_repository.get_version():
+                    logger.info("Ontology snapshot is out of date, reloading")
+                    self._reload(now)
+            return self._snapshot
+
+    def on_change(self, database: str, event: str, payload: Any, version: Optional[int] = None):
+        snapshot = self._snapshot
+        if snapshot is not None and database == self.repository.graph_repository.database:
+            snapshot.apply(event, payload, version)
+
+    def close(self):
+        GraphRepository.remove_change_listener(self.on_change)
+
+    def _reload(self, now: float):
+        started = time.monotonic()
+        self._snapshot = load_snapshot(self.repository.graph_repository)
+        self._loaded_at = self._checked_at = now
+        logger.info("Ontology snapshot loaded: %s nodes in %.2fs",
+                    len(self._snapshot.nodes), time.monotonic() - started)
+
+    ######################################
+    #   Ontology-level queries           #
+    ######################################
+    def get_ancestors(self, uri: str) -> List[Dict[str, Any]]:
+        return self._entities(self.get().ancestors(uri, SUB_CLASS))
+
+    def get_descendants(self, uri: str) -> List[Dict[str, Any]]:
+        return self._entities(self.get().descendants(uri, SUB_CLASS))
+
+    def get_root_classes(self) -> List[Dict[str, Any]]:
+        return self._entities(self.get().roots([CLASS], SUB_CLASS))
+
+    def collect_signature(self, uri: str) -> Dict[str, Any]:
+        # как OntologyRepository.collect_signature
+        nodes = self.get().inherited(uri, SUB_CLASS, PROPERTY_DOMAIN, [PROPERTY_LABEL, PROPERTY_LABEL_OBJECT])
+        properties = [self.repository._collect_from_node(node) for node in nodes]
+        signature = ClassSignature(
+            uri,
+            [prop for prop in properties if type(prop) is DatatypeProperty],
+            [prop for prop in properties if type(prop) is ObjectProperty]
+        )
+        return signature.to_dict()
+
+    def _entities(self, nodes: List[TNode]) -> List[Dict[str, Any]]:
+        entities = [self.repository._collect_from_node(node) for node in nodes]
+        return [entity.to_dict() for entity in entities if entity is not None]
+
+
+_manager: Optional[OntologySnapshotManager] = None
+_manager_lock = threading.Lock()
+
+
+def get_ontology_snapshot() -> OntologySnapshotManager:
+    global _manager
+
+    if _manager is None:
+        with _manager_lock:
+            if _manager is None:
+                _manager = OntologySnapshotManager(settings.ONTOLOGY_SNAPSHOT_CHECK_INTERVAL,
+                                                   settings.ONTOLOGY_SNAPSHOT_MAX_AGE)
+    return _manager
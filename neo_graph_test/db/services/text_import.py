@@ -0,0 +1,187 @@
+from typing import Any, Dict, Iterable, List, Optional, Set, Tuple, Union
+import json
+import logging
+import numpy as np
+from django.conf import settings
+from django.db import connection, transaction
+from db.models import Corpus, Text
+from db.services.embedding_service import EmbeddingService, CHUNKER_VERSION
+from db.services import embedding_jobs, vector_index
+
+# Массовая загрузка текстов из JSON Lines (одна запись - одна строка):
+#   {"title": "...", "description": "...", "content": "...", "corpus_id": 1, "has_translation": 10}
+# Записи читаются потоком и обрабатываются пачками по batch_size:
+# ссылки на корпуса и переводы проверяются по множествам id (запрос на пачку, а не на запись),
+# чанки всей пачки кодируются вместе, отсортированные по длине,
+# пачка пишется bulk_create в одной транзакции (если она не прошла - по одной записи
+# в точках сохранения). Ошибочные записи пропускаются и попадают в отчет с номером строки.
+
+logger = logging.getLogger(__name__)
+
+TITLE_MAX_LENGTH = Text._meta.get_field('title').max_length
+
+
+def import_texts(lines: Iterable[Union[str, bytes]], batch_size: Optional[int] = None,
+                 embed: bool = True) -> Dict[str, Any]:
+    """
+    embed=False - тексты сохраняются со статусом pending, эмбеддинги посчитают фоновые задачи.
+    Returns:
+        Dict: {'created': int, 'failed': int, 'errors': [{'line': int, 'error': str}]}
+    """
+    batch_size = batch_size or settings.TEXT_IMPORT_BATCH_SIZE
+    report = {'created': 0, 'failed': 0, 'errors': []}
+    corpus_ids = set(Corpus.objects.values_list('id', flat=True))
+
+    batch = []
+    for line_number, line in enumerate(lines, 1):
+        if isinstance(line, bytes):
+            line = line.decode('utf-8')
+        if not line.strip():
+            continue
+
+        try:
+            batch.append((line_number, _parse_record(line, corpus_ids)))
+        except ValueError as e:
+            _fail(report, line_number, str(e))
+            continue
+
+        if len(batch) >= batch_size:
+            _import_batch(batch, embed, report)
+            batch = []
+
+    if batch:
+        _import_batch(batch, embed, report)
+
+    return report
+
+
+def _parse_record(line: str, corpus_ids: Set[int]) -> Dict[str, Any]:
+    try:
+        data = json.loads(line)
+    except json.JSONDecodeError as e:
+        raise ValueError(f"Invalid JSON: {e}")
+    if not isinstance(data, dict):
+        raise ValueError("Record must be a JSON object")
+
+    if not data.get('title'):
+        raise ValueError("Title is required")
+    for field in ('title', 'description', 'content'):
+        if not isinstance(data.get(field, ''), str):
+            raise ValueError(f"{field} must be a string")
+    if len(data['title']) > TITLE_MAX_LENGTH:
+        raise ValueError(f"Title is longer than {TITLE_MAX_LENGTH} characters")
+
+    if not data.get('corpus_id'):
+        raise ValueError("Corpus ID is required")
+    if not _is_id(data['corpus_id']) or data['corpus_id'] not in corpus_ids:
+        raise ValueError(f"Corpus not found: {data['corpus_id']}")
+
+    translation_id = data.get('has_translation')
+    if translation_id is not None and not _is_id(translation_id):
+        raise ValueError("has_translation must be a text ID")
+
+    return {
+        'title': data['title'],
+        'description': data.get('description', ''),
+        'content': data.get('content', ''),
+        'corpus_id': data['corpus_id'],
+        'has_translation_id': translation_id,
+    }
+
+
+def _is_id(value: Any) -> bool:
+    # bool - подкласс int, но true/false не id
+    return isinstance(value, int) and not isinstance(value, bool)
+
+
+def _import_batch(batch: List[Tuple[int, Dict[str, Any]]], embed: bool, report: Dict[str, Any]):
+    references = {data['has_translation_id'] for _, data in batch if data['has_translation_id'] is not None}
+    existing = set(Text.objects.filter(id__in=references).values_list('id', flat=True)) if references else set()
+
+    lines = []
+    texts = []
+    for line_number, data in batch:
+        if data['has_translation_id'] is not None and data['has_translation_id'] not in existing:
+            _fail(report, line_number, f"Translation text not found: {data['has_translation_id']}")
+            continue
+        lines.append(line_number)
+        texts.append(Text(**data))
+
+    if not texts:
+        return
+
+    if embed:
+        try:
+            _embed_all(texts)
+        except Exception as e:
+            logger.exception("Failed to encode import batch (lines %s-%s)", lines[0], lines[-1])
+            for line_number in lines:
+                _fail(report, line_number, f"Embedding failed: {e}")
+            return
+    else:
+        for text in texts:
+            text.embedding_status = Text.EMBEDDING_PENDING
+
+    try:
+        with transaction.atomic():
+            if connection.features.can_return_rows_from_bulk_insert:
+                Text.objects.bulk_create(texts)
+            else:
+                # без RETURNING bulk_create не проставит id, а они нужны индексу и очереди
+                for text in texts:
+                    text.save(force_insert=True)
+    except Exception:
+        # одна плохая запись не должна отменять всю пачку: повторяем по одной, каждую в своей точке сохранения
+        logger.warning("Failed to write import batch (lines %s-%s), retrying records one by one",
+                       lines[0], lines[-1], exc_info=True)
+        texts = _write_one_by_one(lines, texts, report)
+
+    report['created'] += len(texts)
+    if embed:
+        for text in texts:
+            vector_index.index_text(text)
+    elif texts:
+        embedding_jobs.enqueue_many([text.id for text in texts])
+
+
+def _write_one_by_one(lines: List[int], texts: List[Text], report: Dict[str, Any]) -> List[Text]:
+    written = []
+    for line_number, text in zip(lines, texts):
+        # id мог остаться от откаченной вставки
+        text.pk = None
+        text._state.adding = True
+        try:
+            with transaction.atomic():
+                text.save(force_insert=True)
+        except Exception as e:
+            _fail(report, line_number, f"Database error: {e}")
+            continue
+        written.append(text)
+    return written
+
+
+def _embed_all(texts: List[Text]):
+    service = EmbeddingService()
+    chunks_by_text = [service.get_chunks(text.content or '') for text in texts]
+    chunks = [chunk for text_chunks in chunks_by_text for chunk in text_chunks]
+
+    # близкие по длине чанки в одном батче модели - меньше паддинга
+    order = sorted(range(len(chunks)), key=lambda i: len(chunks[i]))
+    encoded = service.get_embeddings([chunks[i] for i in order], batch_size=settings.TEXT_IMPORT_ENCODE_BATCH_SIZE)
+    embeddings = np.empty_like(encoded)
+    embeddings[order] = encoded
+
+    start = 0
+    for text, text_chunks in zip(texts, chunks_by_text):
+        vectors = embeddings[start:start + len(text_chunks)]
+        start += len(text_chunks)
+        text.set_embeddings_array(vectors)
+        text.set_centroid(service.centroid(vectors) if len(vectors) else None)
+        text.chunker_version = CHUNKER_VERSION
+        text.embedding_status = Text.EMBEDDING_READY
+        text.embedding_error = ''
+
+
+def _fail(report: Dict[str, Any], line_number: int, error: str):
+    report['failed'] += 1
+    report['errors'].append({'line': line_number, 'error': error})
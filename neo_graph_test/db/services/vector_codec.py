@@ -0,0 +1,43 @@
+from typing import Optional, Union
+import struct
+import numpy as np
+
+# Компактный формат хранения матрицы эмбеддингов (по строке на чанк):
+#   b"EMB1" | код типа (b"f" float32, b"e" float16) | 3 байта выравнивания | rows:uint32 | dim:uint32 | данные
+# Заголовок 16 байт, поэтому данные выровнены и читаются через np.frombuffer без копирования.
+
+MAGIC = b"EMB1"
+HEADER = struct.Struct("<4sc3xII")
+
+DTYPES = {
+    b"f": np.dtype("<f4"),
+    b"e": np.dtype("<f2"),
+}
+CODES = {dtype: code for code, dtype in DTYPES.items()}
+
+
+def encode_vectors(vectors, dtype: Union[str, np.dtype] = "float32") -> bytes:
+    dtype = np.dtype(dtype).newbyteorder("<")
+    if dtype not in CODES:
+        raise ValueError(f"Unsupported embedding dtype: {dtype}")
+
+    matrix = np.asarray(vectors, dtype=dtype)
+    if matrix.size == 0:
+        matrix = matrix.reshape(0, matrix.shape[-1] if matrix.ndim == 2 else 0)
+    if matrix.ndim != 2:
+        raise ValueError(f"Expected a 2-d matrix of embeddings, got shape {matrix.shape}")
+
+    rows, dim = matrix.shape
+    return HEADER.pack(MAGIC, CODES[dtype], rows, dim) + np.ascontiguousarray(matrix).tobytes()
+
+
+def decode_vectors(blob: Optional[Union[bytes, memoryview]]) -> np.ndarray:
+    """Матрица rows x dim поверх буфера blob (без копирования, только для чтения)"""
+    if blob is None or len(blob) == 0:
+        return np.empty((0, 0), dtype=np.float32)
+
+    magic, code, rows, dim = HEADER.unpack_from(blob)
+    if magic != MAGIC or code not in DTYPES:
+        raise ValueError("Unknown embeddings format")
+
+    return np.frombuffer(blob, dtype=DTYPES[code], count=rows * dim, offset=HEADER.size).reshape(rows, dim)
@@ -0,0 +1,430 @@
+from typing import List, Optional, Tuple, Iterable
+import logging
+import os
+import threading
+import time
+from datetime import datetime, timedelta
+import numpy as np
+from django.conf import settings
+from django.db.models import Max
+from db.models import Text, TextDeletion
+from db.services.vector_codec import decode_vectors
+from db.services.ann_index import IVFIndex, resolve_version
+
+# Точный поиск ближайших чанков по косинусной близости.
+# Все эмбеддинги чанков лежат в одной матрице float32 (строки нормированы),
+# поиск - одно умножение матрицы на вектор запроса и argpartition для top-k.
+# Индекс обновляется инкрементально: новые строки дописываются в конец
+# (емкость удваивается), удаленные помечаются и вычищаются при уплотнении.
+
+logger = logging.getLogger(__name__)
+
+
+class ChunkVectorIndex:
+    # доля удаленных строк, после которой матрица уплотняется
+    COMPACT_RATIO = 0.25
+
+    def __init__(self, dim: Optional[int] = None, capacity: int = 1024):
+        self.dim = dim
+        self._lock = threading.Lock()
+        self._size = 0
+        self._deleted = 0
+        self._rows_by_text = {}
+        self._allocate(capacity, dim or 0)
+
+    def __len__(self):
+        return self._size - self._deleted
+
+    def add_text(self, text_id: int, corpus_id: int, vectors: np.ndarray):
+        vectors = np.asarray(vectors, dtype=np.float32)
+
+        with self._lock:
+            self._remove_rows(text_id)
+            if vectors.ndim != 2 or len(vectors) == 0:
+                return
+
+            if self.dim is None:
+                self.dim = vectors.shape[1]
+                self._allocate(len(self._alive), self.dim)
+            if vectors.shape[1] != self.dim:
+                raise ValueError(f"Expected {self.dim}-dimensional embeddings, got {vectors.shape[1]}")
+
+            count = len(vectors)
+            self._reserve(self._size + count)
+            rows = np.arange(self._size, self._size + count)
+
+            self._vectors[rows] = self._normalize(vectors)
+            self._text_ids[rows] = text_id
+            self._chunk_ids[rows] = np.arange(count)
+            self._corpus_ids[rows] = corpus_id
+            self._alive[rows] = True
+
+            self._rows_by_text[text_id] = rows
+            self._size += count
+
+    def remove_text(self, text_id: int):
+        with self._lock:
+            self._remove_rows(text_id)
+
+    def remove_corpus(self, corpus_id: int):
+        with self._lock:
+            text_ids = np.unique(self._text_ids[:self._size][self._corpus_ids[:self._size] == corpus_id])
+            for text_id in text_ids.tolist():
+                self._remove_rows(text_id)
+
+    def search(self, query: np.ndarray, k: int = 10,
+               corpus_ids: Optional[Iterable[int]] = None) -> List[Tuple[int, int, float]]:
+        """
+        Returns:
+            List[Tuple[int, int, float]]: (id текста, номер чанка, косинусная близость) по убыванию близости
+        """
+        scores, text_ids, chunk_ids = self._score(query, corpus_ids)
+        if len(scores) == 0 or k <= 0:
+            return []
+
+        top = self._top_k(scores, k)
+        return [(int(text_ids[i]), int(chunk_ids[i]), float(scores[i])) for i in top]
+
+    def search_texts(self, query: np.ndarray, k: int = 10,
+                     corpus_ids: Optional[Iterable[int]] = None) -> List[Tuple[int, int, float]]:
+        """Как search, но не больше одного (лучшего) чанка на текст"""
+        scores, text_ids, chunk_ids = self._score(query, corpus_ids)
+        if len(scores) == 0 or k <= 0:
+            return []
+
+        # лучший чанк текста всегда встречается раньше остальных его чанков,
+        # поэтому расширяем окно top-m, пока в нем не наберется k разных текстов
+        window = min(len(scores), k * 4)
+        while True:
+            top = self._top_k(scores, window)
+            results = []
+            seen = set()
+            for i in top:
+                text_id = int(text_ids[i])
+                if text_id not in seen:
+                    seen.add(text_id)
+                    results.append((text_id, int(chunk_ids[i]), float(scores[i])))
+                    if len(results) == k:
+                        return results
+            if window == len(scores):
+                return results
+            window = min(len(scores), window * 4)
+
+    def _score(self, query: np.ndarray, corpus_ids: Optional[Iterable[int]]):
+        with self._lock:
+            size = self._size
+            vectors = self._vectors[:size]
+            alive = self._alive[:size]
+            text_ids = self._text_ids[:size]
+            chunk_ids = self._chunk_ids[:size]
+            row_corpus_ids = self._corpus_ids[:size]
+
+        empty = np.empty(0, dtype=np.float32)
+        if size == 0:
+            return empty, text_ids, chunk_ids
+
+        mask = alive.copy()
+        if corpus_ids is not None:
+            mask &= np.isin(row_corpus_ids, np.fromiter(corpus_ids, dtype=np.int64))
+
+        rows = np.flatnonzero(mask)
+        if len(rows) == 0:
+            return empty, text_ids[rows], chunk_ids[rows]
+
+        query = self._normalize(np.asarray(query, dtype=np.float32).reshape(1, -1))[0]
+        if len(rows) == size:
+            scores = vectors @ query
+            return scores, text_ids, chunk_ids
+        return vectors[rows] @ query, text_ids[rows], chunk_ids[rows]
+
+    @staticmethod
+    def _top_k(scores: np.ndarray, k: int) -> np.ndarray:
+        k = min(k, len(scores))
+        if k < len(scores):
+            top = np.argpartition(-scores, k - 1)[:k]
+        else:
+            top = np.arange(len(scores))
+        return top[np.argsort(-scores[top], kind="stable")]
+
+    @staticmethod
+    def _normalize(vectors: np.ndarray) -> np.ndarray:
+        norms = np.linalg.norm(vectors, axis=1, keepdims=True)
+        norms[norms == 0] = 1
+        return vectors / norms
+
+    def _remove_rows(self, text_id: int):
+        rows = self._rows_by_text.pop(text_id, None)
+        if rows is None:
+            return
+
+        self._alive[rows] = False
+        self._deleted += len(rows)
+        if self._deleted > self.COMPACT_RATIO * self._size:
+            self._compact()
+
+    def _compact(self):
+        keep = np.flatnonzero(self._alive[:self._size])
+        capacity = max(1024, len(keep) * 2)
+
+        vectors, text_ids, chunk_ids, corpus_ids = (
+            self._vectors[keep], self._text_ids[keep], self._chunk_ids[keep], self._corpus_ids[keep])
+        self._allocate(capacity, self.dim or 0)
+
+        count = len(keep)
+        self._vectors[:count] = vectors
+        self._text_ids[:count] = text_ids
+        self._chunk_ids[:count] = chunk_ids
+        self._corpus_ids[:count] = corpus_ids
+        self._alive[:count] = True
+        self._size = count
+        self._deleted = 0
+
+        self._rows_by_text = {}
+        if count:
+            starts = np.flatnonzero(np.r_[True, text_ids[1:] != text_ids[:-1]])
+            ends = np.r_[starts[1:], count]
+            for start, end in zip(starts.tolist(), ends.tolist()):
+                self._rows_by_text[int(text_ids[start])] = np.arange(start, end)
+
+    def _reserve(self, size: int):
+        capacity = len(self._alive)
+        if size <= capacity:
+            return
+
+        while capacity < size:
+            capacity *= 2
+
+        # новые массивы, а не resize на месте: параллельный поиск держит ссылки на старые
+        def grow(array, shape):
+            grown = np.zeros(shape, dtype=array.dtype)
+            grown[:self._size] = array[:self._size]
+            return grown
+
+        self._vectors = grow(self._vectors, (capacity, self.dim))
+        self._text_ids = grow(self._text_ids, capacity)
+        self._chunk_ids = grow(self._chunk_ids, capacity)
+        self._corpus_ids = grow(self._corpus_ids, capacity)
+        self._alive = grow(self._alive, capacity)
+
+    def _allocate(self, capacity: int, dim: int):
+        capacity = max(capacity, 1)
+        self._vectors = np.zeros((capacity, dim), dtype=np.float32)
+        self._text_ids = np.zeros(capacity, dtype=np.int64)
+        self._chunk_ids = np.zeros(capacity, dtype=np.int32)
+        self._corpus_ids = np.zeros(capacity, dtype=np.int64)
+        self._alive = np.zeros(capacity, dtype=bool)
+
+
+######################################
+#   Process-wide index and hooks     #
+######################################
+_index: Optional[ChunkVectorIndex] = None
+_index_lock = threading.Lock()
+# версия БД, с которой индекс сверен (_db_version), и когда сверялись (time.monotonic)
+_synced_version: Optional[Tuple[Optional[datetime], Optional[datetime]]] = None
+_checked_at = 0.0
+
+
+def get_vector_index() -> ChunkVectorIndex:
+    """
+    Индекс процесса. Хуки ниже видят только записи этого процесса, поэтому не чаще
+    VECTOR_INDEX_CHECK_INTERVAL индекс сверяется с версией БД и дочитывает чужие изменения.
+    """
+    global _index, _synced_version, _checked_at
+
+    if _index is None:
+        with _index_lock:
+            if _index is None:
+                # версия до чтения: записанное во время построения дочитается при следующей сверке
+                version = _db_version()
+                _index = build_vector_index()
+                _synced_version = version
+                _checked_at = time.monotonic()
+        return _index
+
+    if time.monotonic() - _checked_at >= settings.VECTOR_INDEX_CHECK_INTERVAL:
+        with _index_lock:
+            if time.monotonic() - _checked_at >= settings.VECTOR_INDEX_CHECK_INTERVAL:
+                try:
+                    _sync_vector_index()
+                except Exception:
+                    logger.exception("Failed to sync vector index with the database")
+                _checked_at = time.monotonic()
+    return _index
+
+
+def build_vector_index() -> ChunkVectorIndex:
+    index = ChunkVectorIndex()
+    for text_id, corpus_id, vectors in _iter_text_vectors():
+        index.add_text(text_id, corpus_id, vectors)
+    return index
+
+
+def _db_version() -> Tuple[Optional[datetime], Optional[datetime]]:
+    # (последнее изменение эмбеддингов, последнее удаление): оба - Max по индексированной колонке
+    updated = Text.objects.aggregate(updated=Max('embedding_updated_at'))['updated']
+    deleted = TextDeletion.objects.aggregate(deleted=Max('created_at'))['deleted']
+    return updated, deleted
+
+
+def _sync_vector_index():
+    global _synced_version
+
+    version = _db_version()
+    if version == _synced_version:
+        return
+
+    # запас на расхождение часов процессов и транзакции, зафиксированные позже своей метки;
+    # повторное применение изменения безвредно
+    margin = timedelta(seconds=settings.VECTOR_INDEX_SYNC_MARGIN)
+    updated, deleted = _synced_version
+
+    if version[0] is not None and version[0] != updated:
+        rows = Text.objects.values_list('id', 'corpus_id', 'embedding_status', 'embeddings')
+        if updated is not None:
+            rows = rows.filter(embedding_updated_at__gte=updated - margin)
+        else:
+            rows = rows.exclude(embedding_updated_at=None)
+
+        for text_id, corpus_id, status, embeddings in rows.iterator():
+            if status == Text.EMBEDDING_READY and embeddings is not None:
+                _index.add_text(text_id, corpus_id, decode_vectors(embeddings))
+            else:
+                _index.remove_text(text_id)
+
+    if version[1] is not None and version[1] != deleted:
+        deletions = TextDeletion.objects.values_list('text_id', 'corpus_id')
+        if deleted is not None:
+            deletions = deletions.filter(created_at__gte=deleted - margin)
+        for text_id, corpus_id in deletions.iterator():
+            if text_id is not None:
+                _index.remove_text(text_id)
+            else:
+                _index.remove_corpus(corpus_id)
+
+    _synced_version = version
+
+
+def _iter_text_vectors():
+    rows = (Text.objects
+            .filter(embedding_status=Text.EMBEDDING_READY)
+            .exclude(embeddings=None)
+            .values_list('id', 'corpus_id', 'embeddings'))
+
+    for text_id, corpus_id, embeddings in rows.iterator():
+        vectors = decode_vectors(embeddings)
+        if len(vectors):
+            yield text_id, corpus_id, vectors
+
+
+# Хуки вызываются репозиториями после записи. Если индекс еще не построен,
+# делать ничего не нужно: он будет прочитан из БД целиком при первом поиске.
+def index_text(text: Text):
+    if _index is None:
+        return
+    try:
+        if text.embedding_status == Text.EMBEDDING_READY:
+            _index.add_text(text.id, text.corpus_id, text.get_embeddings_array())
+        else:
+            _index.remove_text(text.id)
+    except Exception:
+        logger.exception("Failed to update vector index for text %s", text.id)
+
+
+def unindex_text(text_id: int):
+    # запись об удалении нужна и без своего индекса: по ней индексы других процессов уберут текст
+    _record_deletion(text_id=text_id)
+    if _index is not None:
+        _index.remove_text(text_id)
+
+
+def unindex_corpus(corpus_id: int):
+    _record_deletion(corpus_id=corpus_id)
+    if _index is not None:
+        _index.remove_corpus(corpus_id)
+
+
+def _record_deletion(**deletion):
+    try:
+        TextDeletion.objects.create(**deletion)
+    except Exception:
+        logger.exception("Failed to record deletion %s for vector index sync", deletion)
+
+
+######################################
+#   Approximate (IVF) chunk index    #
+######################################
+# Строится офлайн (python manage.py build_ann_index) и читается с диска через memory map.
+# id вектора в IVFIndex - номер строки в chunks.npy: (id текста, номер чанка, id корпуса).
+_ann_index: Optional[Tuple[str, IVFIndex, np.ndarray]] = None
+_ann_index_lock = threading.Lock()
+
+
+def build_ann_index(path: str, n_lists: int, n_probe: int, **train_options) -> IVFIndex:
+    blocks = []
+    chunks = []
+    for text_id, corpus_id, vectors in _iter_text_vectors():
+        blocks.append(np.asarray(vectors, dtype=np.float32))
+        chunks.append(np.stack([
+            np.full(len(vectors), text_id),
+            np.arange(len(vectors)),
+            np.full(len(vectors), corpus_id),
+        ], axis=1))
+
+    if not blocks:
+        raise ValueError("There are no text embeddings to index")
+
+    index = IVFIndex(n_lists, n_probe)
+    index.build(np.concatenate(blocks), **train_options)
+    index.save(path, chunks=np.concatenate(chunks).astype(np.int64))
+
+    reset_ann_index()
+    return index
+
+
+def get_ann_index() -> Optional[Tuple[IVFIndex, np.ndarray]]:
+    """
+    Индекс из ANN_INDEX_DIR. build_ann_index обычно запускается в другом процессе,
+    поэтому при каждом вызове проверяется, не опубликована ли новая версия каталога.
+    """
+    global _ann_index
+
+    version = resolve_version(settings.ANN_INDEX_DIR)
+    if not os.path.exists(os.path.join(version, "meta.json")):
+        return None
+
+    loaded = _ann_index
+    if loaded is None or loaded[0] != version:
+        with _ann_index_lock:
+            if _ann_index is None or _ann_index[0] != version:
+                chunks = np.load(os.path.join(version, "chunks.npy"), mmap_mode="r")
+                _ann_index = (version, IVFIndex.load(version), chunks)
+            loaded = _ann_index
+    return loaded[1], loaded[2]
+
+
+def reset_ann_index():
+    global _ann_index
+    with _ann_index_lock:
+        _ann_index = None
+
+
+def search_approximate(query: np.ndarray, k: int = 10, corpus_ids: Optional[Iterable[int]] = None,
+                       n_probe: Optional[int] = None) -> List[Tuple[int, int, float]]:
+    loaded = get_ann_index()
+    if loaded is None:
+        raise ValueError("Approximate index is not built, run: python manage.py build_ann_index")
+    index, chunks = loaded
+
+    allowed = None if corpus_ids is None else np.fromiter(corpus_ids, dtype=np.int64)
+    # фильтр по корпусу применяется после поиска, поэтому кандидатов берем с запасом
+    fetch = k if allowed is None else k * 4
+    while True:
+        ids, scores = index.search(query, fetch, n_probe)
+        rows = chunks[ids]
+        keep = np.ones(len(ids), dtype=bool) if allowed is None else np.isin(rows[:, 2], allowed)
+        if keep.sum() >= k or len(ids) < fetch:
+            break
+        fetch *= 4
+
+    return [(int(row[0]), int(row[1]), float(score)) for row, score in zip(rows[keep][:k], scores[keep][:k])]
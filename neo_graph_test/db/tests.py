@@ -1,3 +1,778 @@
-from django.test import TestCase
+import json
+import os
+import tempfile
+import time
+import uuid
+from unittest import mock
+import numpy as np
+from django.db import DatabaseError
+from django.test import SimpleTestCase, TestCase
+from db.models import Corpus, Text, EmbeddingJob, TextDeletion
+from db.repositories.TextRepository import TextRepository
+from db.services import embedding_jobs, vector_index
+from db.services.text_import import import_texts, TITLE_MAX_LENGTH
+from db.services.ontology_cache import CachedOntologyService, DjangoCacheStore, LocalCacheStore
+from db.services.ontology_snapshot import OntologySnapshot
+from db.services.ann_index import IVFIndex, exact_search, resolve_version
+from db.services.duplicate_service import find_similar_pairs
+from db.services.vector_index import ChunkVectorIndex
+from db.services.alignment_service import AlignmentService, MOVES
+from db.services.embedding_service import EmbeddingService, CHUNKER_VERSION
+from db.services.vector_codec import encode_vectors, decode_vectors
+from db.repositories.ontology_driver.driver import OntologyRepository
+from db.repositories.ontology_driver.python_driver.driver import GraphRepository, VERSION_LABEL, VERSION_ID
+from db.repositories.ontology_driver.python_driver.entities import TNode, TArc
+from db.repositories.ontology_driver.onthology_namespace import (
+    CLASS, OBJECT, SUB_CLASS, HAS_TYPE, PROPERTY_DOMAIN, PROPERTY_LABEL
+)
 
-# Create your tests here.
+
+def _normalize(vectors: np.ndarray) -> np.ndarray:
+    return vectors / np.linalg.norm(vectors, axis=1, keepdims=True)
+
+
+def _clustered(rng: np.random.Generator, clusters: int, per_cluster: int, dim: int) -> np.ndarray:
+    centers = rng.normal(size=(clusters, dim))
+    points = np.repeat(centers, per_cluster, axis=0) + 0.1 * rng.normal(size=(clusters * per_cluster, dim))
+    return _normalize(points).astype(np.float32)
+
+
+class IVFIndexTest(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.vectors = _clustered(rng, 16, 100, 32)
+        self.queries = self.vectors[rng.choice(len(self.vectors), 20, replace=False)] + 0.05 * rng.normal(size=(20, 32))
+        self.index = IVFIndex(n_lists=16, n_probe=4)
+        self.index.build(self.vectors, ids=np.arange(len(self.vectors)) + 1000)
+
+    def test_all_lists_match_exact_search(self):
+        for query in self.queries:
+            ids, scores = self.index.search(query, k=10, n_probe=16)
+            exact_ids, exact_scores = exact_search(self.vectors, query, k=10)
+            self.assertEqual(set(ids.tolist()), set((exact_ids + 1000).tolist()))
+            np.testing.assert_allclose(scores, exact_scores, rtol=1e-5)
+
+    def test_recall_with_few_probes(self):
+        found = 0
+        for query in self.queries:
+            ids, _ = self.index.search(query, k=10)
+            exact_ids, _ = exact_search(self.vectors, query, k=10)
+            found += len(set(ids.tolist()) & set((exact_ids + 1000).tolist()))
+        self.assertGreaterEqual(found / (10 * len(self.queries)), 0.9)
+
+    def test_save_publishes_new_version(self):
+        with tempfile.TemporaryDirectory() as directory:
+            path = os.path.join(directory, "ann")
+            self.index.save(path, chunks=np.arange(3))
+            first = resolve_version(path)
+            loaded = IVFIndex.load(path)
+            self.index.save(path)
+
+            self.assertNotEqual(resolve_version(path), first)
+            # открытая версия остается на месте, пока ее не вытеснит следующая
+            self.assertTrue(os.path.exists(os.path.join(first, "meta.json")))
+            np.testing.assert_array_equal(loaded.ids, self.index.ids)
+            np.testing.assert_array_equal(IVFIndex.load(path).vectors, self.index.vectors)
+
+
+def _fake_embed(text: Text):
+    # вместо модели: один вектор, по которому видно, из какого содержимого он посчитан
+    text.set_embeddings_array([[len(text.content), 1.0]])
+    text.set_centroid(None)
+    text.chunker_version = 1
+    text.embedding_status = Text.EMBEDDING_READY
+    text.embedding_error = ''
+
+
+@mock.patch.object(TextRepository, '_embed', side_effect=_fake_embed)
+class EmbeddingJobsTest(TestCase):
+    def setUp(self):
+        corpus = Corpus.objects.create(name="corpus", description="", genre="news")
+        self.text = Text.objects.create(title="text", description="", content="one", corpus=corpus)
+
+    def _edit(self, content: str) -> EmbeddingJob:
+        Text.objects.filter(id=self.text.id).update(content=content)
+        return embedding_jobs.enqueue(self.text)
+
+    def _stored(self) -> Text:
+        return Text.objects.get(id=self.text.id)
+
+    def test_job_saves_embeddings(self, embed):
+        job = embedding_jobs.enqueue(self.text)
+        self.assertEqual(self._stored().embedding_status, Text.EMBEDDING_PENDING)
+
+        self.assertEqual(embedding_jobs.run_pending_jobs(), 1)
+        text = self._stored()
+        self.assertEqual(text.embedding_status, Text.EMBEDDING_READY)
+        self.assertEqual(text.get_embeddings_array()[0, 0], 3)
+        self.assertEqual(EmbeddingJob.objects.get(id=job.id).status, EmbeddingJob.DONE)
+
+    def test_enqueue_supersedes_pending_job(self, embed):
+        first = embedding_jobs.enqueue(self.text)
+        embedding_jobs.enqueue(self.text)
+        self.assertEqual(EmbeddingJob.objects.get(id=first.id).error, 'superseded')
+        self.assertEqual(embedding_jobs.run_pending_jobs(), 1)
+
+    def test_running_job_does_not_overwrite_newer_content(self, embed):
+        self._edit("old content")
+        old_job = embedding_jobs.claim_next_job()
+        # текст изменили, пока старая задача считалась, и новая задача успела закончиться первой
+        new_job = self._edit("new")
+        self.assertEqual(embedding_jobs.run_pending_jobs(), 1)
+        embedding_jobs.run_job(old_job)
+
+        text = self._stored()
+        self.assertEqual(text.embedding_status, Text.EMBEDDING_READY)
+        self.assertEqual(text.get_embeddings_array()[0, 0], 3)
+        self.assertEqual(EmbeddingJob.objects.get(id=old_job.id).error, 'superseded')
+        self.assertEqual(EmbeddingJob.objects.get(id=new_job.id).error, '')
+
+    def test_running_job_keeps_newer_pending_status(self, embed):
+        self._edit("old content")
+        old_job = embedding_jobs.claim_next_job()
+        self._edit("new")
+        embedding_jobs.run_job(old_job)
+
+        self.assertEqual(self._stored().embedding_status, Text.EMBEDDING_PENDING)
+        self.assertEqual(embedding_jobs.run_pending_jobs(), 1)
+        self.assertEqual(self._stored().get_embeddings_array()[0, 0], 3)
+
+    def test_content_changed_without_new_job(self, embed):
+        def edit_while_embedding(text):
+            Text.objects.filter(id=text.id).update(content="changed")
+            _fake_embed(text)
+
+        embed.side_effect = edit_while_embedding
+        job = embedding_jobs.enqueue(self.text)
+        embedding_jobs.run_pending_jobs()
+        self.assertEqual(EmbeddingJob.objects.get(id=job.id).error, 'superseded')
+        self.assertIsNone(self._stored().embeddings)
+
+    def test_enqueue_outdated_skips_queued_texts(self, embed):
+        current = Text.objects.create(title="current", description="", content="two", corpus=self.text.corpus,
+                                      chunker_version=CHUNKER_VERSION)
+        self.assertEqual(embedding_jobs.enqueue_outdated(), 1)
+        # второй запуск, пока очередь не разобрана, задач не добавляет
+        self.assertEqual(embedding_jobs.enqueue_outdated(), 0)
+        self.assertEqual(embedding_jobs.enqueue_outdated(include_all=True), 1)
+        self.assertEqual(set(EmbeddingJob.objects.values_list('text_id', flat=True)), {self.text.id, current.id})
+        self.assertEqual(self._stored().embedding_status, Text.EMBEDDING_READY)
+
+    def test_failed_job_is_retried_then_failed(self, embed):
+        embed.side_effect = RuntimeError("model is unavailable")
+        job = embedding_jobs.enqueue(self.text)
+        with self.settings(EMBEDDING_JOB_MAX_ATTEMPTS=2), self.assertLogs(embedding_jobs.logger, 'ERROR'):
+            embedding_jobs.run_pending_jobs(limit=1)
+            self.assertEqual(EmbeddingJob.objects.get(id=job.id).status, EmbeddingJob.PENDING)
+            self.assertEqual(self._stored().embedding_status, Text.EMBEDDING_PENDING)
+
+            embedding_jobs.run_pending_jobs()
+        self.assertEqual(EmbeddingJob.objects.get(id=job.id).status, EmbeddingJob.FAILED)
+        text = self._stored()
+        self.assertEqual(text.embedding_status, Text.EMBEDDING_FAILED)
+        self.assertEqual(text.embedding_error, "model is unavailable")
+
+
+class _RecordingTx:
+    def __init__(self, value: int):
+        self.value = value
+        self.queries = []
+
+    def run(self, query, **params):
+        self.queries.append((query, params))
+        return mock.Mock(single=lambda: {"version": self.value})
+
+
+class GraphVersionTest(SimpleTestCase):
+    def _repository(self, track_version: bool) -> GraphRepository:
+        return GraphRepository("bolt://localhost", "neo4j", "", driver=mock.MagicMock(), track_version=track_version)
+
+    def test_bump_merges_single_keyed_node(self):
+        tx = _RecordingTx(7)
+        self.assertEqual(self._repository(True)._bump_version(tx), 7)
+        query, params = tx.queries[0]
+        self.assertIn(f"MERGE (v:`{VERSION_LABEL}` {{id: $id}})", query)
+        self.assertNotIn("sum(", query)
+        self.assertEqual(params, {"id": VERSION_ID})
+
+    def test_no_version_writes_without_tracking(self):
+        tx = _RecordingTx(7)
+        self.assertIsNone(self._repository(False)._bump_version(tx))
+        self.assertEqual(tx.queries, [])
+
+    def test_schema_includes_version_constraint(self):
+        repository = self._repository(True)
+        session = repository.driver.session.return_value.__enter__.return_value
+        names = repository.ensure_uri_constraints(["Class"])
+        self.assertEqual(names, ["class_uri_unique", "graphversion_id_unique"])
+        self.assertIn("REQUIRE v.id IS UNIQUE", session.run.call_args_list[-1][0][0])
+
+
+class VectorCodecTest(SimpleTestCase):
+    def test_round_trip(self):
+        vectors = np.random.default_rng(0).normal(size=(5, 8))
+        np.testing.assert_array_equal(decode_vectors(encode_vectors(vectors)), vectors.astype(np.float32))
+        np.testing.assert_array_equal(decode_vectors(encode_vectors(vectors, "float16")), vectors.astype(np.float16))
+
+    def test_empty(self):
+        self.assertEqual(decode_vectors(None).shape, (0, 0))
+        self.assertEqual(decode_vectors(encode_vectors(np.empty((0, 8)))).shape, (0, 8))
+
+    def test_rejects_unknown_format(self):
+        with self.assertRaises(ValueError):
+            decode_vectors(b"\0" * 32)
+        with self.assertRaises(ValueError):
+            encode_vectors(np.zeros((2, 2)), "float64")
+
+
+class IterChunksTest(SimpleTestCase):
+    TEXT = "One two three. Four five! Six seven eight nine ten eleven twelve thirteen. Fourteen? Fifteen sixteen"
+
+    def _chunks(self, source, max_tokens=5, overlap=0):
+        return list(EmbeddingService().iter_chunks(source, max_tokens, overlap, count_tokens=lambda s: len(s.split())))
+
+    def test_chunks_fit_and_keep_every_word(self):
+        chunks = self._chunks(self.TEXT)
+        self.assertTrue(all(len(chunk.split()) <= 5 for chunk in chunks))
+        self.assertEqual(" ".join(chunks).split(), self.TEXT.split())
+        self.assertEqual(chunks[0], "One two three. Four five!")
+
+    def test_streamed_source_gives_same_chunks(self):
+        pieces = [self.TEXT[i:i + 7] for i in range(0, len(self.TEXT), 7)]
+        self.assertEqual(self._chunks(iter(pieces)), self._chunks(self.TEXT))
+
+    def test_overlap_repeats_previous_sentences(self):
+        chunks = self._chunks("A b. C d. E f. G h.", max_tokens=4, overlap=2)
+        self.assertEqual(chunks, ["A b. C d.", "C d. E f.", "E f. G h."])
+
+    def test_overlap_must_be_less_than_max_tokens(self):
+        with self.assertRaises(ValueError):
+            self._chunks(self.TEXT, max_tokens=3, overlap=3)
+
+
+class AlignmentServiceTest(SimpleTestCase):
+    def setUp(self):
+        self.source = _normalize(np.random.default_rng(0).normal(size=(6, 32)))
+        self.service = AlignmentService()
+
+    def test_identical_texts_align_one_to_one(self):
+        beads = self.service.align(self.source, self.source)
+        self.assertEqual([(bead['source'], bead['target']) for bead in beads], [([i], [i]) for i in range(6)])
+
+    def test_merged_chunks_align_two_to_one(self):
+        target = np.vstack([self.source[:2].sum(axis=0), self.source[2:]])
+        beads = self.service.align(self.source, target)
+        self.assertEqual(beads[0]['source'], [0, 1])
+        self.assertEqual(beads[0]['target'], [0])
+        self.assertEqual(len(beads), 5)
+
+    def _gain(self, source: np.ndarray, target: np.ndarray, move: int, i: int, j: int) -> float:
+        # выигрыш шага по определению: склейка - нормированная сумма векторов
+        di, dj = MOVES[move]
+        if not di or not dj:
+            return -self.service.skip_penalty
+        left = _normalize(source[i - di:i].sum(axis=0, keepdims=True))[0]
+        right = _normalize(target[j - dj:j].sum(axis=0, keepdims=True))[0]
+        penalty = self.service.merge_penalty if di + dj > 2 else 0.0
+        return float(left @ right) - self.service.min_similarity - penalty
+
+    def test_matches_plain_dynamic_programming(self):
+        rng = np.random.default_rng(1)
+        source, target = _normalize(rng.normal(size=(7, 16))), _normalize(rng.normal(size=(5, 16)))
+
+        best = np.full((8, 6), -np.inf)
+        best[0, 0] = 0.0
+        for i in range(8):
+            for j in range(6):
+                for k, (di, dj) in enumerate(MOVES):
+                    if i >= di and j >= dj and (di or dj):
+                        best[i, j] = max(best[i, j], best[i - di, j - dj] + self._gain(source, target, k, i, j))
+
+        beads = self.service.align(source, target)
+        self.assertAlmostEqual(sum(bead['score'] for bead in beads), best[7, 5], places=5)
+        self.assertEqual([i for bead in beads for i in bead['source']], list(range(7)))
+        self.assertEqual([j for bead in beads for j in bead['target']], list(range(5)))
+
+    def test_empty_side_is_skipped(self):
+        beads = AlignmentService(skip_penalty=0.1).align(self.source[:2], np.empty((0, 32)))
+        self.assertEqual([(bead['source'], bead['target'], bead['score']) for bead in beads],
+                         [([0], [], -0.1), ([1], [], -0.1)])
+
+
+class TextAlignmentViewTest(TestCase):
+    def setUp(self):
+        corpus = Corpus.objects.create(name="corpus", description="", genre="news")
+        vectors = _normalize(np.random.default_rng(0).normal(size=(3, 8)))
+        self.translation = Text.objects.create(title="translation", description="", content="A. B. C.",
+                                               corpus=corpus, chunker_version=CHUNKER_VERSION)
+        self.text = Text.objects.create(title="text", description="", content="A. B. C.", corpus=corpus,
+                                        has_translation=self.translation, chunker_version=CHUNKER_VERSION)
+        for text in (self.text, self.translation):
+            text.set_embeddings_array(vectors)
+            text.save()
+
+    def _get(self, **params):
+        return self.client.get(f"/api/text/{self.text.id}/alignment/", params)
+
+    def test_alignment(self):
+        response = self._get()
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([bead['source'] for bead in response.json()['alignment']], [[0], [1], [2]])
+
+    def test_rejects_too_large_alignment(self):
+        with self.settings(ALIGNMENT_MAX_CELLS=8):
+            self.assertEqual(self._get().status_code, 400)
+
+    @mock.patch.object(EmbeddingService, 'get_chunks', lambda self, text: text.split(" "))
+    def test_include_chunks(self):
+        beads = self._get(include_chunks=1).json()['alignment']
+        self.assertEqual([bead['source_text'] for bead in beads], ["A.", "B.", "C."])
+
+    def test_chunks_of_outdated_chunker_are_not_returned(self):
+        Text.objects.filter(id=self.translation.id).update(chunker_version=CHUNKER_VERSION - 1)
+        result = self._get(include_chunks=1).json()
+        self.assertTrue(result['chunks_outdated'])
+        self.assertNotIn('source_text', result['alignment'][0])
+
+
+class SearchViewTest(TestCase):
+    def setUp(self):
+        corpus = Corpus.objects.create(name="corpus", description="", genre="news")
+        self.vectors = _normalize(np.random.default_rng(0).normal(size=(2, 8))).astype(np.float32)
+        self.text = Text.objects.create(title="text", description="", content="A. B.", corpus=corpus,
+                                        chunker_version=CHUNKER_VERSION)
+        self.index = ChunkVectorIndex()
+        self.index.add_text(self.text.id, corpus.id, self.vectors)
+
+    def _search(self):
+        batcher = mock.Mock(encode=lambda texts: self.vectors[1:])
+        with mock.patch('db.views.search_views.get_embedding_batcher', return_value=batcher), \
+                mock.patch('db.views.search_views.get_vector_index', return_value=self.index), \
+                mock.patch.object(EmbeddingService, 'get_chunks', lambda self, text: text.split(" ")):
+            response = self.client.post("/api/search/", {"query": "B", "k": 1, "include_chunks": True},
+                                        content_type="application/json")
+        self.assertEqual(response.status_code, 200)
+        return response.json()['results'][0]
+
+    def test_include_chunks(self):
+        result = self._search()
+        self.assertEqual((result['chunk_index'], result['chunk']), (1, "B."))
+
+    def test_chunk_of_outdated_chunker_is_not_returned(self):
+        Text.objects.filter(id=self.text.id).update(chunker_version=None)
+        result = self._search()
+        self.assertIsNone(result['chunk'])
+        self.assertTrue(result['chunk_outdated'])
+
+
+class CompareEmbeddingsBatchViewTest(TestCase):
+    def _compare(self, data):
+        return self.client.post("/api/embedding/compare/batch/", data, content_type="application/json")
+
+    def test_empty_text_ids_are_rejected(self):
+        with mock.patch.object(TextRepository, 'get_embeddings_by_ids') as get_embeddings:
+            for data in ({"text_ids1": [], "text_ids2": [1]}, {"text_ids1": [1]}):
+                response = self._compare(data)
+                self.assertEqual(response.status_code, 400)
+                self.assertEqual(response.json()['error'], "Both sets of embeddings are required")
+        get_embeddings.assert_not_called()
+
+    def test_text_centroids(self):
+        corpus = Corpus.objects.create(name="corpus", description="", genre="news")
+        vectors = _normalize(np.random.default_rng(0).normal(size=(2, 8))).astype(np.float32)
+        texts = []
+        for vector in vectors:
+            text = Text(title="text", description="", content="", corpus=corpus)
+            text.set_embeddings_array(vector[None, :])
+            text.save()
+            texts.append(text)
+        response = self._compare({"text_ids1": [texts[0].id], "text_ids2": [text.id for text in texts]})
+        self.assertEqual(response.status_code, 200)
+        np.testing.assert_allclose(response.json()['similarity'], [vectors[0] @ vectors.T], atol=1e-5)
+
+class FindSimilarPairsTest(SimpleTestCase):
+    def setUp(self):
+        rng = np.random.default_rng(0)
+        self.vectors = _clustered(rng, 10, 6, 16)
+        self.owners = np.arange(len(self.vectors)) % 7
+        self.threshold = 0.98
+
+    def _brute_force(self):
+        scores = self.vectors @ self.vectors.T
+        rows, cols = np.triu_indices(len(self.vectors), k=1)
+        keep = (scores[rows, cols] >= self.threshold) & (self.owners[rows] != self.owners[cols])
+        rows, cols, scores = rows[keep], cols[keep], scores[rows[keep], cols[keep]]
+        order = np.lexsort((cols, rows, -scores))
+        return rows[order], cols[order], scores[order]
+
+    def test_matches_brute_force(self):
+        expected = self._brute_force()
+        self.assertGreater(len(expected[0]), 0)
+        for block_size in (7, 16, 1000):
+            rows, cols, scores = find_similar_pairs(self.vectors, self.threshold, self.owners, block_size=block_size)
+            np.testing.assert_array_equal(rows, expected[0])
+            np.testing.assert_array_equal(cols, expected[1])
+            np.testing.assert_allclose(scores, expected[2], rtol=1e-5)
+
+    def test_max_pairs_keeps_strongest(self):
+        expected = self._brute_force()
+        rows, cols, scores = find_similar_pairs(self.vectors, self.threshold, self.owners, block_size=7, max_pairs=5)
+        np.testing.assert_allclose(scores, expected[2][:5], rtol=1e-5)
+
+
+class ImportTextsTest(TestCase):
+    def setUp(self):
+        self.corpus = Corpus.objects.create(name="corpus", description="", genre="news")
+        self.translation = Text.objects.create(title="translation", description="", content="", corpus=self.corpus)
+
+    def _line(self, **record) -> str:
+        return json.dumps({"title": "text", "content": "One. Two.", "corpus_id": self.corpus.id, **record})
+
+    def test_reports_invalid_records_by_line(self):
+        lines = [
+            self._line(),
+            "{not json",
+            "[1, 2]",
+            self._line(title=""),
+            self._line(corpus_id=True),
+            self._line(corpus_id=self.corpus.id + 100),
+            self._line(title="x" * (TITLE_MAX_LENGTH + 1)),
+            self._line(content=["not", "a", "string"]),
+            self._line(has_translation=True),
+            self._line(has_translation=self.translation.id + 100),
+            "",
+            self._line(has_translation=self.translation.id),
+        ]
+        report = import_texts(lines, batch_size=3, embed=False)
+
+        self.assertEqual(report['created'], 2)
+        self.assertEqual(report['failed'], 9)
+        self.assertEqual([error['line'] for error in report['errors']], list(range(2, 11)))
+        created = Text.objects.exclude(id=self.translation.id)
+        self.assertEqual(set(created.values_list('embedding_status', flat=True)), {Text.EMBEDDING_PENDING})
+        self.assertEqual(EmbeddingJob.objects.count(), 2)
+
+    def test_failed_write_keeps_other_records_of_batch(self):
+        save = Text.save
+
+        def failing_save(text, *args, **kwargs):
+            if text.title == "broken":
+                raise DatabaseError("constraint failed")
+            return save(text, *args, **kwargs)
+
+        lines = [self._line(title="first"), self._line(title="broken"), self._line(title="third")]
+        with mock.patch.object(Text, 'save', failing_save), \
+                mock.patch.object(Text.objects, 'bulk_create', side_effect=DatabaseError("constraint failed")), \
+                self.assertLogs('db.services.text_import', 'WARNING'):
+            report = import_texts(lines, batch_size=10, embed=False)
+
+        self.assertEqual(report['created'], 2)
+        self.assertEqual(report['errors'], [{'line': 2, 'error': "Database error: constraint failed"}])
+        self.assertEqual(set(Text.objects.values_list('title', flat=True)), {"translation", "first", "third"})
+
+    def test_embedding_failure_fails_whole_batch(self):
+        with mock.patch('db.services.text_import._embed_all', side_effect=RuntimeError("model is unavailable")), \
+                self.assertLogs('db.services.text_import', 'ERROR'):
+            report = import_texts([self._line(), self._line()], batch_size=10)
+
+        self.assertEqual(report['created'], 0)
+        self.assertEqual([error['error'] for error in report['errors']], ["Embedding failed: model is unavailable"] * 2)
+
+
+class OntologyImportTest(SimpleTestCase):
+    def setUp(self):
+        self.repository = OntologyRepository("bolt://localhost", "neo4j", "", driver=mock.MagicMock())
+        self.graph = mock.Mock(spec=GraphRepository)
+        self.graph.get_existing_uris.side_effect = lambda uris: {uri for uri in uris if uri.startswith("existing")}
+        self.graph.create_nodes_bulk.side_effect = lambda nodes: [f"uri-{i}" for i in range(len(nodes))]
+        self.graph.create_arcs_bulk.side_effect = lambda arcs: list(arcs)
+        self.repository.graph_repository = self.graph
+
+    def test_resolves_refs(self):
+        result = self.repository.import_ontology(
+            classes=[{"ref": "animal", "title": "Animal"},
+                     {"ref": "dog", "title": "Dog", "parents": ["animal", "existing-thing"]}],
+            attributes=[{"ref": "name", "title": "Name", "class": "animal"}],
+            objects=[{"title": "Rex", "class": "dog", "object_properties": {"owner": "existing-person"}}])
+
+        self.assertEqual(result, {"uris": {"animal": "uri-0", "dog": "uri-1", "name": "uri-2"},
+                                  "nodes": 4, "arcs": 5, "skipped_arcs": 0})
+        self.assertEqual([labels for labels, _ in self.graph.create_nodes_bulk.call_args[0][0]],
+                         [[CLASS], [CLASS], [PROPERTY_LABEL], [OBJECT]])
+        self.assertEqual(self.graph.create_arcs_bulk.call_args[0][0], [
+            ("uri-1", "uri-0", SUB_CLASS, {}),
+            ("uri-1", "existing-thing", SUB_CLASS, {}),
+            ("uri-2", "uri-0", PROPERTY_DOMAIN, {}),
+            ("uri-3", "uri-1", HAS_TYPE, {}),
+            ("uri-3", "existing-person", "owner", {}),
+        ])
+
+    def test_invalid_import_writes_nothing(self):
+        invalid = [
+            {"classes": [{"ref": "a", "title": "A"}, {"ref": "a", "title": "B"}]},
+            {"classes": [{"ref": True, "title": "A"}]},
+            {"classes": [{"title": "A", "parents": "a"}]},
+            {"classes": [{"title": "A", "parents": ["missing"]}]},
+            {"attributes": [{"title": "Name"}]},
+            {"object_attributes": [{"title": "Owner", "class": "existing-class"}]},
+            {"objects": [{"title": "Rex", "class": "existing-class", "object_properties": ["a"]}]},
+            {"objects": [{"class": "existing-class"}]},
+        ]
+        for sections in invalid:
+            with self.subTest(sections=sections), self.assertRaises(ValueError):
+                self.repository.import_ontology(**sections)
+        self.graph.create_nodes_bulk.assert_not_called()
+        self.graph.create_arcs_bulk.assert_not_called()
+
+
+class GraphBulkWriteTest(SimpleTestCase):
+    def setUp(self):
+        self.repository = GraphRepository("bolt://localhost", "neo4j", "", driver=mock.MagicMock())
+        self.session = self.repository.driver.session.return_value.__enter__.return_value
+        self.events = []
+        listener = lambda database, event, payload, version: self.events.append((event, payload, version))
+        GraphRepository.add_change_listener(listener)
+        self.addCleanup(GraphRepository.remove_change_listener, listener)
+
+    def test_nodes_are_created_in_batches_grouped_by_labels(self):
+        self.session.execute_write.return_value = None
+        nodes = [([CLASS], {"uri": "a"}), ([OBJECT], {"uri": "b"}), ([CLASS], {}), ([CLASS], {"uri": "d"})]
+        uris = self.repository.create_nodes_bulk(nodes, batch_size=3)
+
+        self.assertEqual(uris[:2] + uris[3:], ["a", "b", "d"])
+        batches = [call[0][1] for call in self.session.execute_write.call_args_list]
+        self.assertEqual([{labels: len(rows) for labels, rows in batch.items()} for batch in batches],
+                         [{(CLASS,): 2, (OBJECT,): 1}, {(CLASS,): 1}])
+        self.assertEqual([len(payload) for event, payload, _ in self.events if event == "nodes_created"], [3, 1])
+
+    def test_arcs_with_missing_ends_are_skipped(self):
+        # из трех дуг в базе нашлись концы только у первой и третьей
+        self.session.execute_write.return_value = ([(2, "arc-2"), (0, "arc-0")], 5)
+        arcs = [("a", "b", SUB_CLASS, {}), ("a", "missing", SUB_CLASS, {}), ("c", "b", "owner", {"since": 1})]
+        created = self.repository.create_arcs_bulk(arcs)
+
+        self.assertEqual([(arc.id, arc.label, arc.node_uri_from) for arc in created],
+                         [("arc-0", SUB_CLASS, "a"), ("arc-2", "owner", "c")])
+        groups = self.session.execute_write.call_args[0][1]
+        self.assertEqual({label: [row["i"] for row in rows] for label, rows in groups.items()},
+                         {SUB_CLASS: [0, 1], "owner": [2]})
+        self.assertEqual(self.events, [("arcs_created", created, 5)])
+
+
+class CascadeDeleteTest(SimpleTestCase):
+    def setUp(self):
+        self.repository = GraphRepository("bolt://localhost", "neo4j", "", driver=mock.MagicMock(),
+                                          uri_labels=[CLASS], track_version=True)
+        self.session = self.repository.driver.session.return_value.__enter__.return_value
+        self.tx = mock.Mock()
+        self.session.execute_write.side_effect = lambda work, *args: work(self.tx, *args)
+        self.events = []
+        listener = lambda database, event, payload, version: self.events.append((event, version))
+        GraphRepository.add_change_listener(listener)
+        self.addCleanup(GraphRepository.remove_change_listener, listener)
+
+    def _results(self, deleted: int, version: int = 8):
+        self.tx.run.side_effect = [mock.Mock(single=lambda: {"deleted_count": deleted}),
+                                   mock.Mock(single=lambda: {"version": version})]
+
+    def test_deletes_closure_in_one_transaction(self):
+        self._results(3)
+        self.assertEqual(self.repository.delete_incoming_closure("animal"), 3)
+
+        query, params = self.tx.run.call_args_list[0][0][0], self.tx.run.call_args_list[0][1]
+        self.assertIn("MATCH (root)<-[*0..]-(n)", query)
+        self.assertIn("WITH DISTINCT n", query)
+        self.assertIn("DETACH DELETE n", query)
+        self.assertEqual(params, {"uri": "animal"})
+        self.assertEqual(self.session.execute_write.call_count, 1)
+        self.assertEqual(self.events, [("reset", 8)])
+
+    def test_missing_class_changes_nothing(self):
+        self._results(0)
+        self.assertEqual(self.repository.delete_incoming_closure("missing"), 0)
+        # версия не увеличивается, событий нет
+        self.assertEqual(self.tx.run.call_count, 1)
+        self.assertEqual(self.events, [])
+
+    def test_batched_delete(self):
+        self.session.run.return_value.single.return_value = {"deleted_count": 5}
+        self.tx.run.return_value.single.return_value = {"version": 9}
+        self.assertEqual(self.repository.delete_incoming_closure("animal", batch_size=100), 5)
+
+        query = self.session.run.call_args[0][0]
+        self.assertIn("IN TRANSACTIONS OF $batch_size ROWS", query)
+        self.assertEqual(self.session.run.call_args[1], {"uri": "animal", "batch_size": 100})
+        self.assertEqual(self.events, [("reset", 9)])
+
+
+class CachedOntologyServiceTest(SimpleTestCase):
+    KEYS = ["ontology", "parent_classes:0:None", "parent_classes:10:10", "class:dog", "parents:dog",
+            "children:animal", "children:dog", "signature:dog", "signature:puppy", "signature:cat", "class:cat"]
+
+    def setUp(self):
+        self.repository = mock.Mock(spec=OntologyRepository)
+        self.repository.get_class_parents.return_value = [mock.Mock(uri="animal")]
+        self.repository.get_class_children.return_value = [mock.Mock(uri="puppy")]
+        self.repository.get_subclass_uris.return_value = ["dog", "puppy"]
+        self.store = LocalCacheStore()
+        self.service = CachedOntologyService(self.repository, self.store)
+        for key in self.KEYS:
+            self.store.set(key, {"cached": key})
+
+    def _remaining(self):
+        return [key for key in self.KEYS if self.store.get(key) is not None]
+
+    def test_read_through(self):
+        self.repository.get_class.return_value.to_dict.return_value = {"uri": "wolf"}
+        self.assertEqual(self.service.get_class("wolf"), {"uri": "wolf"})
+        self.assertEqual(self.service.get_class("wolf"), {"uri": "wolf"})
+        self.assertEqual(self.service.get_class("dog"), {"cached": "class:dog"})
+        self.repository.get_class.assert_called_once_with("wolf")
+
+    def test_add_parent_invalidates_hierarchy_and_signatures_below(self):
+        self.service.add_class_parent("animal", "dog")
+        self.repository.get_subclass_uris.assert_called_once_with("dog")
+        self.assertEqual(self._remaining(), ["class:dog", "children:dog", "signature:cat", "class:cat"])
+
+    def test_update_class_invalidates_neighbour_lists(self):
+        self.service.update_class("dog", title="Dog")
+        self.assertEqual(self._remaining(), ["signature:puppy", "signature:cat", "class:cat"])
+
+    def test_add_attribute_keeps_hierarchy(self):
+        self.service.add_class_attribute("dog", "name")
+        self.assertEqual(self._remaining(), ["parent_classes:0:None", "parent_classes:10:10", "class:dog",
+                                             "parents:dog", "children:animal", "signature:cat", "class:cat"])
+
+    def test_failed_write_still_invalidates(self):
+        self.repository.add_class_parent.side_effect = RuntimeError("Neo4j is unavailable")
+        with self.assertRaises(RuntimeError):
+            self.service.add_class_parent("animal", "dog")
+        self.assertNotIn("parents:dog", self._remaining())
+
+    def test_cascade_delete_clears_everything(self):
+        self.repository.delete_class.side_effect = RuntimeError("Neo4j is unavailable")
+        with self.assertRaises(RuntimeError):
+            self.service.delete_class("animal")
+        self.assertEqual(self._remaining(), [])
+
+
+class OntologyCacheStoreTest(SimpleTestCase):
+    def test_local_store_evicts_least_recent_and_expired(self):
+        store = LocalCacheStore(max_items=2, ttl=60)
+        store.set("a", 1)
+        store.set("b", 2)
+        store.get("a")
+        store.set("c", 3)
+        self.assertEqual((store.get("a"), store.get("b"), store.get("c")), (1, None, 3))
+
+        with mock.patch("db.services.ontology_cache.time.monotonic", return_value=time.monotonic() + 61):
+            self.assertIsNone(store.get("a"))
+
+    def test_django_store_clear_bumps_generation(self):
+        store = DjangoCacheStore("default", prefix=f"test-{uuid.uuid4()}")
+        other = DjangoCacheStore("default", prefix=store.prefix)
+        store.set("a", 1)
+        store.set("b", 2)
+        store.delete_many(["a"])
+        self.assertEqual((other.get("a"), other.get("b")), (None, 2))
+
+        store.clear()
+        self.assertIsNone(other.get("b"))
+        other.set("b", 3)
+        self.assertEqual(store.get("b"), 3)
+
+
+class OntologySnapshotTest(SimpleTestCase):
+    @staticmethod
+    def _node(uri: str) -> TNode:
+        return TNode(id=uri, uri=uri, labels=[CLASS], props={"uri": uri})
+
+    @staticmethod
+    def _arc(child: str, parent: str) -> TArc:
+        return TArc(id=f"{child}-{parent}", label=SUB_CLASS, props={}, node_uri_from=child, node_uri_to=parent)
+
+    def setUp(self):
+        nodes = [self._node(uri) for uri in ("thing", "animal", "dog")]
+        self.snapshot = OntologySnapshot(nodes, [self._arc("animal", "thing"), self._arc("dog", "animal")], version=1)
+
+    def _uris(self, nodes):
+        return [node.uri for node in nodes]
+
+    def test_traversals(self):
+        self.assertEqual(self._uris(self.snapshot.ancestors("dog")), ["animal", "thing"])
+        self.assertEqual(self._uris(self.snapshot.descendants("thing")), ["animal", "dog"])
+        self.assertEqual(self._uris(self.snapshot.roots([CLASS])), ["thing"])
+        self.assertEqual(self.snapshot.counts(), (3, 2))
+
+    def test_applies_consecutive_versions(self):
+        self.snapshot.apply("node_created", self._node("cat"), version=2)
+        self.snapshot.apply("arcs_created", [self._arc("cat", "animal")], version=3)
+        self.snapshot.apply("node_deleted", "dog", version=4)
+
+        self.assertFalse(self.snapshot.stale)
+        self.assertEqual(self.snapshot.version, 4)
+        self.assertEqual(self._uris(self.snapshot.descendants("animal")), ["cat"])
+        self.assertEqual(self.snapshot.counts(), (3, 2))
+
+    def test_arc_deleted(self):
+        self.snapshot.apply("arc_deleted", "dog-animal", version=2)
+        self.assertEqual(self._uris(self.snapshot.ancestors("dog")), [])
+        self.assertEqual(self._uris(self.snapshot.roots([CLASS])), ["dog", "thing"])
+
+    def test_skipped_version_marks_stale(self):
+        self.snapshot.apply("node_created", self._node("cat"), version=3)
+        self.assertTrue(self.snapshot.stale)
+        self.assertIsNone(self.snapshot.get_node("cat"))
+
+    def test_unknown_arc_end_marks_stale(self):
+        self.snapshot.apply("arcs_created", [self._arc("cat", "animal")], version=2)
+        self.assertTrue(self.snapshot.stale)
+
+
+class VectorIndexSyncTest(TestCase):
+    def setUp(self):
+        self.corpus = Corpus.objects.create(name="corpus", description="", genre="news")
+        self.vectors = _normalize(np.random.default_rng(0).normal(size=(4, 8))).astype(np.float32)
+        self.first = self._create(self.vectors[:2])
+        vector_index._index = None
+        self.addCleanup(setattr, vector_index, '_index', None)
+        self.index = vector_index.get_vector_index()
+
+    def _create(self, vectors: np.ndarray) -> Text:
+        text = Text(title="text", description="", content="", corpus=self.corpus)
+        text.set_embeddings_array(vectors)
+        text.save()
+        return text
+
+    def _synced(self) -> ChunkVectorIndex:
+        with self.settings(VECTOR_INDEX_CHECK_INTERVAL=0):
+            return vector_index.get_vector_index()
+
+    def _text_ids(self):
+        return sorted({text_id for text_id, _, _ in self.index.search(self.vectors[0], k=10)})
+
+    def test_unchanged_database_costs_two_aggregates(self):
+        with self.assertNumQueries(2):
+            self._synced()
+
+    def test_picks_up_writes_of_other_processes(self):
+        # запись и удаление "в другом процессе": без хуков этого процесса
+        second = self._create(self.vectors[2:])
+        self.assertIs(self._synced(), self.index)
+        self.assertEqual(self._text_ids(), [self.first.id, second.id])
+
+        Text.objects.filter(id=self.first.id).delete()
+        TextDeletion.objects.create(text_id=self.first.id)
+        self._synced()
+        self.assertEqual(self._text_ids(), [second.id])
+
+        Corpus.objects.filter(id=self.corpus.id).delete()
+        TextDeletion.objects.create(corpus_id=self.corpus.id)
+        self._synced()
+        self.assertEqual(self._text_ids(), [])
+
+    def test_repository_delete_records_deletion(self):
+        text_id = self.first.id
+        TextRepository.delete(self.first)
+        self.assertEqual(list(TextDeletion.objects.values_list('text_id', flat=True)), [text_id])
+        self.assertEqual(self._text_ids(), [])
@@ -3,6 +3,7 @@ from django.conf.urls import url
 import db.views.corpus_views as corpus_views
 import db.views.text_views as text_views
 import db.views.embedding_views as embedding_views
+import db.views.search_views as search_views
 from db.views.ontology_views import *
 
 urlpatterns = [
@@ -11,16 +12,28 @@ urlpatterns = [
     path('corpus/<int:corpus_id>/', corpus_views.update_corpus, name='update_corpus'),
     path('corpus/<int:corpus_id>/details/', corpus_views.get_corpus, name='get_corpus'),
     path('corpus/<int:corpus_id>/delete/', corpus_views.delete_corpus, name='delete_corpus'),
+    path('corpus/<int:corpus_id>/duplicates/', corpus_views.get_corpus_duplicates, name='get_corpus_duplicates'),
     
     # Text endpoints
     path('text/', text_views.create_text, name='create_text'),
+    path('text/bulk/', text_views.bulk_create_texts, name='bulk_create_texts'),
     path('text/<int:text_id>/', text_views.update_text, name='update_text'),
     path('text/<int:text_id>/details/', text_views.get_text, name='get_text'),
     path('text/<int:text_id>/delete/', text_views.delete_text, name='delete_text'),
+    path('text/<int:text_id>/embeddings/', text_views.get_text_embeddings, name='get_text_embeddings'),
+    path('text/<int:text_id>/alignment/', text_views.get_text_alignment, name='get_text_alignment'),
 
     # Ontology endpoints
     path('ontology/', get_ontology, name='get_ontology'),
     path('ontology/parent-classes/', get_ontology_parent_classes, name='get_ontology_parent_classes'),
+    path('ontology/import/', import_ontology, name='import_ontology'),
+    path('ontology/export/', export_ontology, name='export_ontology'),
+
+    # In-memory ontology snapshot (ONTOLOGY_SNAPSHOT_ENABLED)
+    path('ontology/snapshot/roots/', get_snapshot_root_classes, name='get_snapshot_root_classes'),
+    path('ontology/snapshot/classes/<path:uri>/ancestors/', get_snapshot_class_ancestors, name='get_snapshot_class_ancestors'),
+    path('ontology/snapshot/classes/<path:uri>/descendants/', get_snapshot_class_descendants, name='get_snapshot_class_descendants'),
+    path('ontology/snapshot/classes/<path:uri>/signature/', get_snapshot_class_signature, name='get_snapshot_class_signature'),
     
     # Class endpoints
     path('classes/<path:uri>/parents/', get_class_parents, name='get_class_parents'),
@@ -51,6 +64,11 @@ urlpatterns = [
     path("embedding/chunk/", embedding_views.chunk_text),
     path("embedding/encode/", embedding_views.get_embeddings),
     path("embedding/compare/", embedding_views.compare_embeddings),
+    path("embedding/compare/batch/", embedding_views.compare_embeddings_batch),
+    path("embedding/metrics/", embedding_views.get_embedding_metrics),
+
+    # Semantic search
+    path('search/', search_views.search, name='search'),
 ]
 
 """
@@ -62,11 +80,19 @@ curl -X POST http://127.0.0.1:8000/api/corpus/ \
 # Получить корпус с текстами
 curl http://127.0.0.1:8000/api/corpus/1/details/
 
+# Следующая страница текстов, с содержимым
+curl "http://127.0.0.1:8000/api/corpus/1/details/?cursor=100&limit=50&fields=title,content"
+
 # Создать текст
 curl -X POST http://127.0.0.1:8000/api/text/ \
   -H "Content-Type: application/json" \
   -d '{"title": "Война и мир", "description": "Роман", "content": "Текст...", "corpus": 1}'
 
+# Загрузить тексты из JSON Lines
+curl -X POST "http://127.0.0.1:8000/api/text/bulk/?batch_size=500" \
+  -H "Content-Type: application/x-ndjson" \
+  --data-binary @texts.jsonl
+
 # Обновить текст
 curl -X PUT http://127.0.0.1:8000/api/text/1/ \
   -H "Content-Type: application/json" \
@@ -1,9 +1,11 @@
-from django.http import JsonResponse
+from django.conf import settings
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 import json
 from db.repositories.CorpusRepository import CorpusRepository
 from db.repositories.TextRepository import TextRepository
+from db.models import NearDuplicate
 
 @require_http_methods(["POST"])
 def create_corpus(request):
@@ -65,36 +67,80 @@ def update_corpus(request, corpus_id):
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
+# поля текста, которые можно запросить через fields=; значение - как достать его из модели
+TEXT_FIELDS = {
+    'id': lambda text: text.id,
+    'title': lambda text: text.title,
+    'description': lambda text: text.description,
+    'content': lambda text: text.content,
+    'has_translation': lambda text: text.has_translation_id,
+    'embedding_status': lambda text: text.embedding_status,
+}
+# content бывает по мегабайту на текст - только по явному запросу
+# (эмбеддинги отдает text/<id>/embeddings/)
+DEFAULT_TEXT_FIELDS = ['id', 'title', 'description', 'has_translation', 'embedding_status']
+
 @require_http_methods(["GET"])
 def get_corpus(request, corpus_id):
+    """
+    Корпус и страница его текстов, ответ отдается потоком.
+    Query:
+        fields - поля текстов через запятую (по умолчанию без content)
+        cursor - next_cursor из предыдущего ответа
+        limit - размер страницы (CORPUS_TEXTS_PAGE_SIZE, не больше CORPUS_TEXTS_MAX_PAGE_SIZE)
+    """
     try:
-        corpus = CorpusRepository.get_corpus_with_texts(corpus_id)
+        corpus = CorpusRepository.get_by_id(corpus_id)
         if not corpus:
             return JsonResponse({'error': 'Corpus not found'}, status=404)
-        
-        # Собираем данные с текстами
-        corpus_data = {
+
+        fields = DEFAULT_TEXT_FIELDS
+        if request.GET.get('fields'):
+            fields = [field.strip() for field in request.GET['fields'].split(',') if field.strip()]
+            unknown = [field for field in fields if field not in TEXT_FIELDS]
+            if unknown:
+                return JsonResponse({'error': f"Unknown fields: {', '.join(unknown)}"}, status=400)
+            if 'id' not in fields:
+                fields = ['id'] + fields
+
+        try:
+            cursor = int(request.GET['cursor']) if request.GET.get('cursor') else None
+            limit = int(request.GET.get('limit', settings.CORPUS_TEXTS_PAGE_SIZE))
+        except ValueError:
+            return JsonResponse({'error': 'cursor and limit must be integers'}, status=400)
+        if limit <= 0:
+            return JsonResponse({'error': 'limit must be positive'}, status=400)
+        limit = min(limit, settings.CORPUS_TEXTS_MAX_PAGE_SIZE)
+
+        # на одну строку больше, чтобы узнать, есть ли следующая страница
+        texts = TextRepository.get_page_by_corpus(corpus_id, fields, after_id=cursor, limit=limit + 1)
+
+        header = {
             'id': corpus.id,
             'name': corpus.name,
             'description': corpus.description,
             'genre': corpus.genre,
-            'texts': [
-                {
-                    'id': text.id,
-                    'title': text.title,
-                    'description': text.description,
-                    'content': text.content,
-                    'has_translation': text.has_translation_id,
-                }
-                for text in corpus.texts.all()
-            ]
         }
-        
-        return JsonResponse(corpus_data)
-        
+        return StreamingHttpResponse(_stream_corpus(header, texts, fields, limit), content_type='application/json')
+
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
+def _stream_corpus(header, texts, fields, limit):
+    # {"id": ..., "texts": [...], "next_cursor": ...} по одному тексту за раз
+    yield json.dumps(header)[:-1] + ', "texts": ['
+
+    next_cursor = None
+    for position, text in enumerate(texts.iterator()):
+        if position == limit:
+            next_cursor = last_id
+            break
+        item = {field: TEXT_FIELDS[field](text) for field in fields}
+        yield (', ' if position else '') + json.dumps(item)
+        last_id = text.id
+
+    yield '], "next_cursor": ' + json.dumps(next_cursor) + '}'
+
 @require_http_methods(["DELETE"])
 def delete_corpus(request, corpus_id):
     try:
@@ -109,4 +155,49 @@ def delete_corpus(request, corpus_id):
             return JsonResponse({'error': 'Failed to delete corpus'}, status=500)
             
     except Exception as e:
-        return JsonResponse({'error': str(e)}, status=500)
\ No newline at end of file
+        return JsonResponse({'error': str(e)}, status=500)
+
+@require_http_methods(["GET"])
+def get_corpus_duplicates(request, corpus_id):
+    """
+    Сохраненные почти-дубликаты корпуса (считаются командой find_near_duplicates).
+    Query: kind=text|chunk (text), min_score, offset (0), limit (100)
+    """
+    try:
+        corpus = CorpusRepository.get_by_id(corpus_id)
+        if not corpus:
+            return JsonResponse({'error': 'Corpus not found'}, status=404)
+
+        kind = request.GET.get('kind', NearDuplicate.TEXT)
+        if kind not in (NearDuplicate.TEXT, NearDuplicate.CHUNK):
+            return JsonResponse({'error': 'kind must be "text" or "chunk"'}, status=400)
+        try:
+            min_score = float(request.GET.get('min_score', 0.0))
+            offset = int(request.GET.get('offset', 0))
+            limit = int(request.GET.get('limit', 100))
+        except ValueError:
+            return JsonResponse({'error': 'min_score, offset and limit must be numbers'}, status=400)
+        if offset < 0 or limit <= 0:
+            return JsonResponse({'error': 'offset must be non-negative and limit positive'}, status=400)
+
+        duplicates = CorpusRepository.get_near_duplicates(corpus_id, kind, min_score)
+        page = duplicates[offset:offset + limit]
+
+        return JsonResponse({
+            'corpus_id': corpus_id,
+            'kind': kind,
+            'total': duplicates.count(),
+            'duplicates': [
+                {
+                    'text_a': item.text_a_id,
+                    'text_b': item.text_b_id,
+                    'chunk_a': item.chunk_a,
+                    'chunk_b': item.chunk_b,
+                    'score': item.score,
+                }
+                for item in page
+            ]
+        })
+
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
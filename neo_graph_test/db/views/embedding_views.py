@@ -1,26 +1,87 @@
 from rest_framework.decorators import api_view
+from django.conf import settings
 from django.http import JsonResponse
+import numpy as np
+from db.repositories.TextRepository import TextRepository
 from db.services.embedding_service import EmbeddingService
+from db.services.embedding_batcher import get_embedding_batcher
 
 @api_view(["POST"])
 def chunk_text(request):
     data = request.data
     text = data.get("text", "")
     service = EmbeddingService()
-    chunks = service.get_chunks(text)
+    try:
+        chunks = service.get_chunks(text, int(data.get("max_tokens", 128)), int(data.get("overlap", 0)))
+    except (TypeError, ValueError) as e:
+        return JsonResponse({"error": str(e)}, status=400)
     return JsonResponse({"chunks": chunks})
 
 @api_view(["POST"])
 def get_embeddings(request):
     data = request.data
     texts = data.get("texts", [])
-    service = EmbeddingService()
-    embeddings = service.get_embeddings(texts)
+    embeddings = get_embedding_batcher().encode(texts)
     return JsonResponse({"embeddings": embeddings.tolist()})
 
+@api_view(["GET"])
+def get_embedding_metrics(request):
+    return JsonResponse(get_embedding_batcher().metrics())
+
 @api_view(["POST"])
 def compare_embeddings(request):
     data = request.data
     service = EmbeddingService()
     similarity = service.cos_compare(data.get("embedding1"), data.get("embedding2"))
-    return JsonResponse({"cosine_similarity": similarity})
\ No newline at end of file
+    return JsonResponse({"cosine_similarity": similarity})
+
+@api_view(["POST"])
+def compare_embeddings_batch(request):
+    """
+    Сравнение наборов векторов: embeddings1/embeddings2 (M x D и N x D)
+    или text_ids1/text_ids2 (сравниваются средние эмбеддинги сохраненных текстов).
+    С top_k возвращаются k ближайших для каждой строки, иначе вся матрица M x N.
+    """
+    data = request.data
+    service = EmbeddingService()
+
+    try:
+        if "text_ids1" in data or "text_ids2" in data:
+            text_ids1 = data.get("text_ids1") or []
+            text_ids2 = data.get("text_ids2") or []
+            if len(text_ids1) == 0 or len(text_ids2) == 0:
+                return JsonResponse({"error": "Both sets of embeddings are required"}, status=400)
+            left, missing_left = _text_centroids(service, text_ids1)
+            right, missing_right = _text_centroids(service, text_ids2)
+            missing = missing_left + missing_right
+            if missing:
+                return JsonResponse({"error": f"Texts without embeddings: {missing}"}, status=404)
+            normalized = True
+        else:
+            left = data.get("embeddings1") or []
+            right = data.get("embeddings2") or []
+            normalized = bool(data.get("normalized", False))
+
+        if len(left) == 0 or len(right) == 0:
+            return JsonResponse({"error": "Both sets of embeddings are required"}, status=400)
+
+        top_k = data.get("top_k")
+        if top_k is not None:
+            indices, scores = service.top_k_similar(left, right, int(top_k), normalized)
+            return JsonResponse({"indices": indices.tolist(), "scores": scores.tolist()})
+
+        if len(left) * len(right) > settings.EMBEDDING_COMPARE_MAX_CELLS:
+            return JsonResponse({"error": "Similarity matrix is too large, use top_k"}, status=400)
+
+        similarity = service.similarity_matrix(left, right, normalized)
+        return JsonResponse({"similarity": similarity.tolist()})
+    except (TypeError, ValueError) as e:
+        return JsonResponse({"error": str(e)}, status=400)
+
+def _text_centroids(service, text_ids):
+    text_ids = [int(text_id) for text_id in text_ids]
+    embeddings = TextRepository.get_embeddings_by_ids(text_ids)
+    missing = [text_id for text_id in text_ids if len(embeddings.get(text_id, [])) == 0]
+    if missing:
+        return None, missing
+    return np.stack([service.centroid(embeddings[text_id]) for text_id in text_ids]), []
@@ -1,24 +1,17 @@
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
 from functools import wraps
-import json
 from django.conf import settings
-from db.repositories.ontology_driver.driver import OntologyRepository
-from db.services.ontology_service import OntologyService
+import json
+from db.services.ontology_service import create_ontology_service
 
 # Декоратор для обработки сервиса
 def with_ontology_service(func):
     @wraps(func)
     def wrapper(request, *args, **kwargs):
         try:
-            service = OntologyService(
-                OntologyRepository(
-                    uri=settings.NEO4J_URI,
-                    user=settings.NEO4J_USER,
-                    password=settings.NEO4J_PASSWORD
-                )
-            )
+            service = create_ontology_service()
             with service:
                 return func(request, service, *args, **kwargs)
         except Exception as e:
@@ -38,9 +31,62 @@ def get_ontology(request, service):
 @require_http_methods(["GET"])
 @with_ontology_service
 def get_ontology_parent_classes(request, service):
-    classes = service.get_ontology_parent_classes()
+    try:
+        offset = int(request.GET.get('offset', 0))
+        limit = int(request.GET['limit']) if 'limit' in request.GET else None
+    except ValueError:
+        return JsonResponse({'error': 'offset and limit must be integers'}, status=400)
+    if offset < 0 or (limit is not None and limit < 0):
+        return JsonResponse({'error': 'offset and limit must be non-negative'}, status=400)
+
+    classes = service.get_ontology_parent_classes(offset, limit)
     return JsonResponse({'classes': classes})
 
+@csrf_exempt
+@require_http_methods(["POST"])
+@with_ontology_service
+def import_ontology(request, service):
+    """
+    Массовая загрузка: {"classes": [...], "attributes": [...], "object_attributes": [...], "objects": [...]}
+    (формат записей - OntologyRepository.import_ontology)
+    """
+    try:
+        data = json.loads(request.body)
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    if not isinstance(data, dict):
+        return JsonResponse({'error': 'Request body must be a JSON object'}, status=400)
+
+    sections = {}
+    for key in ('classes', 'attributes', 'object_attributes', 'objects'):
+        items = data.get(key) or []
+        if not isinstance(items, list) or not all(isinstance(item, dict) for item in items):
+            return JsonResponse({'error': f'{key} must be a list of objects'}, status=400)
+        sections[key] = items
+
+    try:
+        result = service.import_ontology(**sections)
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    return JsonResponse(result, status=201)
+
+@require_http_methods(["GET"])
+@with_ontology_service
+def export_ontology(request, service):
+    """
+    Весь граф онтологии, включая узлы без дуг: {"nodes": [...]} (формат узла - OntologyService.export_graph).
+    Ответ пишется по мере чтения из Neo4j; сервис поверх общего драйвера, так что его
+    закрытие при выходе из view не мешает дочитать граф.
+    """
+    return StreamingHttpResponse(_stream_export(service.export_graph()), content_type='application/json')
+
+def _stream_export(nodes):
+    yield '{"nodes": ['
+    for position, node in enumerate(nodes):
+        # в свойствах могут быть даты/время Neo4j
+        yield (', ' if position else '') + json.dumps(node, default=str)
+    yield ']}'
+
 ######################################
 #      Class endpoints               #
 ######################################
@@ -106,9 +152,27 @@ def update_class(request, service, uri):
 @require_http_methods(["DELETE"])
 @with_ontology_service
 def delete_class(request, service, uri):
-    success = service.delete_class(uri)
-    if success:
-        return JsonResponse({'message': 'Class deleted successfully'})
+    """
+    Каскадное удаление класса.
+    Query: dry_run=1 - только вернуть то, что будет удалено;
+           batch_size - удалять порциями в отдельных транзакциях (для очень больших поддеревьев)
+    """
+    if request.GET.get('dry_run') == '1':
+        entities = service.get_class_delete_closure(uri)
+        if not entities:
+            return JsonResponse({'error': 'Class not found'}, status=404)
+        return JsonResponse({'dry_run': True, 'count': len(entities), 'nodes': entities})
+
+    try:
+        batch_size = int(request.GET['batch_size']) if 'batch_size' in request.GET else None
+    except ValueError:
+        return JsonResponse({'error': 'batch_size must be an integer'}, status=400)
+    if batch_size is not None and batch_size <= 0:
+        return JsonResponse({'error': 'batch_size must be positive'}, status=400)
+
+    deleted = service.delete_class(uri, batch_size)
+    if deleted:
+        return JsonResponse({'message': 'Class deleted successfully', 'deleted': deleted})
     return JsonResponse({'error': 'Class not found'}, status=404)
 
 @csrf_exempt
@@ -250,3 +314,40 @@ def delete_object(request, service, uri):
 def get_class_signature(request, service, uri):
     signature = service.collect_signature(uri)
     return JsonResponse(signature)
+
+######################################
+#   In-memory snapshot endpoints     #
+######################################
+
+# Декоратор для обходов по копии онтологии в памяти (ONTOLOGY_SNAPSHOT_ENABLED)
+def with_ontology_snapshot(func):
+    @wraps(func)
+    def wrapper(request, *args, **kwargs):
+        if not settings.ONTOLOGY_SNAPSHOT_ENABLED:
+            return JsonResponse({'error': 'Ontology snapshot is disabled'}, status=404)
+        try:
+            from db.services.ontology_snapshot import get_ontology_snapshot
+            return func(request, get_ontology_snapshot(), *args, **kwargs)
+        except Exception as e:
+            return JsonResponse({'error': str(e)}, status=500)
+    return wrapper
+
+@require_http_methods(["GET"])
+@with_ontology_snapshot
+def get_snapshot_root_classes(request, snapshot):
+    return JsonResponse({'classes': snapshot.get_root_classes()})
+
+@require_http_methods(["GET"])
+@with_ontology_snapshot
+def get_snapshot_class_ancestors(request, snapshot, uri):
+    return JsonResponse({'ancestors': snapshot.get_ancestors(uri)})
+
+@require_http_methods(["GET"])
+@with_ontology_snapshot
+def get_snapshot_class_descendants(request, snapshot, uri):
+    return JsonResponse({'descendants': snapshot.get_descendants(uri)})
+
+@require_http_methods(["GET"])
+@with_ontology_snapshot
+def get_snapshot_class_signature(request, snapshot, uri):
+    return JsonResponse(snapshot.collect_signature(uri))
@@ -0,0 +1,85 @@
+from django.http import JsonResponse
+from django.views.decorators.http import require_http_methods
+import json
+from db.models import Corpus, Text
+from db.services.embedding_batcher import get_embedding_batcher
+from db.services.embedding_service import EmbeddingService, CHUNKER_VERSION
+from db.services.vector_index import get_vector_index, search_approximate
+
+@require_http_methods(["POST"])
+def search(request):
+    try:
+        data = json.loads(request.body)
+
+        query = data.get('query')
+        if not query:
+            return JsonResponse({'error': 'Query is required'}, status=400)
+
+        k = int(data.get('k', 10))
+        if k <= 0:
+            return JsonResponse({'error': 'k must be positive'}, status=400)
+
+        mode = data.get('mode', 'chunks')
+        if mode not in ('chunks', 'texts'):
+            return JsonResponse({'error': "mode must be 'chunks' or 'texts'"}, status=400)
+
+        # фильтры по корпусу и жанру сводятся к множеству id корпусов
+        corpus_ids = None
+        if data.get('corpus_id') is not None:
+            corpus_ids = {int(data['corpus_id'])}
+        if data.get('genre'):
+            genre_corpus_ids = set(Corpus.objects.filter(genre=data['genre']).values_list('id', flat=True))
+            corpus_ids = genre_corpus_ids if corpus_ids is None else corpus_ids & genre_corpus_ids
+
+        query_vector = get_embedding_batcher().encode([query])[0]
+        if data.get('approximate'):
+            if mode == 'texts':
+                return JsonResponse({'error': "mode 'texts' is not supported for approximate search"}, status=400)
+            n_probe = int(data['n_probe']) if data.get('n_probe') else None
+            hits = search_approximate(query_vector, k, corpus_ids, n_probe)
+        else:
+            index = get_vector_index()
+            if mode == 'texts':
+                hits = index.search_texts(query_vector, k, corpus_ids)
+            else:
+                hits = index.search(query_vector, k, corpus_ids)
+
+        fields = ['id', 'title', 'corpus_id']
+        if data.get('include_chunks'):
+            fields += ['content', 'chunker_version']
+        texts = {text['id']: text for text in Text.objects.filter(id__in={hit[0] for hit in hits}).values(*fields)}
+
+        service = EmbeddingService()
+        chunks_by_text = {}
+        results = []
+        for text_id, chunk_index, score in hits:
+            text = texts.get(text_id)
+            if text is None:
+                continue
+
+            result = {
+                'text_id': text_id,
+                'title': text['title'],
+                'corpus_id': text['corpus_id'],
+                'chunk_index': chunk_index,
+                'score': score,
+            }
+            if data.get('include_chunks') and text['chunker_version'] != CHUNKER_VERSION:
+                # эмбеддинги посчитаны старым разбиением: номер чанка не указывает в текущие чанки
+                result['chunk'] = None
+                result['chunk_outdated'] = True
+            elif data.get('include_chunks'):
+                if text_id not in chunks_by_text:
+                    chunks_by_text[text_id] = service.get_chunks(text['content'] or '')
+                chunks = chunks_by_text[text_id]
+                result['chunk'] = chunks[chunk_index] if chunk_index < len(chunks) else None
+            results.append(result)
+
+        return JsonResponse({'results': results})
+
+    except json.JSONDecodeError:
+        return JsonResponse({'error': 'Invalid JSON'}, status=400)
+    except (TypeError, ValueError) as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
@@ -1,8 +1,14 @@
-from django.http import JsonResponse
+from django.http import JsonResponse, StreamingHttpResponse
 from django.views.decorators.csrf import csrf_exempt
 from django.views.decorators.http import require_http_methods
+import io
 import json
+import numpy as np
+from django.conf import settings
 from db.repositories.TextRepository import TextRepository
+from db.services import embedding_jobs
+from db.services.text_import import import_texts
+from db.services.alignment_service import AlignmentService, align_text
 from db.repositories.CorpusRepository import CorpusRepository
 
 @require_http_methods(["POST"])
@@ -30,12 +36,14 @@ def create_text(request):
         
         # Обработка перевода, если есть
         if 'has_translation' in data:
-            translation_text = TextRepository.get_by_id(data['has_translation'])
-            if not translation_text:
+            if not TextRepository.exists(data['has_translation']):
                 return JsonResponse({'error': 'Translation text not found'}, status=404)
             text_data['has_translation_id'] = data['has_translation']
         
-        text = TextRepository.create(text_data)
+        # при EMBEDDING_ASYNC текст сохраняется сразу, эмбеддинги считаются в фоне
+        text = TextRepository.create(text_data, embed=not settings.EMBEDDING_ASYNC)
+        if settings.EMBEDDING_ASYNC:
+            embedding_jobs.enqueue(text)
         
         return JsonResponse({
             'id': text.id,
@@ -44,7 +52,7 @@ def create_text(request):
             'content': text.content,
             'corpus_id': text.corpus_id,
             'has_translation': text.has_translation_id,
-            'embeddings': text.embeddings
+            'embedding_status': text.embedding_status,
         }, status=201)
         
     except json.JSONDecodeError:
@@ -52,6 +60,29 @@ def create_text(request):
     except Exception as e:
         return JsonResponse({'error': str(e)}, status=500)
 
+@require_http_methods(["POST"])
+def bulk_create_texts(request):
+    """
+    Массовая загрузка: тело - JSON Lines, по тексту на строку (поля как у create_text).
+    Query: batch_size - записей на транзакцию, embed=0 - считать эмбеддинги в фоне
+    Ответ: {'created': int, 'failed': int, 'errors': [{'line': int, 'error': str}]}
+    """
+    try:
+        try:
+            batch_size = int(request.GET['batch_size']) if 'batch_size' in request.GET else None
+        except ValueError:
+            return JsonResponse({'error': 'batch_size must be an integer'}, status=400)
+        if batch_size is not None and batch_size <= 0:
+            return JsonResponse({'error': 'batch_size must be positive'}, status=400)
+
+        # тело читается построчно, без загрузки в память целиком
+        report = import_texts(request, batch_size=batch_size, embed=request.GET.get('embed', '1') != '0')
+        status = 201 if report['created'] else (400 if report['failed'] else 200)
+        return JsonResponse(report, status=status)
+
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
 @require_http_methods(["PUT"])
 def update_text(request, text_id):
     try:
@@ -76,12 +107,13 @@ def update_text(request, text_id):
             update_data['corpus_id'] = data['corpus_id']
         if 'has_translation' in data:
             if data['has_translation'] is not None:
-                translation_text = TextRepository.get_by_id(data['has_translation'])
-                if not translation_text:
+                if not TextRepository.exists(data['has_translation']):
                     return JsonResponse({'error': 'Translation text not found'}, status=404)
             update_data['has_translation_id'] = data['has_translation']
             
-        updated_text = TextRepository.update(text, update_data)
+        updated_text = TextRepository.update(text, update_data, embed=not settings.EMBEDDING_ASYNC)
+        if settings.EMBEDDING_ASYNC and 'content' in update_data:
+            embedding_jobs.enqueue(updated_text)
         
         return JsonResponse({
             'id': updated_text.id,
@@ -90,7 +122,7 @@ def update_text(request, text_id):
             'content': updated_text.content,
             'corpus_id': updated_text.corpus_id,
             'has_translation': updated_text.has_translation_id,
-            'embeddings': updated_text.embeddings
+            'embedding_status': updated_text.embedding_status,
         })
         
     except json.JSONDecodeError:
@@ -101,7 +133,7 @@ def update_text(request, text_id):
 @require_http_methods(["GET"])
 def get_text(request, text_id):
     try:
-        text = TextRepository.get_by_id(text_id)
+        text = TextRepository.get_by_id(text_id, fields=TextRepository.METADATA_FIELDS + ['content'])
         if not text:
             return JsonResponse({'error': 'Text not found'}, status=404)
         
@@ -113,7 +145,8 @@ def get_text(request, text_id):
             'corpus_id': text.corpus_id,
             'corpus_name': text.corpus.name if text.corpus else None,
             'has_translation': text.has_translation_id,
-            'embeddings': text.embeddings,
+            'embedding_status': text.embedding_status,
+            'embedding_error': text.embedding_error,
         }
         
         return JsonResponse(text_data)
@@ -124,7 +157,7 @@ def get_text(request, text_id):
 @require_http_methods(["DELETE"])
 def delete_text(request, text_id):
     try:
-        text = TextRepository.get_by_id(text_id)
+        text = TextRepository.get_by_id(text_id, fields=['id'])
         if not text:
             return JsonResponse({'error': 'Text not found'}, status=404)
         
@@ -135,4 +168,59 @@ def delete_text(request, text_id):
             return JsonResponse({'error': 'Failed to delete text'}, status=500)
             
     except Exception as e:
-        return JsonResponse({'error': str(e)}, status=500)
\ No newline at end of file
+        return JsonResponse({'error': str(e)}, status=500)
+
+@require_http_methods(["GET"])
+def get_text_embeddings(request, text_id):
+    """Эмбеддинги чанков текста файлом .npy (numpy.load), по строке на чанк"""
+    try:
+        text = TextRepository.get_by_id(text_id, fields=['id', 'embeddings', 'embedding_status'])
+        if not text:
+            return JsonResponse({'error': 'Text not found'}, status=404)
+        if text.embedding_status != text.EMBEDDING_READY:
+            return JsonResponse({'error': 'Embeddings are not ready', 'embedding_status': text.embedding_status},
+                                status=404)
+
+        vectors = text.get_embeddings_array()
+        response = StreamingHttpResponse(_iter_npy(vectors), content_type='application/octet-stream')
+        response['Content-Disposition'] = f'attachment; filename="text_{text.id}_embeddings.npy"'
+        return response
+
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)
+
+def _iter_npy(vectors, rows_per_chunk=1024):
+    # формат .npy: заголовок, затем строки матрицы как есть
+    header = io.BytesIO()
+    np.lib.format.write_array_header_1_0(header, np.lib.format.header_data_from_array_1_0(vectors))
+    yield header.getvalue()
+    for start in range(0, len(vectors), rows_per_chunk):
+        yield vectors[start:start + rows_per_chunk].tobytes()
+
+@require_http_methods(["GET"])
+def get_text_alignment(request, text_id):
+    try:
+        fields = TextRepository.METADATA_FIELDS + ['embeddings', 'chunker_version']
+        text = TextRepository.get_by_id(text_id, fields=fields)
+        if not text:
+            return JsonResponse({'error': 'Text not found'}, status=404)
+        translation = TextRepository.get_by_id(text.has_translation_id, fields=fields) if text.has_translation_id else None
+        if not translation:
+            return JsonResponse({'error': 'Text has no translation'}, status=404)
+        if len(text.get_embeddings_array()) * len(translation.get_embeddings_array()) > settings.ALIGNMENT_MAX_CELLS:
+            return JsonResponse({'error': 'Texts are too long to align in a request, use manage.py align_corpus'},
+                                status=400)
+
+        options = {}
+        for option in ('min_similarity', 'merge_penalty', 'skip_penalty'):
+            if option in request.GET:
+                options[option] = float(request.GET[option])
+
+        result = align_text(text, translation, AlignmentService(**options),
+                            include_chunks=request.GET.get('include_chunks') == '1')
+        return JsonResponse(result)
+
+    except ValueError as e:
+        return JsonResponse({'error': str(e)}, status=400)
+    except Exception as e:
+        return JsonResponse({'error': str(e)}, status=500)